@@ -1,4 +1,5 @@
 import os
+import atexit
 import logging
 from logging.handlers import RotatingFileHandler
 import jdatetime
@@ -132,6 +133,10 @@ def create_app(config_name='default'):
     from .reports.service import ReportingService
     reporting_service = ReportingService(app)
     
+    # ثبت دستورات CLI
+    from .cli import init_app as init_cli
+    init_cli(app)
+    
     # راه‌اندازی سرویس پردازش توییت‌ها
     from .services.tweet_processor import TweetProcessor
     tweet_processor = TweetProcessor(app)
@@ -141,6 +146,9 @@ def create_app(config_name='default'):
         interval = app.config.get('BACKGROUND_PROCESSING_INTERVAL', 300)
         tweet_processor.start_background_processing(interval_seconds=interval)
         app.logger.info(f"Started background tweet processing with interval: {interval} seconds")
+        
+        # توقف تدریجی کارگرها (ذخیره دسته‌های جاری) هنگام خروج فرایند
+        atexit.register(tweet_processor.stop_background_processing)
     
     # اگر برنامه در حالت دیباگ اجرا می‌شود، یک نمونه TwitterStream ایجاد می‌کنیم
     if app.debug and app.config.get('TESTING_STREAM_ENABLED', False):
@@ -37,10 +37,15 @@ class RealtimeMonitoringView(BaseView):
             'advanced_analysis_threshold': current_app.config.get('ADVANCED_ANALYSIS_THRESHOLD', 100)
         }
         
+        # وضعیت کارگرهای پردازش توییت
+        tweet_processor = current_app.extensions.get('tweet_processor')
+        processing_status = tweet_processor.get_worker_stats() if tweet_processor else None
+        
         return self.render(
             'admin/realtime/index.html',
             stream_status=stream_status,
-            current_settings=current_settings
+            current_settings=current_settings,
+            processing_status=processing_status
         )
     
     @expose('/start', methods=['POST'])
@@ -152,4 +157,20 @@ class RealtimeMonitoringView(BaseView):
         return jsonify({
             'status': 'success',
             'stats': stats
+        })
+    
+    @expose('/workers')
+    def workers(self):
+        """آمار کارگرهای پردازش توییت (ضربان، توان عملیاتی و طول صف‌ها)"""
+        tweet_processor = current_app.extensions.get('tweet_processor')
+        
+        if not tweet_processor:
+            return jsonify({
+                'status': 'error',
+                'message': 'سرویس پردازش توییت یافت نشد'
+            })
+        
+        return jsonify({
+            'status': 'success',
+            'workers': tweet_processor.get_worker_stats()
         })
\ No newline at end of file
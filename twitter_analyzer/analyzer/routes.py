@@ -1,4 +1,4 @@
-from flask import request, jsonify, current_app
+from flask import request, jsonify, current_app, Response
 from ..utils.anthropic_analyzer import AnthropicTextAnalyzer, IntegratedTextAnalyzer
 from functools import wraps
 import os
@@ -208,17 +208,78 @@ def get_history():
     format_type = request.args.get('format', 'json')
     limit = request.args.get('limit', type=int)
     
-    # محدود کردن تاریخچه به تعداد درخواستی
-    history = analyzer.analysis_history
-    if limit and limit > 0:
-        history = history[-limit:]
+    # قالب‌های csv و jsonl به صورت جریانی از کل تاریخچه روی دیسک صادر می‌شوند
+    if format_type in ('csv', 'jsonl'):
+        mimetype = 'text/csv' if format_type == 'csv' else 'application/x-ndjson'
+        return Response(
+            analyzer.iter_history_export(format=format_type, limit=limit),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename=analysis_history.{format_type}'}
+        )
     
-    if format_type == 'csv':
-        csv_data = analyzer.export_analysis_history(format='csv')
-        return csv_data, 200, {'Content-Type': 'text/csv', 'Content-Disposition': 'attachment; filename=analysis_history.csv'}
-    else:
-        return jsonify({
-            "status": "success",
-            "count": len(history),
-            "history": history
-        })
\ No newline at end of file
+    # قالب json فقط از بافر حافظه (آخرین تحلیل‌ها)
+    history = list(analyzer.iter_analysis_history(from_sink=False, limit=limit))
+    
+    return jsonify({
+        "status": "success",
+        "count": len(history),
+        "history": history
+    })
+
+@analyzer_bp.route('/cache/stats', methods=['GET'])
+@requires_analyzer
+def get_cache_stats():
+    """اندپوینت دریافت آمار کش نتایج تحلیل"""
+    analyzer = current_app.extensions['anthropic_analyzer']
+    
+    return jsonify({
+        "status": "success",
+        "cache": analyzer.get_cache_stats()
+    })
+
+@analyzer_bp.route('/screening/stats', methods=['GET'])
+@requires_analyzer
+def get_screening_stats():
+    """اندپوینت دریافت آمار غربالگری محلی"""
+    analyzer = current_app.extensions['anthropic_analyzer']
+    
+    return jsonify({
+        "status": "success",
+        "screening": analyzer.get_screening_stats()
+    })
+
+@analyzer_bp.route('/concurrency/stats', methods=['GET'])
+@requires_analyzer
+def get_concurrency_stats():
+    """اندپوینت دریافت آمار کنترل‌کننده همزمانی درخواست‌های مدل"""
+    analyzer = current_app.extensions['anthropic_analyzer']
+    
+    return jsonify({
+        "status": "success",
+        "concurrency": analyzer.get_concurrency_stats()
+    })
+
+@analyzer_bp.route('/tokens/stats', methods=['GET'])
+@requires_analyzer
+def get_token_stats():
+    """اندپوینت دریافت آمار مصرف توکن"""
+    analyzer = current_app.extensions['anthropic_analyzer']
+    
+    return jsonify({
+        "status": "success",
+        "tokens": analyzer.get_token_usage()
+    })
+
+@analyzer_bp.route('/cascade/stats', methods=['GET'])
+@requires_analyzer
+def get_cascade_stats():
+    """اندپوینت دریافت آمار مراحل آبشار تحلیل ترکیبی"""
+    if 'integrated_text_analyzer' not in current_app.extensions:
+        return jsonify({"status": "error", "message": "Integrated text analyzer is not configured"}), 503
+    
+    analyzer = current_app.extensions['integrated_text_analyzer']
+    
+    return jsonify({
+        "status": "success",
+        "cascade": analyzer.get_cascade_stats()
+    })
@@ -158,10 +158,10 @@ def get_collection_tweets(collection_id):
 @api_bp.route('/test-text-processor', methods=['GET'])
 def test_text_processor():
     """Route آزمایشی برای تست پردازشگر متن فارسی"""
-    from ..utils.text_processor import PersianTextProcessor
+    from ..utils.text_processor import get_text_processor
     
-    # ایجاد نمونه پردازشگر
-    processor = PersianTextProcessor()
+    # پردازشگر متن برنامه
+    processor = get_text_processor()
     
     # متن‌های آزمایشی
     test_texts = [
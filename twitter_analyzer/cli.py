@@ -1,4 +1,6 @@
+import random
 import click
+from flask import current_app
 from flask.cli import with_appcontext
 from .models import db
 
@@ -17,10 +19,124 @@ def drop_db_command():
         db.drop_all()
         click.echo('تمام جداول پایگاه داده حذف شدند.')
 
+def _ai_sentiment_labels(min_confidence, limit):
+    """
+    برچسب‌های احساسات هوش مصنوعی ذخیره شده در توییت‌ها (جدیدترین‌ها)
+    
+    همه مسیرهای تحلیل هوش مصنوعی (دسته‌ای، اولویت، پرتعامل و کار دسته‌ای آفلاین)
+    برچسب را در خود توییت ثبت می‌کنند؛ اعضای خوشه‌ها که برچسب نماینده را کپی
+    کرده‌اند کنار گذاشته می‌شوند تا نمونه‌های تکراری وزن بیشتری نگیرند.
+    
+    Returns:
+        list: (متن، برچسب احساس)
+    """
+    from .models import Tweet
+    
+    return db.session.query(Tweet.text, Tweet.sentiment).filter(
+        Tweet.sentiment_analysis_method == 'anthropic',
+        Tweet.sentiment.isnot(None),
+        Tweet.sentiment_confidence >= min_confidence,
+        Tweet.representative_filter()
+    ).order_by(Tweet.id.desc()).limit(limit).all()
+
+@click.command('train-screener')
+@click.option('--output', default=None, help='مسیر فایل مدل (پیش‌فرض: LOCAL_SCREENER_PATH)')
+@click.option('--epochs', default=5, show_default=True, help='تعداد دورهای آموزش')
+@click.option('--min-confidence', default=0.6, show_default=True, help='حداقل اطمینان برچسب‌های تحلیل احساسات')
+@click.option('--limit', default=200000, show_default=True, help='حداکثر تعداد نمونه‌های آموزشی')
+@with_appcontext
+def train_screener_command(output, epochs, min_confidence, limit):
+    """آموزش غربالگر محلی از برچسب‌های احساسات هوش مصنوعی ذخیره شده در توییت‌ها"""
+    from .utils.local_screen import LocalScreener
+    
+    output = output or current_app.config.get('LOCAL_SCREENER_PATH')
+    if not output:
+        raise click.UsageError('مسیر فایل مدل مشخص نشده است (--output یا LOCAL_SCREENER_PATH).')
+    
+    rows = _ai_sentiment_labels(min_confidence, limit)
+    
+    # متن‌های دارای احساس مشخص (غیرخنثی) نیاز به تحلیل عمیق‌تر دارند؛ غربالگر فقط
+    # برای تصمیم تحلیل احساسات استفاده می‌شود و اسپم/محتوای نامناسب را نمی‌شناسد
+    samples = [(text, sentiment in ('positive', 'negative', 'mixed')) for text, sentiment in rows if text]
+    if len(samples) < 100:
+        raise click.ClickException(f'تعداد نمونه‌های برچسب‌دار کافی نیست ({len(samples)}).')
+    
+    random.Random(42).shuffle(samples)
+    split = int(len(samples) * 0.9)
+    train, holdout = samples[:split], samples[split:]
+    
+    screener = LocalScreener()
+    stats = screener.fit([text for text, _ in train], [label for _, label in train], epochs=epochs)
+    
+    low = current_app.config.get('LOCAL_SCREENER_LOW', 0.15)
+    high = current_app.config.get('LOCAL_SCREENER_HIGH', 0.85)
+    evaluation = screener.evaluate([text for text, _ in holdout], [label for _, label in holdout], low, high)
+    screener.metadata['holdout'] = evaluation
+    screener.save(output)
+    
+    click.echo(f"غربالگر با {stats['samples']} نمونه آموزش دید (log-loss: {stats['log_loss']:.4f}).")
+    click.echo(f"دقت روی موارد مطمئن: {evaluation['accuracy_on_decided']:.1%}، "
+               f"نرخ ارجاع به مدل: {evaluation['escalation_rate']:.1%}")
+    click.echo(f'مدل در {output} ذخیره شد.')
+
+@click.command('calibrate-cascade')
+@click.option('--output', default=None, help='مسیر فایل آستانه‌ها (پیش‌فرض: CASCADE_THRESHOLDS_PATH)')
+@click.option('--target-agreement', default=None, type=float, help='حداقل توافق مراحل محلی با مدل')
+@click.option('--min-confidence', default=0.6, show_default=True, help='حداقل اطمینان برچسب‌های تحلیل احساسات')
+@click.option('--limit', default=50000, show_default=True, help='حداکثر تعداد نمونه‌ها')
+@with_appcontext
+def calibrate_cascade_command(output, target_agreement, min_confidence, limit):
+    """کالیبراسیون آستانه‌های آبشار تحلیل از برچسب‌های احساسات هوش مصنوعی ذخیره شده در توییت‌ها"""
+    analyzer = current_app.extensions.get('integrated_text_analyzer')
+    if analyzer is None:
+        raise click.ClickException('تحلیلگر ترکیبی پیکربندی نشده است (ANTHROPIC_API_KEY).')
+    
+    output = output or current_app.config.get('CASCADE_THRESHOLDS_PATH')
+    if not output:
+        raise click.UsageError('مسیر فایل آستانه‌ها مشخص نشده است (--output یا CASCADE_THRESHOLDS_PATH).')
+    
+    if target_agreement is None:
+        target_agreement = current_app.config.get('CASCADE_TARGET_AGREEMENT', 0.9)
+    min_samples = current_app.config.get('CASCADE_MIN_SAMPLES', 50)
+    
+    rows = _ai_sentiment_labels(min_confidence, limit)
+    
+    samples = [(text, sentiment) for text, sentiment in rows if text]
+    if len(samples) < min_samples:
+        raise click.ClickException(f'تعداد نمونه‌های برچسب‌دار کافی نیست ({len(samples)}).')
+    
+    try:
+        thresholds = analyzer.calibrate_cascade(samples, target_agreement=target_agreement, min_samples=min_samples)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    thresholds.save(output)
+    
+    metadata = thresholds.metadata
+    click.echo(f"آستانه‌های واژه‌نامه: {thresholds.lexicon}، آستانه غربالگر: {thresholds.screener_low}")
+    click.echo(f"پوشش واژه‌نامه: {metadata['lexicon_coverage']:.1%}، "
+               f"پوشش غربالگر: {metadata['screener_coverage']:.1%} (از {len(samples)} نمونه)")
+    click.echo(f'آستانه‌ها در {output} ذخیره شدند.')
+
+@click.command('recompute-scores')
+@click.option('--chunk-size', default=None, type=int, help='تعداد شناسه‌ها در هر UPDATE (پیش‌فرض: SCORE_RECOMPUTE_CHUNK_SIZE)')
+@click.option('--force', is_flag=True, help='بازنویسی همه ردیف‌ها حتی اگر امتیاز تعامل تغییر نکرده باشد')
+@with_appcontext
+def recompute_scores_command(chunk_size, force):
+    """محاسبه مجدد امتیاز تعامل و ویروسی شدن همه توییت‌ها با UPDATE مجموعه‌ای"""
+    from .models import Tweet
+    
+    if chunk_size is None:
+        chunk_size = current_app.config.get('SCORE_RECOMPUTE_CHUNK_SIZE', 50000)
+    
+    updated = Tweet.recompute_scores(chunk_size=chunk_size, force=force)
+    click.echo(f'امتیاز {updated} توییت به‌روزرسانی شد.')
+
 def init_app(app):
     """اضافه کردن دستورات CLI به برنامه"""
     app.cli.add_command(init_db_command)
     app.cli.add_command(drop_db_command)
+    app.cli.add_command(train_screener_command)
+    app.cli.add_command(calibrate_cascade_command)
+    app.cli.add_command(recompute_scores_command)
 
 
-    
\ No newline at end of file
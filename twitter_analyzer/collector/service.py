@@ -8,6 +8,7 @@ from ..models.hashtag import Hashtag
 from ..models.mention import Mention
 from ..models.collection import Collection, CollectionRule
 from ..models.twitter_user import TwitterUser
+from ..models.work_queue import TweetWorkQueue
 from contextlib import contextmanager
 
 class CollectorService:
@@ -17,6 +18,9 @@ class CollectorService:
         # استفاده از نمونه پیش‌فرض TwitterAPI اگر نمونه خاصی ارائه نشده باشد
         from ..twitter import twitter_api as default_api
         self.twitter_api = twitter_api or default_api
+        
+        # شناسه توییت‌های موجودی که آمار تعاملشان در این جمع‌آوری به‌روز شده است
+        self.refreshed_tweet_ids = []
     
     @staticmethod
     @contextmanager
@@ -32,6 +36,35 @@ class CollectorService:
             db.session.rollback()
             raise e
     
+    def _recompute_refreshed_scores(self):
+        """
+        محاسبه مجدد مجموعه‌ای امتیاز تعامل و ویروسی شدن توییت‌هایی که آمارشان به‌روز شده است
+        
+        Returns:
+            تعداد توییت‌های به‌روزرسانی شده
+        """
+        refreshed_ids, self.refreshed_tweet_ids = self.refreshed_tweet_ids, []
+        if not refreshed_ids or not current_app.config.get('SCORE_RECOMPUTE_AFTER_REFRESH', True):
+            return 0
+        
+        try:
+            return Tweet.recompute_scores(
+                tweet_ids=refreshed_ids,
+                chunk_size=current_app.config.get('SCORE_RECOMPUTE_CHUNK_SIZE', 50000)
+            )
+        except Exception as e:
+            current_app.logger.error(f"Error recomputing tweet scores: {str(e)}", exc_info=True)
+            db.session.rollback()
+            return 0
+    
+    def _prioritize_for_ai(self, tweet):
+        """افزودن توییت (از طریق نماینده خوشه‌اش) به صف اولویت تحلیل هوش مصنوعی بر اساس سرعت تعامل"""
+        priority_queue = current_app.extensions.get('ai_priority_queue')
+        if priority_queue is None or tweet.has_ai_analysis:
+            return False
+        
+        return priority_queue.push(tweet.cluster_id or tweet.id, tweet.engagement_velocity)
+    
     def _extract_hashtags(self, text):
         """استخراج هشتگ‌ها از متن"""
         return re.findall(r'#(\w+)', text)
@@ -66,12 +99,19 @@ class CollectorService:
             # به‌روزرسانی آمار توییت موجود
             try:
                 with CollectorService.db_transaction() as tx_db:
+                    previous_score = Tweet.engagement_score_for(
+                        existing_tweet.likes_count, existing_tweet.retweets_count,
+                        existing_tweet.replies_count, existing_tweet.quotes_count
+                    )
                     existing_tweet.likes_count = tweet_data.get('likeCount', tweet_data.get('like_count', existing_tweet.likes_count))
                     existing_tweet.retweets_count = tweet_data.get('retweetCount', tweet_data.get('retweet_count', existing_tweet.retweets_count))
                     existing_tweet.replies_count = tweet_data.get('replyCount', tweet_data.get('reply_count', existing_tweet.replies_count))
                     existing_tweet.quotes_count = tweet_data.get('quoteCount', tweet_data.get('quote_count', existing_tweet.quotes_count))
                     existing_tweet.collection_id = collection_id
+                    existing_tweet.refresh_engagement_velocity(previous_score)
                 
+                self.refreshed_tweet_ids.append(existing_tweet.id)
+                self._prioritize_for_ai(existing_tweet)
                 return existing_tweet, False
             except Exception as e:
                 current_app.logger.error(f"Error updating tweet: {str(e)}", exc_info=True)
@@ -167,9 +207,19 @@ class CollectorService:
                     urls = [url.get('expanded_url') for url in url_entities if url.get('expanded_url')]
                     new_tweet.set_urls(urls)
                 
+                new_tweet.refresh_engagement_velocity(None)
                 tx_db.session.add(new_tweet)
                 tx_db.session.flush()
                 
+                # پیش‌پردازش و خوشه‌بندی متن‌های تقریباً تکراری
+                tweet_processor = current_app.extensions.get('tweet_processor')
+                if tweet_processor is not None:
+                    tweet_processor.assign_cluster(new_tweet)
+                
+                # افزودن به صف پردازش (در همان تراکنش ایجاد توییت)
+                if current_app.config.get('TWEET_WORK_QUEUE_ENABLED', True):
+                    TweetWorkQueue.enqueue([new_tweet.id])
+                
                 current_app.logger.info(f"Created new tweet with ID: {tweet_id}")
                 
                 # پردازش هشتگ‌ها و منشن‌ها
@@ -217,6 +267,17 @@ class CollectorService:
                     
                     new_tweet.mentions.append(mention)
             
+            # ثبت خوشه جدید در شاخص تقریباً-تکراری فقط پس از commit موفق
+            tweet_processor = current_app.extensions.get('tweet_processor')
+            if tweet_processor is not None:
+                tweet_processor.register_cluster(new_tweet)
+            
+            # انتشار توییت ثبت شده برای پردازش فوری (در صورت فعال بودن کارگرهای دریافت)
+            ingest_bus = current_app.extensions.get('ingest_bus')
+            if ingest_bus is not None:
+                ingest_bus.publish([new_tweet.id])
+            self._prioritize_for_ai(new_tweet)
+            
             return new_tweet, True
             
         except Exception as e:
@@ -282,6 +343,9 @@ class CollectorService:
                 if total_new >= max_tweets:
                     break
             
+            # محاسبه مجدد امتیاز توییت‌هایی که آمارشان به‌روز شده است
+            self._recompute_refreshed_scores()
+            
             # Update collection status
             with CollectorService.db_transaction() as tx_db:
                 collection.status = 'completed'
@@ -366,6 +430,9 @@ class CollectorService:
                 if total_new >= max_tweets:
                     break
             
+            # محاسبه مجدد امتیاز توییت‌هایی که آمارشان به‌روز شده است
+            self._recompute_refreshed_scores()
+            
             # Update collection status
             with CollectorService.db_transaction() as tx_db:
                 collection.status = 'completed'
@@ -452,6 +519,9 @@ class CollectorService:
                 if total_new >= max_tweets:
                     break
             
+            # محاسبه مجدد امتیاز توییت‌هایی که آمارشان به‌روز شده است
+            self._recompute_refreshed_scores()
+            
             # Update collection status
             with CollectorService.db_transaction() as tx_db:
                 collection.status = 'completed'
@@ -537,6 +607,9 @@ class CollectorService:
                 if total_new >= max_tweets:
                     break
             
+            # محاسبه مجدد امتیاز توییت‌هایی که آمارشان به‌روز شده است
+            self._recompute_refreshed_scores()
+            
             # Update collection status
             with CollectorService.db_transaction() as tx_db:
                 collection.status = 'completed'
@@ -636,6 +709,9 @@ class CollectorService:
                 if is_new:
                     total_new += 1
             
+            # محاسبه مجدد امتیاز توییت‌هایی که آمارشان به‌روز شده است
+            self._recompute_refreshed_scores()
+            
             # Update collection status
             with CollectorService.db_transaction() as tx_db:
                 collection.status = 'completed'
@@ -713,6 +789,9 @@ def collect_tweet_replies(self, tweet_id, max_tweets=100):
                 if total_new >= max_tweets:
                     break
             
+            # محاسبه مجدد امتیاز توییت‌هایی که آمارشان به‌روز شده است
+            self._recompute_refreshed_scores()
+            
             # Update collection status with context manager
             with CollectorService.db_transaction() as tx_db:
                 collection.status = 'completed'
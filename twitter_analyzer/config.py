@@ -52,8 +52,53 @@ class Config:
     ANTHROPIC_SCREENING_MODEL = os.environ.get('ANTHROPIC_SCREENING_MODEL', 'claude-3-5-haiku-20241022')
     ANTHROPIC_ANALYSIS_MODEL = os.environ.get('ANTHROPIC_ANALYSIS_MODEL', 'claude-3-5-haiku-20241022') 
     ANTHROPIC_REPORTING_MODEL = os.environ.get('ANTHROPIC_REPORTING_MODEL', 'claude-3-5-sonnet-20241022')
+    ANTHROPIC_BASE_URL = os.environ.get('ANTHROPIC_BASE_URL', '')  # خالی: آدرس پیش‌فرض API
+    ANTHROPIC_MAX_CONCURRENCY = int(os.environ.get('ANTHROPIC_MAX_CONCURRENCY', 50))  # سقف پنجره تطبیقی درخواست‌های همزمان
+    ANTHROPIC_INITIAL_CONCURRENCY = int(os.environ.get('ANTHROPIC_INITIAL_CONCURRENCY', 10))
+    ANTHROPIC_MAX_RETRIES = int(os.environ.get('ANTHROPIC_MAX_RETRIES', 4))  # تلاش مجدد در خطاهای 429/529 و گذرا
+    AI_JOB_TOKEN_BUDGET = int(os.environ.get('AI_JOB_TOKEN_BUDGET', 200000))  # سقف توکن هر دور process_batch_with_ai (0: بدون سقف)
+    REPORT_TOKEN_BUDGET = int(os.environ.get('REPORT_TOKEN_BUDGET', 20000))  # سقف توکن تحلیل AI هر گزارش زمان‌بندی شده
+    TOKEN_ESTIMATOR_CALIBRATION_SAMPLES = int(os.environ.get('TOKEN_ESTIMATOR_CALIBRATION_SAMPLES', 5))  # متن‌های نمونه کالیبراسیون اولیه با API شمارش توکن (0: غیرفعال)
+    REPORT_AI_MAX_TEXTS = int(os.environ.get('REPORT_AI_MAX_TEXTS', 5))  # حداکثر توییت‌های هر گزارش زمان‌بندی شده (برای پوشش بیشتر همراه با REPORT_TOKEN_BUDGET افزایش یابد)
+    REPORT_CHUNK_SIZE = int(os.environ.get('REPORT_CHUNK_SIZE', 100))  # میانگین متن‌های هر تکه در گزارش map-reduce
+    REPORT_REDUCE_FANOUT = int(os.environ.get('REPORT_REDUCE_FANOUT', 8))
+    ANTHROPIC_FULL_ANALYSIS_MODE = os.environ.get('ANTHROPIC_FULL_ANALYSIS_MODE', 'combined')  # combined: یک فراخوانی، split: سه فراخوانی
+    ANTHROPIC_PROMPT_CACHING = os.environ.get('ANTHROPIC_PROMPT_CACHING', 'true').lower() == 'true'  # نقطه cache_control روی پرامپت‌های سیستمی
     MAX_BATCH_TEXTS = 20
-    MAX_REPORT_TEXTS = 50
+    MAX_REPORT_TEXTS = int(os.environ.get('MAX_REPORT_TEXTS', 50))  # حداکثر متن‌های هر درخواست گزارش API
+    ANALYSIS_BATCH_SIZE = int(os.environ.get('ANALYSIS_BATCH_SIZE', 20))  # تعداد متن‌ها در هر درخواست دسته‌ای
+    
+    # کش نتایج تحلیل Anthropic (مسیر خالی: کش در حافظه)
+    ANALYSIS_CACHE_ENABLED = os.environ.get('ANALYSIS_CACHE_ENABLED', 'true').lower() == 'true'
+    ANALYSIS_CACHE_PATH = os.environ.get('ANALYSIS_CACHE_PATH', os.path.join(basedir, '..', 'instance', 'analysis_cache.db'))
+    ANALYSIS_CACHE_TTL = int(os.environ.get('ANALYSIS_CACHE_TTL', 7 * 24 * 3600))  # 7 روز
+    ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get('ANALYSIS_CACHE_MAX_ENTRIES', 100000))
+    ANALYSIS_CACHE_EVICT_INTERVAL = int(os.environ.get('ANALYSIS_CACHE_EVICT_INTERVAL', 300))  # حذف مدخل‌های منقضی هر 5 دقیقه
+    
+    # تاریخچه تحلیل‌های AI: اندازه بافر حافظه و فایل JSONL چرخشی (خالی: غیرفعال)
+    ANALYSIS_HISTORY_SIZE = int(os.environ.get('ANALYSIS_HISTORY_SIZE', 1000))
+    ANALYSIS_HISTORY_PATH = os.environ.get('ANALYSIS_HISTORY_PATH', os.path.join(basedir, '..', 'instance', 'analysis_history.jsonl'))
+    ANALYSIS_HISTORY_MAX_BYTES = int(os.environ.get('ANALYSIS_HISTORY_MAX_BYTES', 10 * 1024 * 1024))
+    ANALYSIS_HISTORY_BACKUPS = int(os.environ.get('ANALYSIS_HISTORY_BACKUPS', 5))
+    
+    # غربالگر محلی (فایل مدل با دستور flask train-screener ساخته می‌شود)
+    LOCAL_SCREENER_PATH = os.environ.get('LOCAL_SCREENER_PATH', os.path.join(basedir, '..', 'instance', 'local_screener.json'))
+    LOCAL_SCREENER_LOW = float(os.environ.get('LOCAL_SCREENER_LOW', 0.15))  # احتمال کمتر: بدون تحلیل
+    LOCAL_SCREENER_HIGH = float(os.environ.get('LOCAL_SCREENER_HIGH', 0.85))  # احتمال بیشتر: تحلیل بدون بررسی مدل
+    
+    # آبشار تحلیل ترکیبی (آستانه‌ها با دستور flask calibrate-cascade یاد گرفته می‌شوند)
+    CASCADE_THRESHOLDS_PATH = os.environ.get('CASCADE_THRESHOLDS_PATH', os.path.join(basedir, '..', 'instance', 'cascade_thresholds.json'))
+    CASCADE_TARGET_AGREEMENT = float(os.environ.get('CASCADE_TARGET_AGREEMENT', 0.9))  # حداقل توافق مراحل محلی با مدل
+    CASCADE_MIN_SAMPLES = int(os.environ.get('CASCADE_MIN_SAMPLES', 50))
+    CASCADE_AI_MIN_CONFIDENCE = float(os.environ.get('CASCADE_AI_MIN_CONFIDENCE', 0.7))  # کمتر: ارجاع به تحلیل کامل
+    
+    # تنظیمات واژه‌نامه‌های پردازشگر متن (خالی: فایل همراه بسته)
+    LEXICON_PATH = os.environ.get('LEXICON_PATH', '')
+    LEXICON_RELOAD_INTERVAL = int(os.environ.get('LEXICON_RELOAD_INTERVAL', 5))
+    
+    # تاریخچه پردازشگر متن: اندازه بافر حافظه و فایل JSONL چرخشی (خالی: غیرفعال)
+    TEXT_PROCESSOR_HISTORY_SIZE = int(os.environ.get('TEXT_PROCESSOR_HISTORY_SIZE', 1000))
+    TEXT_PROCESSOR_HISTORY_PATH = os.environ.get('TEXT_PROCESSOR_HISTORY_PATH', '')
     
     # تنظیمات مانیتورینگ لحظه‌ای
     TRACKING_KEYWORDS = os.environ.get('TRACKING_KEYWORDS', 'ایران,انتخابات,اقتصاد,دلار,بورس').split(',')
@@ -67,7 +112,42 @@ class Config:
     
     # تنظیمات پردازش توییت‌ها
     BACKGROUND_PROCESSING_ENABLED = os.environ.get('BACKGROUND_PROCESSING_ENABLED', 'false').lower() == 'true'
-    BACKGROUND_PROCESSING_INTERVAL = int(os.environ.get('BACKGROUND_PROCESSING_INTERVAL', 300))
+    BACKGROUND_PROCESSING_INTERVAL = int(os.environ.get('BACKGROUND_PROCESSING_INTERVAL', 300))  # فاصله پیمایش اطمینان
+    INGEST_BUS_ENABLED = os.environ.get('INGEST_BUS_ENABLED', 'true').lower() == 'true'  # پردازش فوری توییت‌های تازه
+    INGEST_BUS_MAXSIZE = int(os.environ.get('INGEST_BUS_MAXSIZE', 10000))
+    INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 2))
+    PROCESSOR_WORKERS = int(os.environ.get('PROCESSOR_WORKERS', 1))  # کارگرهای پیمایش صف کار
+    PROCESSOR_HEARTBEAT_TIMEOUT = int(os.environ.get('PROCESSOR_HEARTBEAT_TIMEOUT', 600))  # کارگر بدون ضربان پس از این مدت stalled گزارش می‌شود
+    PROCESSOR_DRAIN_TIMEOUT = int(os.environ.get('PROCESSOR_DRAIN_TIMEOUT', 30))  # مهلت پایان دسته‌های جاری هنگام توقف
+    INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 100))
+    LOCAL_ANALYSIS_PROCESSES = int(os.environ.get('LOCAL_ANALYSIS_PROCESSES', 0))  # 0: تحلیل محلی در همین فرایند
+    LOCAL_ANALYSIS_CHUNK_SIZE = int(os.environ.get('LOCAL_ANALYSIS_CHUNK_SIZE', 200))
+    PROCESSING_CHUNK_SIZE = int(os.environ.get('PROCESSING_CHUNK_SIZE', 1000))  # تعداد توییت‌ها در هر تکه پردازش محلی
+    SCORE_RECOMPUTE_CHUNK_SIZE = int(os.environ.get('SCORE_RECOMPUTE_CHUNK_SIZE', 50000))  # تعداد شناسه‌ها در هر UPDATE محاسبه مجدد امتیازها
+    SCORE_RECOMPUTE_AFTER_REFRESH = os.environ.get('SCORE_RECOMPUTE_AFTER_REFRESH', 'true').lower() == 'true'
+    TWEET_WORK_QUEUE_ENABLED = os.environ.get('TWEET_WORK_QUEUE_ENABLED', 'true').lower() == 'true'  # دریافت انحصاری دسته‌ها از صف کار (چند کارگر)
+    WORK_QUEUE_LEASE_SECONDS = int(os.environ.get('WORK_QUEUE_LEASE_SECONDS', 300))  # مهلت انجام هر دسته پیش از آزاد شدن دوباره
+    WORK_QUEUE_MAX_ATTEMPTS = int(os.environ.get('WORK_QUEUE_MAX_ATTEMPTS', 5))
+    AI_BACKLOG_BATCH_ENABLED = os.environ.get('AI_BACKLOG_BATCH_ENABLED', 'false').lower() == 'true'
+    AI_BACKLOG_BATCH_SIZE = int(os.environ.get('AI_BACKLOG_BATCH_SIZE', 5000))
+    AI_BATCH_POLL_MINUTES = int(os.environ.get('AI_BATCH_POLL_MINUTES', 10))
+    AI_PRIORITY_ENABLED = os.environ.get('AI_PRIORITY_ENABLED', 'true').lower() == 'true'  # تحلیل هوش مصنوعی به ترتیب سرعت تعامل
+    AI_PRIORITY_WORKERS = int(os.environ.get('AI_PRIORITY_WORKERS', 1))
+    AI_PRIORITY_BATCH_SIZE = int(os.environ.get('AI_PRIORITY_BATCH_SIZE', 20))
+    AI_PRIORITY_TOKEN_BUDGET = int(os.environ.get('AI_PRIORITY_TOKEN_BUDGET', 100000))  # سقف توکن ساعتی کارگرهای اولویت (0: بدون سقف)
+    AI_PRIORITY_MIN_VELOCITY = float(os.environ.get('AI_PRIORITY_MIN_VELOCITY', 10.0))  # حداقل سرعت تعامل (امتیاز در ساعت)
+    AI_PRIORITY_MAX_AGE_HOURS = float(os.environ.get('AI_PRIORITY_MAX_AGE_HOURS', 6))
+    AI_PRIORITY_MAXSIZE = int(os.environ.get('AI_PRIORITY_MAXSIZE', 10000))
+    AI_PRIORITY_IDLE_SECONDS = int(os.environ.get('AI_PRIORITY_IDLE_SECONDS', 5))
+    
+    # خوشه‌بندی متن‌های تقریباً تکراری در زمان دریافت (فقط نماینده هر خوشه با هوش مصنوعی تحلیل می‌شود)
+    NEAR_DUPLICATE_ENABLED = os.environ.get('NEAR_DUPLICATE_ENABLED', 'true').lower() == 'true'
+    NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.7))  # حداقل شباهت Jaccard
+    NEAR_DUPLICATE_NUM_PERM = int(os.environ.get('NEAR_DUPLICATE_NUM_PERM', 64))
+    NEAR_DUPLICATE_BANDS = int(os.environ.get('NEAR_DUPLICATE_BANDS', 16))
+    NEAR_DUPLICATE_MIN_LENGTH = int(os.environ.get('NEAR_DUPLICATE_MIN_LENGTH', 20))
+    NEAR_DUPLICATE_MAX_CLUSTERS = int(os.environ.get('NEAR_DUPLICATE_MAX_CLUSTERS', 200000))
+    NEAR_DUPLICATE_WARM_HOURS = int(os.environ.get('NEAR_DUPLICATE_WARM_HOURS', 48))  # بازه بارگذاری نمایندگان پس از راه‌اندازی
     TESTING_STREAM_ENABLED = os.environ.get('TESTING_STREAM_ENABLED', 'false').lower() == 'true'
     AUTO_START_TRACKING = os.environ.get('AUTO_START_TRACKING', 'false').lower() == 'true'
     
@@ -80,6 +160,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    ANALYSIS_CACHE_PATH = ''
+    ANALYSIS_HISTORY_PATH = ''
+    CASCADE_THRESHOLDS_PATH = ''
     
 class ProductionConfig(Config):
     """تنظیمات محیط تولید"""
@@ -8,4 +8,7 @@ from .tweet import Tweet
 from .twitter_user import TwitterUser
 from .hashtag import Hashtag
 from .mention import Mention
-from .collection import Collection, CollectionRule
\ No newline at end of file
+from .collection import Collection, CollectionRule
+from .sentiment import SentimentAnalysis
+from .ai_batch_job import AIBatchJob
+from .work_queue import TweetWorkQueue
\ No newline at end of file
@@ -0,0 +1,59 @@
+import json
+from datetime import datetime
+from . import db
+from .mixins import CRUDMixin, TimestampMixin
+
+class AIBatchJob(db.Model, CRUDMixin, TimestampMixin):
+    """
+    مدل کار دسته‌ای ناهمزمان هوش مصنوعی (Message Batches) برای تحلیل انبوه توییت‌ها
+    """
+    __tablename__ = 'ai_batch_job'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.String(128), unique=True, nullable=False, index=True)  # شناسه کار در Anthropic
+    analysis_type = db.Column(db.String(20), default='sentiment')
+    model = db.Column(db.String(100))
+    
+    # وضعیت: in_progress, canceling, ended (دریافت از API)، completed (نتایج ذخیره شد)، failed
+    status = db.Column(db.String(20), default='in_progress', index=True)
+    
+    # آمار درخواست‌ها
+    request_count = db.Column(db.Integer, default=0)
+    succeeded_count = db.Column(db.Integer, default=0)
+    errored_count = db.Column(db.Integer, default=0)
+    
+    # شناسه توییت‌های ارسال شده (JSON) برای جلوگیری از ارسال مجدد
+    tweet_ids = db.Column(db.Text)
+    
+    submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    ended_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    last_checked_at = db.Column(db.DateTime)
+    error = db.Column(db.Text)
+    
+    # وضعیت‌هایی که نتایج آنها هنوز دریافت نشده است
+    OPEN_STATUSES = ('in_progress', 'canceling', 'ended')
+    
+    def set_tweet_ids(self, tweet_ids):
+        """تنظیم شناسه توییت‌ها به صورت JSON"""
+        self.tweet_ids = json.dumps(list(tweet_ids))
+    
+    def get_tweet_ids(self):
+        """دریافت شناسه توییت‌ها به صورت لیست"""
+        if not self.tweet_ids:
+            return []
+        try:
+            return json.loads(self.tweet_ids)
+        except:
+            return []
+    
+    @classmethod
+    def pending_tweet_ids(cls):
+        """شناسه توییت‌هایی که در کارهای دسته‌ای باز در انتظار نتیجه هستند"""
+        tweet_ids = set()
+        for job in cls.query.filter(cls.status.in_(cls.OPEN_STATUSES)).all():
+            tweet_ids.update(job.get_tweet_ids())
+        return tweet_ids
+    
+    def __repr__(self):
+        return f'<AIBatchJob {self.batch_id}:{self.status}>'
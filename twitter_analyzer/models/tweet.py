@@ -1,4 +1,5 @@
 import json
+from datetime import datetime
 from . import db
 from .mixins import CRUDMixin, TimestampMixin
 
@@ -15,11 +16,31 @@ mention_tweet = db.Table(
     db.Column('tweet_id', db.Integer, db.ForeignKey('tweet.id'), primary_key=True)
 )
 
+# وزن شمارنده‌ها در امتیاز تعامل: لایک + (ریتوییت * 2) + (پاسخ * 3) + (نقل قول * 2)
+ENGAGEMENT_WEIGHTS = (
+    ('likes_count', 1),
+    ('retweets_count', 2),
+    ('replies_count', 3),
+    ('quotes_count', 2)
+)
+
+# آستانه‌های امتیاز تعامل در منحنی تکه‌ای امتیاز ویروسی شدن
+VIRALITY_THRESHOLDS = (10, 50, 100, 500, 1000, 5000, 10000)
+
 class Tweet(db.Model, CRUDMixin, TimestampMixin):
     """
     مدل توییت برای ذخیره اطلاعات کامل توییت‌ها
     """
     __tablename__ = 'tweet'
+    __table_args__ = (
+        # ایندکس‌های جزئی: فقط توییت‌های در انتظار پردازش محلی یا تحلیل هوش مصنوعی
+        db.Index('ix_tweet_unprocessed', 'id',
+                 postgresql_where=db.text('is_processed = false'),
+                 sqlite_where=db.text('is_processed = 0')),
+        db.Index('ix_tweet_ai_pending', 'engagement_score',
+                 postgresql_where=db.text('is_processed = true AND has_ai_analysis = false'),
+                 sqlite_where=db.text('is_processed = 1 AND has_ai_analysis = 0')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     twitter_id = db.Column(db.String(64), unique=True, nullable=False, index=True)
@@ -75,6 +96,11 @@ class Tweet(db.Model, CRUDMixin, TimestampMixin):
     engagement_score = db.Column(db.Integer)  # امتیاز تعامل محاسبه شده
     virality_score = db.Column(db.Float)  # امتیاز ویروسی شدن (0 تا 1)
     has_ai_analysis = db.Column(db.Boolean, default=False)  # آیا تحلیل هوش مصنوعی انجام شده است
+    engagement_velocity = db.Column(db.Float, index=True)  # تغییر امتیاز تعامل در هر ساعت بین دو به‌روزرسانی آمار
+    metrics_refreshed_at = db.Column(db.DateTime)  # زمان آخرین به‌روزرسانی آمار تعامل
+    
+    # خوشه متن‌های تقریباً تکراری (شناسه توییت نماینده خوشه)
+    cluster_id = db.Column(db.Integer, index=True)
     
     # روابط
     twitter_user_id = db.Column(db.Integer, db.ForeignKey('twitter_user.id'), index=True)
@@ -129,15 +155,15 @@ class Tweet(db.Model, CRUDMixin, TimestampMixin):
         except:
             return {}
     
+    @staticmethod
+    def engagement_score_for(likes, retweets, replies, quotes):
+        """امتیاز تعامل برای شمارنده‌های داده شده (بدون نیاز به نمونه مدل)"""
+        counts = (likes, retweets, replies, quotes)
+        return sum((count or 0) * weight for count, (_, weight) in zip(counts, ENGAGEMENT_WEIGHTS))
+    
     def calculate_engagement_score(self):
         """محاسبه امتیاز تعامل براساس لایک، ریتوییت و پاسخ"""
-        likes = self.likes_count or 0
-        retweets = self.retweets_count or 0
-        replies = self.replies_count or 0
-        quotes = self.quotes_count or 0
-        
-        # فرمول محاسبه: لایک + (ریتوییت * 2) + (پاسخ * 3) + (نقل قول * 2)
-        score = likes + (retweets * 2) + (replies * 3) + (quotes * 2)
+        score = self.engagement_score_for(self.likes_count, self.retweets_count, self.replies_count, self.quotes_count)
         self.engagement_score = score
         
         return score
@@ -146,8 +172,14 @@ class Tweet(db.Model, CRUDMixin, TimestampMixin):
         """محاسبه امتیاز ویروسی شدن توییت (0 تا 1)"""
         engagement = self.engagement_score or self.calculate_engagement_score()
         
-        # آستانه‌های ویروسی شدن
-        thresholds = [10, 50, 100, 500, 1000, 5000, 10000]
+        score = self.virality_score_for(engagement)
+        self.virality_score = score
+        return score
+    
+    @staticmethod
+    def virality_score_for(engagement):
+        """امتیاز ویروسی شدن (0 تا 1) برای یک امتیاز تعامل"""
+        thresholds = VIRALITY_THRESHOLDS
         
         # محاسبه امتیاز از 0 تا 1
         for i, threshold in enumerate(thresholds):
@@ -163,30 +195,163 @@ class Tweet(db.Model, CRUDMixin, TimestampMixin):
             # بالاتر از همه آستانه‌ها
             score = 1.0
         
-        self.virality_score = score
         return score
     
+    def refresh_engagement_velocity(self, previous_score, now=None, min_interval_hours=5 / 60):
+        """
+        محاسبه سرعت تعامل پس از به‌روزرسانی شمارنده‌ها
+        
+        سرعت برابر تغییر امتیاز تعامل از آخرین به‌روزرسانی آمار تقسیم بر ساعت‌های
+        گذشته است؛ در اولین به‌روزرسانی امتیاز از زمان انتشار توییت حساب می‌شود.
+        
+        Args:
+            previous_score: امتیاز تعامل پیش از به‌روزرسانی شمارنده‌ها (None: اولین بار)
+            now: زمان به‌روزرسانی (پیش‌فرض: اکنون)
+            min_interval_hours: حداقل فاصله زمانی (برای جلوگیری از سرعت‌های نامعقول در فاصله‌های کوتاه)
+        
+        Returns:
+            float: سرعت تعامل (امتیاز در ساعت)
+        """
+        now = now or datetime.utcnow()
+        score = self.engagement_score_for(self.likes_count, self.retweets_count, self.replies_count, self.quotes_count)
+        
+        if previous_score is None or self.metrics_refreshed_at is None:
+            since = self.twitter_created_at or self.created_at or now
+            delta = score
+        else:
+            since = self.metrics_refreshed_at
+            delta = score - previous_score
+        
+        # زمان‌های انتشار ISO ممکن است دارای منطقه زمانی (UTC) باشند
+        if since.tzinfo is not None:
+            since = since.replace(tzinfo=None) - since.utcoffset()
+        
+        hours = max(min_interval_hours, (now - since).total_seconds() / 3600)
+        self.engagement_velocity = delta / hours
+        self.metrics_refreshed_at = now
+        return self.engagement_velocity
+    
+    @classmethod
+    def engagement_score_expression(cls):
+        """عبارت SQL امتیاز تعامل (همان فرمول engagement_score_for)"""
+        return sum(
+            db.func.coalesce(getattr(cls, column), 0) * weight for column, weight in ENGAGEMENT_WEIGHTS
+        )
+    
+    @classmethod
+    def virality_score_expression(cls, engagement=None):
+        """
+        عبارت SQL امتیاز ویروسی شدن (همان منحنی virality_score_for به صورت CASE)
+        
+        Args:
+            engagement: عبارت امتیاز تعامل (پیش‌فرض: engagement_score_expression)
+        """
+        if engagement is None:
+            engagement = cls.engagement_score_expression()
+        engagement = db.cast(engagement, db.Float)
+        
+        count = len(VIRALITY_THRESHOLDS)
+        whens = []
+        for i, threshold in enumerate(VIRALITY_THRESHOLDS):
+            if i == 0:
+                value = engagement / float(threshold)
+            else:
+                prev_threshold = VIRALITY_THRESHOLDS[i - 1]
+                value = i / count + (engagement - prev_threshold) / float((threshold - prev_threshold) * count)
+            whens.append((engagement < threshold, value))
+        
+        return db.case(*whens, else_=1.0)
+    
+    @classmethod
+    def recompute_scores(cls, tweet_ids=None, chunk_size=50000, force=False):
+        """
+        محاسبه مجدد امتیاز تعامل و ویروسی شدن با UPDATE مجموعه‌ای در پایگاه داده
+        
+        هر تکه با یک دستور UPDATE روی بازه‌ای از شناسه‌ها به‌روزرسانی و ثبت می‌شود؛
+        ردیف‌هایی که امتیازشان تغییر نکرده نوشته نمی‌شوند.
+        
+        Args:
+            tweet_ids: شناسه توییت‌ها (None: همه توییت‌ها)
+            chunk_size: تعداد شناسه‌ها در هر UPDATE
+            force: بازنویسی همه ردیف‌ها (مثلاً پس از تغییر منحنی ویروسی شدن)
+        
+        Returns:
+            تعداد توییت‌های به‌روزرسانی شده
+        """
+        engagement = cls.engagement_score_expression()
+        values = {
+            cls.engagement_score: engagement,
+            cls.virality_score: cls.virality_score_expression(engagement)
+        }
+        
+        changed = None
+        if not force:
+            changed = db.or_(
+                cls.engagement_score.is_(None),
+                cls.virality_score.is_(None),
+                cls.engagement_score != engagement
+            )
+        
+        def update(condition):
+            query = cls.query.filter(condition)
+            if changed is not None:
+                query = query.filter(changed)
+            rowcount = query.update(values, synchronize_session=False)
+            db.session.commit()
+            return rowcount
+        
+        updated = 0
+        if tweet_ids is not None:
+            tweet_ids = sorted(set(tweet_ids))
+            for start in range(0, len(tweet_ids), chunk_size):
+                updated += update(cls.id.in_(tweet_ids[start:start + chunk_size]))
+            return updated
+        
+        min_id, max_id = db.session.query(db.func.min(cls.id), db.func.max(cls.id)).one()
+        if min_id is None:
+            return 0
+        
+        for start in range(min_id, max_id + 1, chunk_size):
+            updated += update(db.and_(cls.id >= start, cls.id < start + chunk_size))
+        return updated
+    
     def analyze_sentiment_with_local_processor(self, text_processor=None):
         """تحلیل احساسات با استفاده از پردازشگر محلی"""
-        from flask import current_app
-        
         # دریافت پردازشگر محلی
         if text_processor is None:
-            if hasattr(current_app, 'extensions') and 'persian_content_analyzer' in current_app.extensions:
-                text_processor = current_app.extensions['persian_content_analyzer']
-            else:
-                from ..utils.text_processor import PersianTextProcessor
-                text_processor = PersianTextProcessor()
+            from ..utils.text_processor import get_text_processor
+            text_processor = get_text_processor()
         
         # تحلیل احساسات
         result = text_processor.analyze_sentiment(self.text)
-        sentiment, score, negative_words, positive_words = result
         
-        # ذخیره نتایج
-        self.sentiment = sentiment
-        self.sentiment_score = score
-        self.sentiment_analysis_method = 'local'
-        self.sentiment_confidence = 0.7  # اطمینان پیش‌فرض برای تحلیل محلی
+        return self.apply_local_sentiment(result)
+    
+    def apply_local_sentiment(self, result):
+        """
+        ذخیره نتیجه تحلیل احساسات محلی
+        
+        Args:
+            result: خروجی PersianTextProcessor.analyze_sentiment
+                (احساس، امتیاز، کلمات منفی، کلمات مثبت)
+        """
+        for column, value in self.local_sentiment_values(result).items():
+            setattr(self, column, value)
+        
+        return self.sentiment
+    
+    @staticmethod
+    def local_sentiment_values(result):
+        """
+        مقادیر ستون‌های احساسات برای یک نتیجه تحلیل محلی
+        
+        Args:
+            result: خروجی PersianTextProcessor.analyze_sentiment
+        
+        Returns:
+            dict: نام ستون -> مقدار (مناسب برای به‌روزرسانی گروهی)
+        """
+        sentiment, score, negative_words, positive_words = result
         
         # ذخیره جزئیات
         details = {
@@ -194,9 +359,126 @@ class Tweet(db.Model, CRUDMixin, TimestampMixin):
             'positive_words': positive_words,
             'method': 'local'
         }
-        self.set_sentiment_details(details)
         
-        return sentiment
+        return {
+            'sentiment': sentiment,
+            'sentiment_score': score,
+            'sentiment_analysis_method': 'local',
+            'sentiment_confidence': 0.7,  # اطمینان پیش‌فرض برای تحلیل محلی
+            'sentiment_details': json.dumps(details)
+        }
+    
+    @staticmethod
+    def ai_sentiment_values(result):
+        """
+        مقادیر ستون‌های احساسات برای یک نتیجه تحلیل هوش مصنوعی
+        
+        Args:
+            result: خروجی تحلیل احساسات AnthropicTextAnalyzer
+        
+        Returns:
+            dict: نام ستون -> مقدار (مناسب برای به‌روزرسانی گروهی)
+        """
+        sentiment = result.get('sentiment', 'neutral')
+        
+        values = {
+            'sentiment': sentiment,
+            'sentiment_score': result.get('intensity', 0.5) * (1 if sentiment == 'positive' else -1 if sentiment == 'negative' else 0),
+            'sentiment_analysis_method': 'anthropic',
+            'sentiment_confidence': result.get('confidence', 0.8),
+            'has_ai_analysis': True
+        }
+        
+        # ذخیره جزئیات
+        if result:
+            values['sentiment_details'] = json.dumps(result)
+        
+        return values
+    
+    def apply_ai_sentiment(self, result):
+        """
+        ذخیره نتیجه تحلیل احساسات هوش مصنوعی
+        
+        Args:
+            result: خروجی AnthropicTextAnalyzer.analyze_sentiment یا analyze_batch
+        """
+        for column, value in self.ai_sentiment_values(result).items():
+            setattr(self, column, value)
+        
+        return self.sentiment
+    
+    # ستون‌هایی که از نماینده خوشه به اعضای آن منتقل می‌شوند
+    CLUSTER_LABEL_COLUMNS = (
+        'sentiment', 'sentiment_score', 'sentiment_analysis_method',
+        'sentiment_confidence', 'sentiment_details', 'has_ai_analysis'
+    )
+    
+    @property
+    def is_cluster_representative(self):
+        """آیا توییت نماینده خوشه خود است (یا در هیچ خوشه‌ای نیست)"""
+        return self.cluster_id is None or self.cluster_id == self.id
+    
+    @classmethod
+    def representative_filter(cls):
+        """شرط کوئری توییت‌هایی که خودشان تحلیل می‌شوند (نماینده یا بدون خوشه)"""
+        return db.or_(cls.cluster_id.is_(None), cls.cluster_id == cls.id)
+    
+    def copy_cluster_labels(self, representative):
+        """
+        کپی برچسب‌های هوش مصنوعی نماینده خوشه
+        
+        Returns:
+            bool: آیا برچسبی کپی شد (نماینده تحلیل هوش مصنوعی داشته باشد)
+        """
+        if representative is None or not representative.has_ai_analysis:
+            return False
+        
+        for column in self.CLUSTER_LABEL_COLUMNS:
+            setattr(self, column, getattr(representative, column))
+        return True
+    
+    @classmethod
+    def propagate_cluster_labels(cls, representative_ids):
+        """
+        انتقال برچسب‌های هوش مصنوعی نمایندگان به اعضای تحلیل نشده خوشه‌هایشان
+        
+        Args:
+            representative_ids: شناسه توییت‌های نماینده
+        
+        Returns:
+            تعداد توییت‌های به‌روزرسانی شده (commit بر عهده فراخواننده است)
+        """
+        representative_ids = list(representative_ids)
+        if not representative_ids:
+            return 0
+        
+        # فقط خوشه‌هایی که عضو تحلیل نشده دارند
+        pending_ids = [
+            row.cluster_id for row in cls.query.with_entities(cls.cluster_id).filter(
+                cls.cluster_id.in_(representative_ids),
+                cls.id != cls.cluster_id,
+                cls.has_ai_analysis == False
+            ).distinct().all()
+        ]
+        if not pending_ids:
+            return 0
+        
+        columns = [getattr(cls, column) for column in cls.CLUSTER_LABEL_COLUMNS]
+        representatives = cls.query.with_entities(cls.id, *columns).filter(
+            cls.id.in_(pending_ids),
+            cls.has_ai_analysis == True
+        ).all()
+        
+        updated = 0
+        for row in representatives:
+            values = {column: getattr(row, column) for column in cls.CLUSTER_LABEL_COLUMNS}
+            updated += cls.query.filter(
+                cls.cluster_id == row.id,
+                cls.id != row.id,
+                cls.has_ai_analysis == False
+            ).update(values, synchronize_session=False)
+        
+        return updated
     
     def analyze_sentiment_with_ai(self, force=False):
         """تحلیل احساسات با استفاده از هوش مصنوعی"""
@@ -213,18 +495,7 @@ class Tweet(db.Model, CRUDMixin, TimestampMixin):
             # تحلیل با هوش مصنوعی
             result = ai_analyzer.analyze_sentiment(self.text, force_full_analysis=force)
             
-            # ذخیره نتایج
-            sentiment = result.get('sentiment', 'neutral')
-            self.sentiment = sentiment
-            self.sentiment_score = result.get('intensity', 0.5) * (1 if sentiment == 'positive' else -1 if sentiment == 'negative' else 0)
-            self.sentiment_analysis_method = 'anthropic'
-            self.sentiment_confidence = result.get('confidence', 0.8)
-            
-            # ذخیره جزئیات
-            self.set_sentiment_details(result)
-            self.has_ai_analysis = True
-            
-            return sentiment
+            return self.apply_ai_sentiment(result)
             
         except Exception as e:
             if hasattr(current_app, 'logger'):
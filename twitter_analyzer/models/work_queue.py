@@ -0,0 +1,162 @@
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .mixins import CRUDMixin
+
+class TweetWorkQueue(db.Model, CRUDMixin):
+    """
+    صف کار توییت‌ها با دریافت انحصاری و مهلت (lease)
+    
+    هر ردیف یک کار در انتظار برای یک توییت در یک مرحله است. کارگرها دسته‌های
+    جدا از هم را با یک UPDATE اتمیک برمی‌دارند (در PostgreSQL با FOR UPDATE SKIP LOCKED)
+    و پس از پایان کار ردیف‌ها را حذف می‌کنند؛ کارهای کارگرهای از کار افتاده پس از
+    پایان مهلت دوباره قابل برداشت می‌شوند.
+    """
+    __tablename__ = 'tweet_work_queue'
+    __table_args__ = (
+        db.UniqueConstraint('tweet_id', 'stage', name='uq_tweet_work_queue_tweet_stage'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    tweet_id = db.Column(db.Integer, db.ForeignKey('tweet.id', ondelete='CASCADE'), nullable=False, index=True)
+    stage = db.Column(db.String(20), nullable=False, default='process')  # مرحله پردازش: process
+    
+    # دریافت انحصاری: شناسه دریافت و پایان مهلت آن (None: آزاد)
+    claim_token = db.Column(db.String(64), index=True)
+    lease_expires_at = db.Column(db.DateTime)
+    attempts = db.Column(db.Integer, default=0)
+    
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # مراحل صف
+    STAGE_PROCESS = 'process'
+    
+    @classmethod
+    def enqueue(cls, tweet_ids, stage=STAGE_PROCESS):
+        """
+        افزودن توییت‌ها به صف (commit بر عهده فراخواننده است)
+        
+        Args:
+            tweet_ids: شناسه توییت‌ها
+            stage: مرحله پردازش
+        """
+        now = datetime.utcnow()
+        rows = [{'tweet_id': tweet_id, 'stage': stage, 'attempts': 0, 'created_at': now} for tweet_id in tweet_ids]
+        if rows:
+            db.session.bulk_insert_mappings(cls, rows)
+    
+    @classmethod
+    def enqueue_missing(cls, pending_filter, stage=STAGE_PROCESS):
+        """
+        افزودن توییت‌های در انتظاری که در صف نیستند (مثلاً توییت‌های ایجاد شده از مسیرهای دیگر)
+        
+        Args:
+            pending_filter: شرط توییت‌های در انتظار این مرحله
+            stage: مرحله پردازش
+        
+        Returns:
+            تعداد توییت‌های اضافه شده
+        """
+        from .tweet import Tweet
+        
+        queued = db.session.query(cls.id).filter(cls.tweet_id == Tweet.id, cls.stage == stage)
+        select = db.session.query(
+            Tweet.id, db.literal(stage), db.literal(0), db.literal(datetime.utcnow())
+        ).filter(pending_filter, ~queued.exists())
+        
+        try:
+            result = db.session.execute(
+                cls.__table__.insert().from_select(['tweet_id', 'stage', 'attempts', 'created_at'], select)
+            )
+            db.session.commit()
+        except IntegrityError:
+            # کارگر دیگری همزمان همین توییت‌ها را اضافه کرده است
+            db.session.rollback()
+            return 0
+        
+        return result.rowcount or 0
+    
+    @classmethod
+    def claim(cls, worker_id, batch_size, stage=STAGE_PROCESS, lease_seconds=300, max_attempts=5):
+        """
+        دریافت انحصاری یک دسته از کارها
+        
+        در PostgreSQL ردیف‌های قفل شده توسط کارگرهای دیگر نادیده گرفته می‌شوند
+        (SKIP LOCKED)؛ در SQLite خود UPDATE اتمیک است چون پایگاه داده در هر لحظه
+        فقط یک نویسنده دارد.
+        
+        Args:
+            worker_id: شناسه کارگر (در توکن دریافت ثبت می‌شود)
+            batch_size: حداکثر تعداد کارها
+            stage: مرحله پردازش
+            lease_seconds: مهلت انجام کار پیش از آزاد شدن دوباره
+            max_attempts: کارهایی که بیش از این تعداد دریافت شده‌اند دیگر برداشته نمی‌شوند
+        
+        Returns:
+            tuple: (توکن دریافت، لیست شناسه توییت‌ها)
+        """
+        now = datetime.utcnow()
+        token = f"{worker_id}:{uuid.uuid4().hex[:12]}"[-64:]
+        
+        candidates = db.session.query(cls.id).filter(
+            cls.stage == stage,
+            cls.attempts < max_attempts,
+            db.or_(cls.lease_expires_at.is_(None), cls.lease_expires_at < now)
+        ).order_by(cls.id).limit(batch_size)
+        
+        if db.session.get_bind().dialect.name == 'postgresql':
+            candidates = candidates.with_for_update(skip_locked=True)
+        
+        db.session.query(cls).filter(cls.id.in_(candidates.scalar_subquery())).update({
+            cls.claim_token: token,
+            cls.lease_expires_at: now + timedelta(seconds=lease_seconds),
+            cls.attempts: cls.attempts + 1
+        }, synchronize_session=False)
+        db.session.commit()
+        
+        tweet_ids = [
+            row.tweet_id for row in
+            db.session.query(cls.tweet_id).filter(cls.claim_token == token).order_by(cls.tweet_id).all()
+        ]
+        return token, tweet_ids
+    
+    @classmethod
+    def complete(cls, token):
+        """حذف کارهای یک دریافت پس از انجام موفق (commit بر عهده فراخواننده است)"""
+        return db.session.query(cls).filter(cls.claim_token == token).delete(synchronize_session=False)
+    
+    @classmethod
+    def discard(cls, tweet_ids, stage=STAGE_PROCESS):
+        """حذف کارهای توییت‌هایی که خارج از صف پردازش شده‌اند (commit بر عهده فراخواننده است)"""
+        return db.session.query(cls).filter(
+            cls.tweet_id.in_(tweet_ids), cls.stage == stage
+        ).delete(synchronize_session=False)
+    
+    @classmethod
+    def release(cls, token):
+        """آزاد کردن کارهای یک دریافت بدون انجام (برای برداشت دوباره)"""
+        db.session.query(cls).filter(cls.claim_token == token).update({
+            cls.claim_token: None,
+            cls.lease_expires_at: None
+        }, synchronize_session=False)
+        db.session.commit()
+    
+    @classmethod
+    def stats(cls, stage=STAGE_PROCESS, max_attempts=5):
+        """
+        آمار صف یک مرحله
+        
+        Returns:
+            dict: تعداد کارهای در انتظار، در حال انجام و کارهایی که از حد تلاش گذشته‌اند
+        """
+        now = datetime.utcnow()
+        query = cls.query.filter(cls.stage == stage)
+        return {
+            'pending': query.filter(db.or_(cls.lease_expires_at.is_(None), cls.lease_expires_at < now)).count(),
+            'leased': query.filter(cls.lease_expires_at >= now).count(),
+            'max_attempts_reached': query.filter(cls.attempts >= max_attempts).count()
+        }
+    
+    def __repr__(self):
+        return f'<TweetWorkQueue {self.stage}:{self.tweet_id}>'
@@ -68,10 +68,10 @@ class TwitterStream:
     
     def _tracking_worker(self):
         """Worker thread برای ردیابی توییت‌ها"""
-        from ..utils.text_processor import PersianTextProcessor
+        from ..utils.text_processor import get_text_processor
         
-        # ایجاد پردازشگر متن
-        text_processor = PersianTextProcessor()
+        # پردازشگر متن برنامه (با واژه‌نامه‌های تنظیم شده)
+        text_processor = get_text_processor()
         
         # بررسی وجود تحلیلگر آنتروپیک
         anthropic_analyzer = None
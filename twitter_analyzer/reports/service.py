@@ -7,6 +7,7 @@ from ..models import db
 from ..models.tweet import Tweet
 from ..models.hashtag import Hashtag
 from ..models.mention import Mention
+from ..utils.token_budget import token_budget
 import traceback
 
 class ReportingService:
@@ -197,15 +198,21 @@ class ReportingService:
             # تحلیل پیشرفته با AI
             if total_tweets > 0 and 'anthropic_analyzer' in self.app.extensions:
                 try:
-                    # جمع‌آوری متن توییت‌ها برای تحلیل
-                    texts = [t.text for t in top_engagement_tweets[:5] if t.text]
+                    # متن توییت‌های بازه (به ترتیب تعامل) برای گزارش map-reduce
+                    max_texts = self.app.config.get('REPORT_AI_MAX_TEXTS', 5)
+                    texts = [text for (text,) in base_query.with_entities(Tweet.text).order_by(
+                        desc(Tweet.engagement_score)
+                    ).limit(max_texts) if text]
                     
                     if texts:
                         # تحلیل با AI
                         analyzer = self.app.extensions['anthropic_analyzer']
-                        ai_analysis = analyzer.analyze_text_full('\n\n'.join(texts))
+                        budget_limit = self.app.config.get('REPORT_TOKEN_BUDGET')
+                        with token_budget(budget_limit, name=f'{period}_report') as budget:
+                            ai_analysis = analyzer.generate_analysis_report(texts, report_type='json')
                         
                         stats['ai_analysis'] = ai_analysis
+                        stats['ai_token_usage'] = budget.stats()
                 except Exception as e:
                     self.logger.error(f"Error in AI analysis: {e}", exc_info=True)
                     stats['ai_analysis_error'] = str(e)
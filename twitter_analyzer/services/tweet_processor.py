@@ -1,11 +1,22 @@
 from flask import current_app
 from ..models import db
 from ..models.tweet import Tweet
+from ..models.sentiment import SentimentAnalysis
+from ..models.ai_batch_job import AIBatchJob
+from ..models.work_queue import TweetWorkQueue
 from ..utils.text_processor import PersianTextProcessor
-from concurrent.futures import ThreadPoolExecutor
+from ..utils.local_pool import LocalAnalysisPool
+from ..utils.token_budget import token_budget, TokenBudget
+from ..utils.near_duplicate import NearDuplicateIndex
+from ..utils.ingest_bus import IngestBus
+from ..utils.worker_pool import WorkerPool
+from ..utils.ai_priority import AIPriorityQueue
+import os
+import socket
 import logging
+import threading
 import time
-from sqlalchemy import desc, and_
+from sqlalchemy import desc, and_, or_
 from datetime import datetime, timedelta
 
 class TweetProcessor:
@@ -23,9 +34,13 @@ class TweetProcessor:
         self.app = app
         self.logger = None
         self.text_processor = None
+        self.local_pool = None
+        self.near_duplicates = None
+        self.ingest_bus = None
+        self.ai_priority = None
+        self.ai_priority_window = None
         self.ai_analyzer = None
-        self.processing_thread = None
-        self.is_running = False
+        self.worker_pool = None
         
         if app is not None:
             self.init_app(app)
@@ -43,6 +58,26 @@ class TweetProcessor:
         # ایجاد پردازشگر متن
         self.text_processor = PersianTextProcessor(app)
         
+        # اجرای موازی تحلیل محلی در چند فرایند (0: در همین فرایند)
+        self.local_pool = LocalAnalysisPool(
+            processes=app.config.get('LOCAL_ANALYSIS_PROCESSES', 0),
+            chunk_size=app.config.get('LOCAL_ANALYSIS_CHUNK_SIZE', 200),
+            processor=self.text_processor,
+            lexicon_path=app.config.get('LEXICON_PATH') or None
+        )
+        
+        # شاخص متن‌های تقریباً تکراری برای خوشه‌بندی در زمان دریافت
+        if app.config.get('NEAR_DUPLICATE_ENABLED', True):
+            self.near_duplicates = NearDuplicateIndex(app)
+        
+        # صف درون‌فرایندی توییت‌های تازه برای پردازش فوری
+        if app.config.get('INGEST_BUS_ENABLED', True):
+            self.ingest_bus = IngestBus(app)
+        
+        # صف اولویت تحلیل هوش مصنوعی بر اساس سرعت تعامل
+        if app.config.get('AI_PRIORITY_ENABLED', True):
+            self.ai_priority = AIPriorityQueue(app)
+        
         # تلاش برای یافتن تحلیلگر هوش مصنوعی
         if 'anthropic_analyzer' in app.extensions:
             self.ai_analyzer = app.extensions['anthropic_analyzer']
@@ -74,68 +109,324 @@ class TweetProcessor:
             hours=6,
             id='analyze_top_tweets'
         )
+        
+        # ارسال توییت‌های باقی‌مانده به صورت کار دسته‌ای ناهمزمان و بررسی نتایج
+        if self.app.config.get('AI_BACKLOG_BATCH_ENABLED', False):
+            scheduler.add_job(
+                func=self.submit_ai_backlog_batch,
+                trigger='interval',
+                hours=1,
+                id='submit_ai_backlog'
+            )
+        
+        scheduler.add_job(
+            func=self.poll_ai_batches,
+            trigger='interval',
+            minutes=self.app.config.get('AI_BATCH_POLL_MINUTES', 10),
+            id='poll_ai_batches'
+        )
     
-    def process_unprocessed_tweets(self, limit=100):
+    def assign_cluster(self, tweet):
         """
-        پردازش توییت‌های پردازش نشده
+        پیش‌پردازش و خوشه‌بندی یک توییت جدید در زمان دریافت
+        
+        باید پس از flush (وجود شناسه) و داخل تراکنش فراخواننده اجرا شود. اگر نماینده
+        خوشه قبلاً با هوش مصنوعی تحلیل شده باشد، برچسب‌هایش بلافاصله کپی می‌شوند.
+        اگر توییت نماینده خوشه جدیدی باشد، خوشه فقط پس از commit و با فراخوانی
+        register_cluster به شاخص اضافه می‌شود تا rollback خوشه‌ای بدون نماینده باقی نگذارد.
         
         Args:
-            limit: حداکثر تعداد توییت‌ها برای پردازش
+            tweet: نمونه Tweet
+            
+        Returns:
+            شناسه خوشه یا None
+        """
+        if tweet.processed_text is None:
+            tweet.processed_text = self.text_processor.preprocess(tweet.text or '')
+        
+        if self.near_duplicates is None:
+            return None
+        
+        if not self.near_duplicates.warmed:
+            self._warm_near_duplicates()
+        
+        index = self.near_duplicates
+        cluster_id, signature = index.match(tweet.processed_text or tweet.text or '')
+        if signature is None:
+            tweet.cluster_id = None
+            return None
+        
+        if cluster_id is not None:
+            representative = self._cluster_representative(cluster_id, signature)
+            if representative is None:
+                cluster_id = None
+            else:
+                tweet.copy_cluster_labels(representative)
+        
+        if cluster_id is None:
+            # نماینده خوشه جدید؛ ثبت در شاخص پس از commit
+            cluster_id = tweet.id
+            tweet.pending_cluster_signature = signature
+        
+        tweet.cluster_id = cluster_id
+        return cluster_id
+    
+    def _cluster_representative(self, cluster_id, signature):
+        """
+        توییت نماینده یک خوشه شاخص، در صورتی که هنوز وجود داشته و با متن جدید مشابه باشد
+        
+        خوشه‌هایی که نماینده‌شان وجود ندارد یا شناسه‌اش به توییت دیگری رسیده است
+        (استفاده مجدد شناسه پس از rollback در SQLite) از شاخص حذف می‌شوند.
+        """
+        index = self.near_duplicates
+        representative = Tweet.query.get(cluster_id)
+        if representative is not None and representative.cluster_id == representative.id:
+            representative_signature = index.signature(representative.processed_text or representative.text or '')
+            if (representative_signature is not None and
+                    index.similarity(signature, representative_signature) >= index.threshold):
+                return representative
+        
+        self.logger.warning(f"Dropping stale near-duplicate cluster {cluster_id} from the index")
+        index.remove(cluster_id)
+        return None
+    
+    def register_cluster(self, tweet):
+        """
+        ثبت خوشه جدید توییت در شاخص تقریباً-تکراری (پس از commit تراکنش ایجاد توییت)
+        
+        Args:
+            tweet: نمونه Tweet که قبلاً assign_cluster برایش اجرا شده است
+        """
+        signature = getattr(tweet, 'pending_cluster_signature', None)
+        if signature is None or self.near_duplicates is None:
+            return
+        
+        self.near_duplicates.add(tweet.id, signature)
+        tweet.pending_cluster_signature = None
+    
+    def _warm_near_duplicates(self):
+        """بارگذاری نمایندگان خوشه‌های اخیر در شاخص (پس از راه‌اندازی برنامه)"""
+        hours = self.app.config.get('NEAR_DUPLICATE_WARM_HOURS', 48)
+        since = datetime.utcnow() - timedelta(hours=hours)
+        
+        rows = Tweet.query.with_entities(Tweet.id, Tweet.processed_text, Tweet.text).filter(
+            Tweet.cluster_id == Tweet.id,
+            Tweet.created_at >= since
+        ).order_by(Tweet.id).yield_per(1000)
+        
+        self.near_duplicates.warm((row.id, row.processed_text or row.text or '') for row in rows)
+    
+    def process_unprocessed_tweets(self, limit=None, chunk_size=None, fill_queue=True):
+        """
+        پردازش توییت‌های پردازش نشده تا پایان صف (یا رسیدن به limit)
+        
+        در صورت فعال بودن TWEET_WORK_QUEUE_ENABLED دسته‌ها به صورت انحصاری از صف کار
+        برداشته می‌شوند تا چند کارگر بتوانند همزمان دسته‌های جدا از هم را پردازش کنند؛
+        در غیر این صورت توییت‌ها با صفحه‌بندی کلیدی روی id خوانده می‌شوند. در هر دو
+        حالت فقط ستون‌های لازم خوانده می‌شوند، تحلیل محلی هر تکه به صورت دسته‌ای انجام
+        می‌شود و نتایج با یک bulk_update_mappings در هر تکه ذخیره می‌شوند.
+        
+        Args:
+            limit: حداکثر تعداد توییت‌ها برای پردازش (None: تا خالی شدن صف)
+            chunk_size: تعداد توییت‌ها در هر تکه (پیش‌فرض: PROCESSING_CHUNK_SIZE)
+            fill_queue: افزودن توییت‌های پردازش نشده‌ای که در صف کار نیستند پیش از شروع
             
         Returns:
             تعداد توییت‌های پردازش شده
         """
+        if chunk_size is None:
+            chunk_size = self.app.config.get('PROCESSING_CHUNK_SIZE', 1000)
+        
+        with self.app.app_context():
+            if self.app.config.get('TWEET_WORK_QUEUE_ENABLED', True):
+                processed_count = self._process_from_queue(limit, chunk_size, fill_queue)
+            else:
+                processed_count = self._process_by_scan(limit, chunk_size)
+            
+            if processed_count > 0:
+                self.logger.info(f"Processed {processed_count} tweets")
+            
+            return processed_count
+    
+    def process_tweet_ids(self, tweet_ids):
+        """
+        پردازش فوری توییت‌های مشخص (مثلاً توییت‌های منتشر شده در صف دریافت)
+        
+        توییت‌هایی که قبلاً پردازش شده‌اند نادیده گرفته می‌شوند و کارهای آنها از
+        صف کار حذف می‌شود تا پیمایش دوره‌ای دوباره آنها را برندارد.
+        
+        Args:
+            tweet_ids: شناسه توییت‌ها
+            
+        Returns:
+            تعداد توییت‌های پردازش شده
+        """
+        if not tweet_ids:
+            return 0
+        
         with self.app.app_context():
             try:
-                # یافتن توییت‌های پردازش نشده
-                unprocessed_tweets = Tweet.query.filter_by(is_processed=False).limit(limit).all()
+                rows = self._unprocessed_columns().filter(
+                    Tweet.id.in_(tweet_ids),
+                    Tweet.is_processed == False
+                ).order_by(Tweet.id).all()
                 
-                processed_count = 0
-                for tweet in unprocessed_tweets:
-                    try:
-                        # تحلیل محتوا
-                        tweet.analyze_sentiment_with_local_processor(self.text_processor)
-                        
-                        # محاسبه امتیاز تعامل
-                        tweet.calculate_engagement_score()
-                        tweet.calculate_virality_score()
-                        
-                        # علامت‌گذاری به عنوان پردازش شده
-                        tweet.is_processed = True
-                        tweet.processing_date = datetime.utcnow()
-                        
-                        # ذخیره در پایگاه داده
-                        db.session.add(tweet)
-                        processed_count += 1
-                        
-                        # کامیت هر 10 توییت
-                        if processed_count % 10 == 0:
-                            db.session.commit()
-                            
-                    except Exception as e:
-                        self.logger.error(f"Error processing tweet {tweet.id}: {e}", exc_info=True)
-                
-                # کامیت نهایی
+                processed_count = self._process_chunk(rows, commit=False) if rows else 0
+                if self.app.config.get('TWEET_WORK_QUEUE_ENABLED', True):
+                    TweetWorkQueue.discard(tweet_ids)
                 db.session.commit()
-                
-                if processed_count > 0:
-                    self.logger.info(f"Processed {processed_count} tweets")
-                
                 return processed_count
-                
             except Exception as e:
-                self.logger.error(f"Error in batch processing tweets: {e}", exc_info=True)
+                self.logger.error(f"Error processing ingested tweets: {e}", exc_info=True)
                 db.session.rollback()
                 return 0
     
-    def analyze_high_engagement_tweets(self, threshold=None, days=1, limit=20):
+    @staticmethod
+    def _unprocessed_columns():
+        """ستون‌های لازم برای پردازش محلی یک توییت"""
+        return db.session.query(
+            Tweet.id, Tweet.text, Tweet.has_ai_analysis,
+            Tweet.likes_count, Tweet.retweets_count, Tweet.replies_count, Tweet.quotes_count
+        )
+    
+    def _process_by_scan(self, limit, chunk_size):
+        """پردازش با پیمایش کلیدی روی id (مناسب برای یک کارگر)"""
+        processed_count = 0
+        last_id = 0
+        
+        while limit is None or processed_count < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - processed_count)
+            
+            try:
+                rows = self._unprocessed_columns().filter(
+                    Tweet.is_processed == False,
+                    Tweet.id > last_id
+                ).order_by(Tweet.id).limit(size).all()
+            except Exception as e:
+                self.logger.error(f"Error loading unprocessed tweets: {e}", exc_info=True)
+                db.session.rollback()
+                break
+            
+            if not rows:
+                break
+            
+            # تکه بعدی بعد از آخرین شناسه این تکه شروع می‌شود (حتی اگر ذخیره این تکه شکست بخورد)
+            last_id = rows[-1].id
+            
+            try:
+                processed_count += self._process_chunk(rows)
+            except Exception as e:
+                self.logger.error(f"Error processing tweets {rows[0].id}-{last_id}: {e}", exc_info=True)
+                db.session.rollback()
+        
+        return processed_count
+    
+    def _process_from_queue(self, limit, chunk_size, fill_queue=True):
+        """
+        پردازش با دریافت انحصاری دسته‌ها از صف کار
+        
+        دسته‌ای که پردازش آن شکست بخورد در صف می‌ماند و پس از پایان مهلت
+        (WORK_QUEUE_LEASE_SECONDS) دوباره برداشته می‌شود.
+        """
+        lease_seconds = self.app.config.get('WORK_QUEUE_LEASE_SECONDS', 300)
+        max_attempts = self.app.config.get('WORK_QUEUE_MAX_ATTEMPTS', 5)
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        
+        # توییت‌هایی که از مسیرهای دیگر (بدون افزودن به صف) ایجاد شده‌اند
+        if fill_queue:
+            try:
+                added = TweetWorkQueue.enqueue_missing(Tweet.is_processed == False)
+                if added:
+                    self.logger.info(f"Added {added} unqueued tweets to work queue")
+            except Exception as e:
+                self.logger.error(f"Error filling work queue: {e}", exc_info=True)
+                db.session.rollback()
+        
+        processed_count = 0
+        while limit is None or processed_count < limit:
+            size = chunk_size if limit is None else min(chunk_size, limit - processed_count)
+            
+            try:
+                token, tweet_ids = TweetWorkQueue.claim(
+                    worker_id, size, lease_seconds=lease_seconds, max_attempts=max_attempts
+                )
+            except Exception as e:
+                self.logger.error(f"Error claiming work queue batch: {e}", exc_info=True)
+                db.session.rollback()
+                break
+            
+            if not tweet_ids:
+                break
+            
+            try:
+                rows = self._unprocessed_columns().filter(
+                    Tweet.id.in_(tweet_ids),
+                    Tweet.is_processed == False
+                ).order_by(Tweet.id).all()
+                
+                if rows:
+                    processed_count += self._process_chunk(rows, commit=False)
+                TweetWorkQueue.complete(token)
+                db.session.commit()
+            except Exception as e:
+                self.logger.error(f"Error processing claimed batch {token}: {e}", exc_info=True)
+                db.session.rollback()
+        
+        return processed_count
+    
+    def _process_chunk(self, rows, commit=True):
+        """
+        تحلیل محلی و ذخیره گروهی یک تکه از توییت‌ها
+        
+        Args:
+            rows: ردیف‌های (id, text, has_ai_analysis و شمارنده‌های تعامل)
+            commit: ثبت تغییرات (False: commit بر عهده فراخواننده است)
+            
+        Returns:
+            تعداد توییت‌های ذخیره شده
+        """
+        # تحلیل دسته‌ای محلی (در صورت تنظیم، در چند فرایند)
+        local_results = self.local_pool.map([row.text or '' for row in rows], mode='sentiment')
+        
+        now = datetime.utcnow()
+        mappings = []
+        for row, local_result in zip(rows, local_results):
+            engagement = Tweet.engagement_score_for(
+                row.likes_count, row.retweets_count, row.replies_count, row.quotes_count
+            )
+            
+            values = {
+                'id': row.id,
+                'engagement_score': engagement,
+                'virality_score': Tweet.virality_score_for(engagement),
+                'is_processed': True,
+                'processing_date': now
+            }
+            
+            # برچسب هوش مصنوعی (مثلاً کپی شده از نماینده خوشه) با تحلیل محلی جایگزین نمی‌شود
+            if not row.has_ai_analysis:
+                values.update(Tweet.local_sentiment_values(local_result))
+            
+            mappings.append(values)
+        
+        db.session.bulk_update_mappings(Tweet, mappings)
+        if commit:
+            db.session.commit()
+        
+        return len(mappings)
+    
+    def analyze_high_engagement_tweets(self, threshold=None, days=1, limit=20, backlog=False):
         """
         تحلیل پیشرفته توییت‌های با تعامل بالا
         
+        توییت‌ها به ترتیب سرعت تعامل (و سپس امتیاز تعامل) انتخاب می‌شوند تا توییت‌هایی
+        که همین حالا در حال ویروسی شدن هستند بر توییت‌های قدیمی پرامتیاز مقدم باشند.
+        
         Args:
             threshold: آستانه امتیاز تعامل (اختیاری)
             days: تعداد روزهای گذشته برای بررسی
             limit: حداکثر تعداد توییت‌ها برای تحلیل
+            backlog: ارسال به صورت کار دسته‌ای ناهمزمان به جای تحلیل فوری
             
         Returns:
             تعداد توییت‌های تحلیل شده
@@ -153,20 +444,55 @@ class TweetProcessor:
                 # محاسبه زمان شروع
                 start_time = datetime.utcnow() - timedelta(days=days)
                 
+                # توییت‌های پرتعامل یا در حال رشد سریع
+                min_velocity = self.app.config.get('AI_PRIORITY_MIN_VELOCITY', 10.0)
+                engagement_filter = or_(
+                    Tweet.engagement_score >= threshold,
+                    Tweet.engagement_velocity >= min_velocity
+                )
+                
+                if backlog:
+                    return self.submit_ai_backlog_batch(
+                        query_filter=and_(
+                            engagement_filter,
+                            Tweet.has_ai_analysis == False,
+                            Tweet.created_at >= start_time
+                        ),
+                        limit=limit
+                    )
+                
                 # یافتن توییت‌های پرتعامل
-                # - توییت‌هایی که امتیاز تعامل آنها بالاتر از آستانه است
+                # - توییت‌هایی که امتیاز تعامل یا سرعت تعامل آنها بالاتر از آستانه است
                 # - توییت‌هایی که هنوز تحلیل هوش مصنوعی نشده‌اند
                 # - توییت‌هایی که در بازه زمانی مورد نظر هستند
                 high_engagement_tweets = Tweet.query.filter(
                     and_(
-                        Tweet.engagement_score >= threshold,
+                        engagement_filter,
                         Tweet.has_ai_analysis == False,
                         Tweet.created_at >= start_time
                     )
-                ).order_by(desc(Tweet.engagement_score)).limit(limit).all()
+                ).order_by(
+                    desc(db.func.coalesce(Tweet.engagement_velocity, 0)),
+                    desc(Tweet.engagement_score)
+                ).limit(limit).all()
                 
-                analyzed_count = 0
+                # هر خوشه فقط یک بار (از طریق نماینده‌اش) تحلیل می‌شود
+                targets = {}
                 for tweet in high_engagement_tweets:
+                    representative_id = tweet.id if tweet.is_cluster_representative else tweet.cluster_id
+                    targets.setdefault(representative_id, tweet)
+                
+                representatives = {
+                    tweet.id: tweet for tweet in Tweet.query.filter(Tweet.id.in_(list(targets))).all()
+                }
+                
+                analyzed_count = 0
+                for representative_id, member in targets.items():
+                    # اگر نماینده حذف شده باشد، خود توییت تحلیل می‌شود
+                    tweet = representatives.get(representative_id, member)
+                    if tweet.has_ai_analysis:
+                        continue
+                    
                     try:
                         # تحلیل با هوش مصنوعی
                         sentiment = tweet.analyze_sentiment_with_ai(force=True)
@@ -189,6 +515,12 @@ class TweetProcessor:
                 # کامیت نهایی
                 db.session.commit()
                 
+                # انتقال برچسب‌ها به اعضای خوشه‌ها
+                propagated = Tweet.propagate_cluster_labels(targets)
+                if propagated:
+                    db.session.commit()
+                    self.logger.info(f"Propagated AI labels to {propagated} near-duplicate tweets")
+                
                 if analyzed_count > 0:
                     self.logger.info(f"AI-analyzed {analyzed_count} high engagement tweets")
                 
@@ -199,55 +531,118 @@ class TweetProcessor:
                 db.session.rollback()
                 return 0
     
-    def start_background_processing(self, interval_seconds=300):
+    @property
+    def is_running(self):
+        """آیا پردازش پس‌زمینه فعال است"""
+        return self.worker_pool is not None and self.worker_pool.is_running
+    
+    def start_background_processing(self, interval_seconds=300, workers=None, ingest_workers=None):
         """
         شروع پردازش خودکار توییت‌ها در پس‌زمینه
         
+        یک استخر کارگر نظارت شده راه‌اندازی می‌شود:
+        - کارگرهای صف دریافت توییت‌های تازه را بلافاصله پس از ثبت پردازش می‌کنند.
+        - کارگرهای پیمایش دسته‌های جدا از هم را از صف کار پایگاه داده برمی‌دارند و
+          پس از خالی شدن صف تا پیمایش بعدی (interval_seconds) منتظر می‌مانند.
+        
         Args:
-            interval_seconds: فاصله زمانی بین اجراها (ثانیه)
+            interval_seconds: فاصله زمانی بین پیمایش‌های اطمینان (ثانیه)
+            workers: تعداد کارگرهای پیمایش (پیش‌فرض: PROCESSOR_WORKERS)
+            ingest_workers: تعداد کارگرهای صف دریافت (پیش‌فرض: INGEST_WORKERS)
             
         Returns:
             bool: آیا شروع شد
         """
-        import threading
-        
         if self.is_running:
             return False
         
-        self.is_running = True
+        if workers is None:
+            workers = self.app.config.get('PROCESSOR_WORKERS', 1)
+        if ingest_workers is None:
+            ingest_workers = self.app.config.get('INGEST_WORKERS', 2)
+        
+        # بدون صف کار، چند کارگر پیمایش دسته‌های یکسان را برمی‌دارند
+        if not self.app.config.get('TWEET_WORK_QUEUE_ENABLED', True):
+            workers = min(workers, 1)
         
-        def background_worker():
-            """کارگر پس‌زمینه برای پردازش توییت‌ها"""
-            self.logger.info("Background tweet processing started")
+        chunk_size = self.app.config.get('PROCESSING_CHUNK_SIZE', 1000)
+        ingest_batch_size = self.app.config.get('INGEST_BATCH_SIZE', 100)
+        ai_batch_size = self.app.config.get('AI_PRIORITY_BATCH_SIZE', 20)
+        
+        pool = WorkerPool(
+            name='tweet-processor',
+            heartbeat_timeout=self.app.config.get('PROCESSOR_HEARTBEAT_TIMEOUT', 600),
+            app=self.app
+        )
+        
+        def sweep(worker):
+            """یک تکه از پیمایش صف کار؛ پس از خالی شدن صف تا پیمایش بعدی منتظر می‌ماند"""
+            processed = self.process_unprocessed_tweets(
+                limit=chunk_size, fill_queue=worker.state.pop('fill_queue', True)
+            )
+            worker.state['fill_queue'] = False
+            if processed:
+                return processed
             
-            while self.is_running:
-                try:
-                    with self.app.app_context():
-                        # پردازش توییت‌های پردازش نشده
-                        processed = self.process_unprocessed_tweets(limit=50)
-                        
-                        # تحلیل توییت‌های پرتعامل
-                        if processed == 0:  # فقط وقتی توییت پردازش نشده‌ای نیست
-                            self.analyze_high_engagement_tweets(limit=10)
-                    
-                except Exception as e:
-                    self.logger.error(f"Error in background processing: {e}", exc_info=True)
-                
-                # انتظار تا اجرای بعدی
-                time.sleep(interval_seconds)
+            # تحلیل توییت‌های پرتعامل فقط توسط یک کارگر (پس از خالی شدن صف)
+            if worker.index == 0:
+                worker.heartbeat()
+                self.analyze_high_engagement_tweets(limit=10)
             
-            self.logger.info("Background tweet processing stopped")
+            pool.wait(interval_seconds, worker)
+            worker.state['fill_queue'] = True
+            return 0
         
-        # شروع پردازش در یک thread جداگانه
-        self.processing_thread = threading.Thread(target=background_worker)
-        self.processing_thread.daemon = True
-        self.processing_thread.start()
+        def prioritize(worker):
+            """یک دسته از صف اولویت هوش مصنوعی در محدوده بودجه ساعتی"""
+            window_start, budget = self._ai_priority_budget()
+            if budget.exhausted:
+                # انتظار تا شروع پنجره بعدی بودجه
+                pool.wait(max(1.0, 3600 - (time.monotonic() - window_start)), worker)
+                return 0
+            
+            if not len(self.ai_priority):
+                pool.wait(self.app.config.get('AI_PRIORITY_IDLE_SECONDS', 5), worker)
+                return 0
+            
+            return self.analyze_priority_tweets(ai_batch_size, budget=budget)
+        
+        def consume(worker):
+            """یک دسته از صف دریافت"""
+            with pool.idle(worker):
+                tweet_ids = self.ingest_bus.get_batch(max_items=ingest_batch_size, timeout=1.0)
+            return self.process_tweet_ids(tweet_ids) if tweet_ids else 0
+        
+        pool.add_worker(sweep, kind='sweep', count=workers)
+        if self.ingest_bus is not None:
+            pool.add_worker(consume, kind='ingest', count=ingest_workers)
+            self.ingest_bus.open()
+        
+        if self.ai_priority is not None and self.ai_analyzer:
+            try:
+                with self.app.app_context():
+                    self._warm_ai_priority()
+            except Exception as e:
+                self.logger.error(f"Error warming AI priority queue: {e}", exc_info=True)
+            pool.add_worker(prioritize, kind='ai', count=self.app.config.get('AI_PRIORITY_WORKERS', 1))
         
+        self.worker_pool = pool
+        pool.start()
+        
+        self.logger.info(f"Background tweet processing started with {workers} sweep and "
+                         f"{ingest_workers if self.ingest_bus is not None else 0} ingest workers")
         return True
     
-    def stop_background_processing(self):
+    def stop_background_processing(self, timeout=None):
         """
-        توقف پردازش خودکار توییت‌ها
+        توقف تدریجی پردازش خودکار توییت‌ها
+        
+        انتظار کارگرها بلافاصله قطع می‌شود و دسته‌های در حال پردازش پیش از خروج
+        ذخیره می‌شوند. شناسه‌های باقی‌مانده در صف دریافت در صف کار پایگاه داده
+        می‌مانند و در اجرای بعدی پردازش می‌شوند.
+        
+        Args:
+            timeout: حداکثر زمان انتظار برای پایان دسته‌های جاری (پیش‌فرض: PROCESSOR_DRAIN_TIMEOUT)
         
         Returns:
             bool: آیا متوقف شد
@@ -255,30 +650,71 @@ class TweetProcessor:
         if not self.is_running:
             return False
         
-        self.is_running = False
+        if timeout is None:
+            timeout = self.app.config.get('PROCESSOR_DRAIN_TIMEOUT', 30)
         
-        if self.processing_thread:
-            self.processing_thread.join(timeout=1.0)
-            self.processing_thread = None
+        # توقف پذیرش شناسه‌های جدید پیش از توقف کارگرها
+        if self.ingest_bus is not None:
+            self.ingest_bus.close()
+        
+        remaining = self.worker_pool.stop(timeout=timeout)
+        if remaining:
+            self.logger.warning(f"Background processing stopped before workers finished: {remaining}")
+        else:
+            self.logger.info("Background tweet processing stopped")
         
         return True
     
-    def process_batch_with_ai(self, query_filter=None, limit=20, concurrency=3):
+    def get_worker_stats(self):
+        """
+        آمار کارگرهای پس‌زمینه، صف دریافت و صف کار
+        
+        Returns:
+            dict: وضعیت و توان عملیاتی کارگرها و طول صف‌ها
+        """
+        stats = {
+            "running": self.is_running,
+            "pool": self.worker_pool.stats() if self.worker_pool is not None else None,
+            "ingest_bus": self.ingest_bus.stats() if self.ingest_bus is not None else None,
+            "ai_priority": self.ai_priority.stats() if self.ai_priority is not None else None,
+            "ai_priority_budget": self.ai_priority_window[1].stats() if self.ai_priority_window else None,
+            "work_queue": None
+        }
+        
+        if self.app.config.get('TWEET_WORK_QUEUE_ENABLED', True):
+            try:
+                stats["work_queue"] = TweetWorkQueue.stats(
+                    max_attempts=self.app.config.get('WORK_QUEUE_MAX_ATTEMPTS', 5)
+                )
+            except Exception as e:
+                self.logger.error(f"Error reading work queue stats: {e}")
+                db.session.rollback()
+        
+        return stats
+    
+    def process_batch_with_ai(self, query_filter=None, limit=20, concurrency=3, backlog=False,
+                              budget=None, order_by=None):
         """
-        پردازش یک دسته از توییت‌ها با هوش مصنوعی به صورت موازی
+        پردازش یک دسته از توییت‌ها با هوش مصنوعی (چند توییت در هر درخواست)
         
         Args:
             query_filter: فیلتر کوئری برای انتخاب توییت‌ها (اختیاری)
             limit: حداکثر تعداد توییت‌ها
-            concurrency: تعداد پردازش‌های همزمان
+            concurrency: (برای سازگاری) همزمانی درخواست‌ها با ANTHROPIC_MAX_CONCURRENCY تعیین می‌شود
+            backlog: ارسال به صورت کار دسته‌ای ناهمزمان به جای تحلیل فوری
+            budget: بودجه توکن موجود (پیش‌فرض: بودجه جدید AI_JOB_TOKEN_BUDGET برای این دور)
+            order_by: ترتیب انتخاب توییت‌ها (پیش‌فرض: امتیاز تعامل نزولی)
             
         Returns:
-            تعداد توییت‌های پردازش شده
+            تعداد توییت‌های پردازش شده (در حالت backlog: تعداد توییت‌های ارسال شده)
         """
         if not self.ai_analyzer:
             self.logger.warning("AI Analyzer not available for batch processing")
             return 0
         
+        if backlog:
+            return self.submit_ai_backlog_batch(query_filter=query_filter, limit=limit)
+        
         with self.app.app_context():
             try:
                 # ساخت کوئری
@@ -293,32 +729,116 @@ class TweetProcessor:
                         )
                     )
                 
+                # اعضای خوشه‌ها برچسب را از نماینده خوشه می‌گیرند
+                query = query.filter(Tweet.representative_filter())
+                
                 # مرتب‌سازی و محدودسازی
-                tweets = query.order_by(desc(Tweet.engagement_score)).limit(limit).all()
+                if order_by is None:
+                    order_by = desc(Tweet.engagement_score)
+                tweets = query.order_by(order_by).limit(limit).all()
                 
                 if not tweets:
                     return 0
                 
-                # پردازش موازی
-                processed_count = 0
+                # تحلیل دسته‌ای چند توییت در هر درخواست، محدود به بودجه توکن این دور
+                with token_budget(self.app.config.get('AI_JOB_TOKEN_BUDGET'), name='process_batch_with_ai', budget=budget) as budget:
+                    results = self.ai_analyzer.analyze_batch(
+                        [tweet.text or '' for tweet in tweets],
+                        analysis_type='sentiment'
+                    )
                 
-                with ThreadPoolExecutor(max_workers=concurrency) as executor:
-                    futures = [executor.submit(self._process_tweet_with_ai, tweet.id) for tweet in tweets]
+                # توییت‌هایی که به بودجه نرسیدند فقط تحلیل محلی دارند و در دور بعد بررسی می‌شوند
+                skipped = sum(1 for result in results if result.get('budget_exceeded'))
+                if skipped:
+                    self.logger.info(f"Token budget exhausted after {budget.used} tokens; {skipped} tweets left with local analysis only")
+                
+                processed_count = 0
+                for tweet, result in zip(tweets, results):
+                    if result.get('budget_exceeded'):
+                        continue
                     
-                    for future in futures:
-                        try:
-                            success = future.result()
-                            if success:
-                                processed_count += 1
-                        except Exception as e:
-                            self.logger.error(f"Error in parallel tweet processing: {e}", exc_info=True)
+                    if 'error' in result or 'raw_response' in result:
+                        self.logger.warning(f"AI analysis failed for tweet {tweet.id}: {result.get('error', 'invalid response')}")
+                        continue
+                    
+                    tweet.apply_ai_sentiment(result)
+                    processed_count += 1
+                
+                db.session.commit()
+                
+                # انتقال برچسب‌ها به اعضای خوشه‌های تحلیل شده
+                if Tweet.propagate_cluster_labels(tweet.id for tweet in tweets):
+                    db.session.commit()
                 
                 return processed_count
                 
             except Exception as e:
+                db.session.rollback()
                 self.logger.error(f"Error in batch processing with AI: {e}", exc_info=True)
                 return 0
     
+    def analyze_priority_tweets(self, max_items=20, budget=None):
+        """
+        تحلیل هوش مصنوعی سریع‌ترین توییت‌های صف اولویت
+        
+        Args:
+            max_items: حداکثر تعداد توییت‌ها در این دسته
+            budget: بودجه توکن (مثلاً بودجه ساعتی کارگرهای اولویت)
+        
+        Returns:
+            تعداد توییت‌های تحلیل شده
+        """
+        if not self.ai_analyzer or self.ai_priority is None:
+            return 0
+        
+        batch = self.ai_priority.pop_batch(max_items)
+        if not batch:
+            return 0
+        
+        velocities = dict(batch)
+        denied_before = budget.denied if budget is not None else 0
+        processed_count = self.process_batch_with_ai(
+            query_filter=and_(Tweet.id.in_(list(velocities)), Tweet.has_ai_analysis == False),
+            limit=len(batch),
+            budget=budget,
+            order_by=desc(db.func.coalesce(Tweet.engagement_velocity, 0))
+        )
+        
+        # توییت‌هایی که به بودجه نرسیدند با همان اولویت به صف برمی‌گردند
+        if budget is not None and budget.denied > denied_before:
+            with self.app.app_context():
+                pending = db.session.query(Tweet.id).filter(
+                    Tweet.id.in_(list(velocities)),
+                    Tweet.has_ai_analysis == False
+                ).all()
+            for row in pending:
+                self.ai_priority.push(row.id, velocities[row.id])
+        
+        return processed_count
+    
+    def _ai_priority_budget(self):
+        """بودجه توکن پنجره ساعتی جاری کارگرهای اولویت (مشترک بین کارگرها)"""
+        now = time.monotonic()
+        window = self.ai_priority_window
+        if window is None or now - window[0] >= 3600:
+            budget = TokenBudget(self.app.config.get('AI_PRIORITY_TOKEN_BUDGET'), name='ai_priority')
+            window = self.ai_priority_window = (now, budget)
+        return window
+    
+    def _warm_ai_priority(self):
+        """بارگذاری توییت‌های در حال رشد تحلیل نشده پس از راه‌اندازی مجدد"""
+        max_age = timedelta(hours=self.app.config.get('AI_PRIORITY_MAX_AGE_HOURS', 6))
+        rows = db.session.query(Tweet.id, Tweet.engagement_velocity).filter(
+            Tweet.has_ai_analysis == False,
+            Tweet.engagement_velocity >= self.ai_priority.min_velocity,
+            Tweet.metrics_refreshed_at >= datetime.utcnow() - max_age,
+            Tweet.representative_filter()
+        ).order_by(desc(Tweet.engagement_velocity)).limit(self.ai_priority.maxsize).all()
+        
+        for row in rows:
+            self.ai_priority.push(row.id, row.engagement_velocity)
+        return len(rows)
+    
     def _process_tweet_with_ai(self, tweet_id):
         """
         پردازش یک توییت با هوش مصنوعی
@@ -353,4 +873,203 @@ class TweetProcessor:
             except Exception as e:
                 db.session.rollback()
                 self.logger.error(f"Error processing tweet {tweet_id} with AI: {e}", exc_info=True)
-                return False
\ No newline at end of file
+                return False
+    
+    def submit_ai_backlog_batch(self, query_filter=None, limit=None):
+        """
+        ارسال توییت‌های بدون تحلیل هوش مصنوعی به صورت یک کار دسته‌ای ناهمزمان
+        
+        شناسه کار در جدول ai_batch_job ذخیره می‌شود و نتایج بعداً توسط
+        poll_ai_batches دریافت و ذخیره می‌شوند.
+        
+        Args:
+            query_filter: فیلتر کوئری برای انتخاب توییت‌ها (اختیاری)
+            limit: حداکثر تعداد توییت‌ها (پیش‌فرض: AI_BACKLOG_BATCH_SIZE)
+            
+        Returns:
+            تعداد توییت‌های ارسال شده
+        """
+        if not self.ai_analyzer:
+            self.logger.warning("AI Analyzer not available for backlog batch submission")
+            return 0
+        
+        if limit is None:
+            limit = self.app.config.get('AI_BACKLOG_BATCH_SIZE', 5000)
+        
+        with self.app.app_context():
+            try:
+                if query_filter is not None:
+                    query = Tweet.query.filter(query_filter)
+                else:
+                    query = Tweet.query.filter(
+                        and_(
+                            Tweet.is_processed == True,
+                            Tweet.has_ai_analysis == False
+                        )
+                    )
+                
+                # اعضای خوشه‌ها برچسب را از نماینده خوشه می‌گیرند
+                query = query.filter(Tweet.representative_filter())
+                
+                # توییت‌هایی که در کارهای باز در انتظار نتیجه هستند دوباره ارسال نمی‌شوند
+                pending_ids = AIBatchJob.pending_tweet_ids()
+                
+                rows = query.with_entities(Tweet.id, Tweet.text).order_by(
+                    desc(Tweet.engagement_score)
+                ).limit(limit + len(pending_ids)).all()
+                rows = [row for row in rows if row.id not in pending_ids][:limit]
+                
+                if not rows:
+                    return 0
+                
+                batch = self.ai_analyzer.submit_message_batch(
+                    [(f"tweet-{row.id}", row.text or '') for row in rows],
+                    analysis_type='sentiment'
+                )
+                
+                job = AIBatchJob(
+                    batch_id=batch['id'],
+                    analysis_type='sentiment',
+                    model=batch.get('model'),
+                    status=batch['processing_status'],
+                    request_count=len(rows)
+                )
+                job.set_tweet_ids(row.id for row in rows)
+                db.session.add(job)
+                db.session.commit()
+                
+                self.logger.info(f"Submitted {len(rows)} tweets for AI analysis as batch {batch['id']}")
+                
+                return len(rows)
+                
+            except Exception as e:
+                db.session.rollback()
+                self.logger.error(f"Error submitting AI backlog batch: {e}", exc_info=True)
+                return 0
+    
+    def poll_ai_batches(self):
+        """
+        بررسی کارهای دسته‌ای باز و ذخیره نتایج کارهای پایان‌یافته
+        
+        Returns:
+            تعداد توییت‌های به‌روزرسانی شده
+        """
+        if not self.ai_analyzer:
+            return 0
+        
+        with self.app.app_context():
+            updated_count = 0
+            
+            jobs = AIBatchJob.query.filter(AIBatchJob.status.in_(AIBatchJob.OPEN_STATUSES)).all()
+            for job in jobs:
+                try:
+                    updated_count += self._poll_ai_batch_job(job)
+                except Exception as e:
+                    db.session.rollback()
+                    self.logger.error(f"Error polling AI batch {job.batch_id}: {e}", exc_info=True)
+            
+            return updated_count
+    
+    def _poll_ai_batch_job(self, job):
+        """
+        بررسی وضعیت یک کار دسته‌ای و ذخیره نتایج در صورت پایان
+        
+        Args:
+            job: نمونه AIBatchJob
+            
+        Returns:
+            تعداد توییت‌های به‌روزرسانی شده
+        """
+        info = self.ai_analyzer.get_message_batch(job.batch_id)
+        
+        now = datetime.utcnow()
+        job.last_checked_at = now
+        job.status = info['processing_status']
+        
+        if job.status != 'ended':
+            db.session.commit()
+            return 0
+        
+        job.ended_at = job.ended_at or now
+        
+        updated_count, errored_count = self._store_ai_batch_results(job)
+        
+        job.succeeded_count = updated_count
+        job.errored_count = errored_count
+        job.status = 'completed'
+        job.completed_at = datetime.utcnow()
+        db.session.commit()
+        
+        self.logger.info(f"Stored AI batch {job.batch_id} results: {updated_count} succeeded, {errored_count} errored")
+        
+        return updated_count
+    
+    def _store_ai_batch_results(self, job, chunk_size=500):
+        """
+        ذخیره گروهی نتایج یک کار دسته‌ای در جداول tweet و sentiment_analysis
+        
+        Args:
+            job: نمونه AIBatchJob پایان‌یافته
+            chunk_size: تعداد نتایج در هر نوشتن گروهی
+            
+        Returns:
+            (تعداد نتایج ذخیره شده، تعداد نتایج خطادار)
+        """
+        stored_count = 0
+        errored_count = 0
+        results = {}
+        
+        def flush():
+            nonlocal stored_count
+            
+            # توییت‌هایی که در این فاصله حذف شده‌اند نادیده گرفته می‌شوند
+            existing_ids = {
+                row.id for row in Tweet.query.with_entities(Tweet.id).filter(Tweet.id.in_(list(results))).all()
+            }
+            
+            now = datetime.utcnow()
+            tweet_mappings = []
+            analysis_rows = []
+            for tweet_id, result in results.items():
+                if tweet_id not in existing_ids:
+                    continue
+                
+                values = Tweet.ai_sentiment_values(result)
+                tweet_mappings.append(dict(values, id=tweet_id))
+                analysis_rows.append({
+                    'tweet_id': tweet_id,
+                    'analyzer': result.get('model_used') or job.model,
+                    'sentiment': values['sentiment'],
+                    'score': values['sentiment_score'],
+                    'confidence': values['sentiment_confidence'],
+                    'details': values.get('sentiment_details'),
+                    'created_at': now,
+                    'updated_at': now
+                })
+            
+            db.session.bulk_update_mappings(Tweet, tweet_mappings)
+            db.session.bulk_insert_mappings(SentimentAnalysis, analysis_rows)
+            Tweet.propagate_cluster_labels(mapping['id'] for mapping in tweet_mappings)
+            db.session.commit()
+            
+            stored_count += len(tweet_mappings)
+            results.clear()
+        
+        for custom_id, result in self.ai_analyzer.iter_message_batch_results(job.batch_id, job.analysis_type):
+            try:
+                tweet_id = int(custom_id.split('-', 1)[1])
+            except (IndexError, ValueError):
+                continue
+            
+            if 'error' in result:
+                errored_count += 1
+                continue
+            
+            results[tweet_id] = result
+            if len(results) >= chunk_size:
+                flush()
+        
+        if results:
+            flush()
+        
+        return stored_count, errored_count
@@ -0,0 +1,131 @@
+import heapq
+import threading
+import time
+
+
+class AIPriorityQueue:
+    """
+    صف اولویت تحلیل هوش مصنوعی بر اساس سرعت تعامل
+    
+    سرویس جمع‌آوری پس از هر به‌روزرسانی آمار توییت، شناسه آن را با سرعت تعامل
+    (تغییر امتیاز تعامل در هر ساعت) اضافه می‌کند و کارگرهای تحلیل هوش مصنوعی
+    همیشه سریع‌ترین توییت‌ها را برمی‌دارند. هر توییت فقط یک بار (با آخرین سرعت)
+    در صف است و ورودی‌های قدیمی‌تر از max_age_seconds کنار گذاشته می‌شوند.
+    """
+    
+    def __init__(self, app=None, maxsize=10000, min_velocity=10.0, max_age_seconds=6 * 3600):
+        """
+        Args:
+            app: نمونه برنامه Flask (اختیاری)
+            maxsize: حداکثر تعداد توییت‌ها (کندترین‌ها حذف می‌شوند)
+            min_velocity: حداقل سرعت تعامل برای ورود به صف
+            max_age_seconds: عمر ورودی‌ها پیش از کنار گذاشته شدن
+        """
+        self.maxsize = maxsize
+        self.min_velocity = min_velocity
+        self.max_age_seconds = max_age_seconds
+        
+        # heap از (-سرعت، زمان افزودن، شناسه)؛ entries: شناسه -> ورودی معتبر
+        self._heap = []
+        self._entries = {}
+        self._lock = threading.Lock()
+        
+        # آمار
+        self.pushed = 0
+        self.popped = 0
+        self.expired = 0
+        self.evicted = 0
+        
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """اتصال به برنامه Flask"""
+        self.maxsize = app.config.get('AI_PRIORITY_MAXSIZE', self.maxsize)
+        self.min_velocity = app.config.get('AI_PRIORITY_MIN_VELOCITY', self.min_velocity)
+        self.max_age_seconds = app.config.get('AI_PRIORITY_MAX_AGE_HOURS', self.max_age_seconds / 3600) * 3600
+        
+        app.extensions['ai_priority_queue'] = self
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def push(self, tweet_id, velocity):
+        """
+        افزودن یا به‌روزرسانی اولویت یک توییت
+        
+        Args:
+            tweet_id: شناسه توییت (نماینده خوشه)
+            velocity: سرعت تعامل (امتیاز در ساعت)
+        
+        Returns:
+            bool: آیا توییت در صف قرار گرفت
+        """
+        if velocity is None or velocity < self.min_velocity:
+            return False
+        
+        entry = (-velocity, time.monotonic(), tweet_id)
+        with self._lock:
+            # ورودی قبلی همین توییت بی‌اعتبار می‌شود و هنگام برداشت نادیده گرفته می‌شود
+            self._entries[tweet_id] = entry
+            heapq.heappush(self._heap, entry)
+            self.pushed += 1
+            
+            # حذف کندترین‌ها و ورودی‌های بی‌اعتبار انباشته شده در heap
+            if len(self._entries) > self.maxsize or len(self._heap) > 2 * self.maxsize:
+                self._trim()
+        return True
+    
+    def _trim(self):
+        """حذف کندترین توییت‌ها تا رسیدن به maxsize (با قفل)"""
+        kept = heapq.nsmallest(self.maxsize, self._entries.values())
+        self.evicted += len(self._entries) - len(kept)
+        self._heap = list(kept)
+        heapq.heapify(self._heap)
+        self._entries = {entry[2]: entry for entry in kept}
+    
+    def pop_batch(self, max_items):
+        """
+        برداشت سریع‌ترین توییت‌ها
+        
+        Returns:
+            list: (شناسه توییت، سرعت تعامل) به ترتیب نزولی سرعت
+        """
+        now = time.monotonic()
+        batch = []
+        with self._lock:
+            while self._heap and len(batch) < max_items:
+                entry = heapq.heappop(self._heap)
+                negative_velocity, pushed_at, tweet_id = entry
+                if self._entries.get(tweet_id) is not entry:
+                    continue
+                
+                del self._entries[tweet_id]
+                if now - pushed_at > self.max_age_seconds:
+                    self.expired += 1
+                    continue
+                
+                batch.append((tweet_id, -negative_velocity))
+            
+            self.popped += len(batch)
+        return batch
+    
+    def stats(self):
+        """
+        آمار صف
+        
+        Returns:
+            dict: تعداد توییت‌های در انتظار، سریع‌ترین سرعت و شمارنده‌ها
+        """
+        with self._lock:
+            top = -self._heap[0][0] if self._heap else None
+            size = len(self._entries)
+        return {
+            "pending": size,
+            "top_velocity": top,
+            "min_velocity": self.min_velocity,
+            "pushed": self.pushed,
+            "popped": self.popped,
+            "expired": self.expired,
+            "evicted": self.evicted
+        }
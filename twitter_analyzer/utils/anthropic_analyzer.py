@@ -1,11 +1,63 @@
 import anthropic
+import asyncio
+import contextvars
+import concurrent.futures
+import threading
 import logging
 import json
+import math
+import re
 from typing import Dict, List, Tuple, Optional, Any, Union
-from functools import lru_cache
 import os
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import copy
+import csv
+import io
+import inspect
+from collections import deque
+from .result_cache import AnalysisResultCache, normalize_for_cache
+from .local_screen import LocalScreener
+from .concurrency import AdaptiveConcurrencyController
+from .token_budget import TokenEstimator, TokenBudgetExceeded, current_budget
+from .report_engine import MapReduceReportEngine
+from .history import JsonlHistorySink
+from .cascade import CascadeThresholds, CASCADE_TIERS
+
+# نسخه پرامپت‌های سیستمی؛ با هر تغییر در _create_system_prompt افزایش یابد
+# تا نتایج کش شده با پرامپت‌های قبلی استفاده نشوند
+PROMPT_VERSION = 2
+
+# انواع تحلیلی که امکان ارسال دسته‌ای چند متن در یک درخواست را دارند
+BATCH_ANALYSIS_TYPES = ("sentiment", "spam", "inappropriate")
+
+# حداکثر توکن خروجی به ازای هر متن در درخواست‌های دسته‌ای
+BATCH_ITEM_MAX_TOKENS = 200
+
+# نام ثبت‌شده به عنوان model_used برای تصمیم‌های غربالگر محلی
+LOCAL_SCREENER_MODEL = "local-screener"
+
+# نتایج ساده برای متن‌هایی که در بررسی اولیه نیاز به تحلیل ندارند
+SCREENED_RESULTS = {
+    "sentiment": {
+        "sentiment": "neutral",
+        "confidence": 0.9,
+        "intensity": 0.1,
+        "primary_emotion": "none",
+        "emotional_words": []
+    },
+    "spam": {
+        "is_spam": False,
+        "confidence": 0.9,
+        "spam_type": None,
+        "spam_indicators": []
+    },
+    "inappropriate": {
+        "is_inappropriate": False,
+        "confidence": 0.9,
+        "categories": [],
+        "problematic_phrases": []
+    }
+}
 
 class AnthropicTextAnalyzer:
     """
@@ -13,35 +65,79 @@ class AnthropicTextAnalyzer:
     این ماژول از استراتژی کاهش هزینه با استفاده از مدل‌های مختلف استفاده می‌کند
     """
     
-    def __init__(self, api_key=None, app=None):
+    def __init__(self, api_key=None, app=None, result_cache=None, base_url=None, history_size=1000, history_sink=None):
         """
         مقداردهی اولیه آنالایزر با کلید API و پارامترهای اختیاری
         
         Args:
             api_key: کلید API آنتروپیک (اختیاری)
             app: نمونه برنامه فلسک (اختیاری)
+            result_cache: نمونه AnalysisResultCache (اختیاری، پیش‌فرض: کش در حافظه)
+            base_url: آدرس پایه API (اختیاری، مثلاً سرور شبیه‌ساز محلی برای تست)
+            history_size: اندازه بافر حلقوی تاریخچه در حافظه
+            history_sink: نمونه JsonlHistorySink برای ذخیره کامل تاریخچه روی دیسک (اختیاری)
         """
         # تنظیم کلید API
         self.api_key = api_key or os.environ.get('ANTHROPIC_API_KEY')
         if not self.api_key:
             raise ValueError("ANTHROPIC_API_KEY is required. Set it as an environment variable or pass it to the constructor.")
         
-        # ایجاد کلاینت آنتروپیک
-        self.client = anthropic.Anthropic(api_key=self.api_key)
+        # ایجاد کلاینت‌های همزمان و ناهمزمان آنتروپیک
+        self.base_url = base_url
+        self._create_clients()
         
         # مدل‌ها برای تحلیل‌های مختلف
         self.screening_model = "claude-3-5-haiku-20241022"  # مدل ارزان برای بررسی اولیه
         self.analysis_model = "claude-3-5-haiku-20241022"  # مدل ارزان برای تحلیل عمیق‌تر
         self.reporting_model = "claude-3-5-sonnet-20241022"  # مدل متوسط برای گزارش‌های نهایی
         
+        # تعداد متن‌ها در هر درخواست دسته‌ای
+        self.batch_size = 20
+        
+        # گزارش map-reduce: میانگین متن‌های هر تکه و تعداد خلاصه‌های ادغام شده در هر مرحله
+        self.report_chunk_size = 100
+        self.report_reduce_fanout = 8
+        
+        # حالت تحلیل کامل: combined (یک فراخوانی) یا split (بررسی اولیه و سه فراخوانی)
+        self.full_analysis_mode = "combined"
+        
+        # کنترل تطبیقی درخواست‌های همزمان (پنجره بین 1 و max_concurrency) و تلاش مجدد
+        self.max_concurrency = 50
+        self.initial_concurrency = 10
+        self.max_retries = 4
+        self._create_concurrency_controller()
+        
+        # حلقه رویداد اختصاصی برای نمای همزمان متدهای ناهمزمان
+        self._loop = None
+        self._loop_thread = None
+        self._loop_lock = threading.Lock()
+        
+        # تخمین محلی توکن‌ها (کالیبره شده با usage پاسخ‌ها) و مصرف واقعی هر مدل
+        self.token_estimator = TokenEstimator()
+        self.token_calibration_samples = 5
+        self._token_calibration_attempted = False
+        self.token_usage = {}
+        self._usage_lock = threading.Lock()
+        
         # تنظیم لاگر
         self.logger = logging.getLogger("anthropic_analyzer")
         
-        # ذخیره تاریخچه تحلیل‌ها
-        self.analysis_history = []
+        # تاریخچه تحلیل‌ها: بافر حلقوی محدود در حافظه و ذخیره‌ساز اختیاری روی دیسک
+        self.analysis_history = deque(maxlen=history_size)
+        self.history_sink = history_sink
         
-        # کش‌کردن برخی عملیات‌های پرتکرار
+        # پرامپت‌های سیستمی ساخته شده (بر اساس نوع و نسخه) و استفاده از کش پرامپت سرویس
         self._cached_prompts = {}
+        self.prompt_caching = True
+        
+        # کش نتایج تحلیل بر اساس محتوای متن
+        self.result_cache = result_cache if result_cache is not None else AnalysisResultCache()
+        
+        # غربالگر محلی (اختیاری) و آستانه‌های تصمیم آن؛ فقط متن‌های نامطمئن به مدل ارجاع می‌شوند
+        self.local_screener = None
+        self.screener_low = 0.15
+        self.screener_high = 0.85
+        self.screening_stats = {"local_skip": 0, "local_analyze": 0, "escalated": 0}
         
         if app is not None:
             self.init_app(app)
@@ -52,9 +148,10 @@ class AnthropicTextAnalyzer:
         
         # تنظیم config‌های برنامه
         if hasattr(app, 'config'):
-            if 'ANTHROPIC_API_KEY' in app.config:
-                self.api_key = app.config['ANTHROPIC_API_KEY']
-                self.client = anthropic.Anthropic(api_key=self.api_key)
+            if 'ANTHROPIC_API_KEY' in app.config or app.config.get('ANTHROPIC_BASE_URL'):
+                self.api_key = app.config.get('ANTHROPIC_API_KEY') or self.api_key
+                self.base_url = app.config.get('ANTHROPIC_BASE_URL') or self.base_url
+                self._create_clients()
             
             if 'ANTHROPIC_SCREENING_MODEL' in app.config:
                 self.screening_model = app.config['ANTHROPIC_SCREENING_MODEL']
@@ -64,44 +161,251 @@ class AnthropicTextAnalyzer:
             
             if 'ANTHROPIC_REPORTING_MODEL' in app.config:
                 self.reporting_model = app.config['ANTHROPIC_REPORTING_MODEL']
+            
+            self.token_calibration_samples = app.config.get('TOKEN_ESTIMATOR_CALIBRATION_SAMPLES', self.token_calibration_samples)
+            
+            if 'ANALYSIS_BATCH_SIZE' in app.config:
+                self.batch_size = max(1, app.config['ANALYSIS_BATCH_SIZE'])
+            
+            history_size = app.config.get('ANALYSIS_HISTORY_SIZE')
+            if history_size and history_size != self.analysis_history.maxlen:
+                self.analysis_history = deque(self.analysis_history, maxlen=history_size)
+            
+            history_path = app.config.get('ANALYSIS_HISTORY_PATH')
+            if history_path and self.history_sink is None:
+                self.history_sink = JsonlHistorySink(
+                    history_path,
+                    max_bytes=app.config.get('ANALYSIS_HISTORY_MAX_BYTES', 10 * 1024 * 1024),
+                    backup_count=app.config.get('ANALYSIS_HISTORY_BACKUPS', 5)
+                )
+            
+            self.report_chunk_size = app.config.get('REPORT_CHUNK_SIZE', self.report_chunk_size)
+            self.report_reduce_fanout = app.config.get('REPORT_REDUCE_FANOUT', self.report_reduce_fanout)
+            
+            if 'ANTHROPIC_FULL_ANALYSIS_MODE' in app.config:
+                self.full_analysis_mode = app.config['ANTHROPIC_FULL_ANALYSIS_MODE']
+            
+            if 'ANTHROPIC_MAX_CONCURRENCY' in app.config:
+                self.max_concurrency = max(1, app.config['ANTHROPIC_MAX_CONCURRENCY'])
+            
+            self.prompt_caching = app.config.get('ANTHROPIC_PROMPT_CACHING', self.prompt_caching)
+            self.initial_concurrency = app.config.get('ANTHROPIC_INITIAL_CONCURRENCY', self.initial_concurrency)
+            self.max_retries = app.config.get('ANTHROPIC_MAX_RETRIES', self.max_retries)
+            self._create_concurrency_controller()
+            
+            if not app.config.get('ANALYSIS_CACHE_ENABLED', True):
+                self.result_cache = None
+            elif 'ANALYSIS_CACHE_PATH' in app.config:
+                cache_path = app.config['ANALYSIS_CACHE_PATH'] or ':memory:'
+                if cache_path != ':memory:':
+                    os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+                
+                self.result_cache = AnalysisResultCache(
+                    path=cache_path,
+                    ttl=app.config.get('ANALYSIS_CACHE_TTL', 7 * 24 * 3600),
+                    max_entries=app.config.get('ANALYSIS_CACHE_MAX_ENTRIES', 100000),
+                    evict_interval=app.config.get('ANALYSIS_CACHE_EVICT_INTERVAL', 300)
+                )
+            
+            self.screener_low = app.config.get('LOCAL_SCREENER_LOW', self.screener_low)
+            self.screener_high = app.config.get('LOCAL_SCREENER_HIGH', self.screener_high)
+            
+            screener_path = app.config.get('LOCAL_SCREENER_PATH')
+            if screener_path and os.path.exists(screener_path):
+                try:
+                    self.local_screener = LocalScreener.load(screener_path)
+                except (OSError, ValueError, KeyError) as e:
+                    app.logger.error(f"Error loading local screener from {screener_path}: {str(e)}")
         
         # تنظیم لاگر برنامه
         if app.logger:
             self.logger = app.logger
     
-    @lru_cache(maxsize=100)
+    def _create_clients(self):
+        """ایجاد کلاینت‌های آنتروپیک با کلید و آدرس پایه فعلی"""
+        kwargs = {"api_key": self.api_key}
+        if self.base_url:
+            kwargs["base_url"] = self.base_url
+        
+        self.client = anthropic.Anthropic(**kwargs)
+        # تلاش مجدد درخواست‌های تحلیل با کنترل‌کننده همزمانی انجام می‌شود، نه SDK
+        self.async_client = anthropic.AsyncAnthropic(max_retries=0, **kwargs)
+    
+    def _create_concurrency_controller(self):
+        """ایجاد کنترل‌کننده همزمانی با تنظیمات فعلی"""
+        self.concurrency = AdaptiveConcurrencyController(
+            max_limit=self.max_concurrency,
+            initial_limit=self.initial_concurrency,
+            max_retries=self.max_retries,
+            retry_exceptions=(anthropic.APIConnectionError,)
+        )
+    
     def _count_tokens(self, model: str, text: str) -> int:
         """
-        تخمین تعداد توکن‌های یک متن
+        تخمین محلی تعداد توکن‌های یک متن (بدون فراخوانی API)
         
         Args:
             model: نام مدل برای تخمین توکن
             text: متن برای شمارش توکن
-            
+        
         Returns:
             تعداد تخمینی توکن‌ها
         """
-        try:
-            count = self.client.messages.count_tokens(
-                model=model,
-                messages=[{"role": "user", "content": text}]
-            )
-            return count.input_tokens
-        except Exception as e:
-            self.logger.error(f"Token counting error: {str(e)}")
-            # تخمین ساده: هر 4 کاراکتر تقریباً یک توکن
-            return len(text) // 4
+        return self.token_estimator.estimate(text)
+    
+    def calibrate_token_estimator(self, texts: List[str], model: Optional[str] = None) -> Dict[str, Any]:
+        """
+        کالیبره کردن تخمین‌گر توکن با API شمارش توکن روی چند متن نمونه
+        
+        تخمین‌گر با usage پاسخ‌ها به صورت خودکار کالیبره می‌شود؛ این متد فقط برای
+        کالیبراسیون اولیه (مثلاً پس از تغییر مدل) است.
+        
+        Args:
+            texts: متن‌های نمونه
+            model: نام مدل (پیش‌فرض: مدل تحلیل)
+        
+        Returns:
+            آمار تخمین‌گر
+        """
+        for text in texts:
+            try:
+                count = self.client.messages.count_tokens(
+                    model=model or self.analysis_model,
+                    messages=[{"role": "user", "content": text}]
+                )
+            except Exception as e:
+                self.logger.error(f"Token counting error: {str(e)}")
+                continue
+            self.token_estimator.observe(self.token_estimator.raw_estimate(text), count.input_tokens)
+        
+        return self.token_estimator.stats()
+    
+    def _calibrate_token_estimator_once(self, texts: List[str]) -> None:
+        """
+        کالیبراسیون اولیه تخمین‌گر پیش از اولین کار دارای سقف بودجه
+        
+        تا پیش از دریافت اولین usage، رزروها فقط بر تخمین خام تکیه دارند؛ چند متن
+        نمونه همان کار یک بار (در هر فرایند) با API شمارش توکن سنجیده می‌شوند.
+        """
+        budget = current_budget()
+        if (self._token_calibration_attempted or self.token_estimator.samples
+                or not self.token_calibration_samples or budget is None or budget.limit is None):
+            return
+        
+        self._token_calibration_attempted = True
+        samples = [text for text in texts if text][:self.token_calibration_samples]
+        if samples:
+            stats = self.calibrate_token_estimator(samples)
+            self.logger.info(f"Token estimator calibrated on {len(samples)} texts: scale {stats['scale']}")
+    
+    def _reserve_tokens(self, system: str, text: str, max_tokens: int):
+        """
+        تخمین محلی ورودی درخواست و رزرو ورودی و حداکثر خروجی از بودجه کار جاری
+        
+        Raises:
+            TokenBudgetExceeded: اگر بودجه کار جاری کافی نباشد
+        """
+        raw_estimate = self.token_estimator.raw_estimate(system) + self.token_estimator.raw_estimate(text)
+        budget = current_budget()
+        reserved = 0
+        if budget is not None:
+            reserved = budget.reserve(int(math.ceil(raw_estimate * self.token_estimator.scale)) + max_tokens)
+        return budget, raw_estimate, reserved
+    
+    def _record_usage(self, model: str, reservation, response) -> None:
+        """ثبت مصرف واقعی پاسخ در بودجه کار، تخمین‌گر و آمار کلی"""
+        budget, raw_estimate, reserved = reservation
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            if budget is not None:
+                budget.settle(reserved)
+            return
+        
+        # input_tokens شامل بخش خوانده یا نوشته شده در کش پرامپت نیست
+        prompt_tokens = self._add_token_usage(model, usage)
+        
+        if budget is not None:
+            budget.settle(reserved, prompt_tokens, getattr(usage, "output_tokens", 0) or 0)
+        
+        if prompt_tokens:
+            self.token_estimator.observe(raw_estimate, prompt_tokens)
+    
+    def _add_token_usage(self, model: str, usage) -> int:
+        """
+        ثبت usage یک پاسخ در آمار مدل
+        
+        Returns:
+            مجموع توکن‌های ورودی (عادی، خوانده شده از کش و نوشته شده در کش)
+        """
+        values = {
+            field: getattr(usage, field, 0) or 0
+            for field in ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+        }
+        
+        with self._usage_lock:
+            totals = self.token_usage.setdefault(model, dict.fromkeys(("requests",) + tuple(values), 0))
+            totals["requests"] += 1
+            for field, value in values.items():
+                totals[field] += value
+        
+        return values["input_tokens"] + values["cache_read_input_tokens"] + values["cache_creation_input_tokens"]
+    
+    def budget_exhausted(self) -> bool:
+        """آیا بودجه توکن کار جاری تمام شده است"""
+        budget = current_budget()
+        return budget is not None and budget.exhausted
+    
+    def get_token_usage(self) -> Dict[str, Any]:
+        """
+        آمار مصرف توکن
+        
+        Returns:
+            مصرف هر مدل، مجموع مصرف و وضعیت کالیبراسیون تخمین‌گر
+        """
+        with self._usage_lock:
+            models = copy.deepcopy(self.token_usage)
+        
+        totals = {
+            field: sum(usage[field] for usage in models.values())
+            for field in ("input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens")
+        }
+        prompt_tokens = totals["input_tokens"] + totals["cache_read_input_tokens"] + totals["cache_creation_input_tokens"]
+        
+        return {
+            "models": models,
+            "total_input_tokens": totals["input_tokens"],
+            "total_output_tokens": totals["output_tokens"],
+            "prompt_cache": {
+                "enabled": self.prompt_caching,
+                "read_tokens": totals["cache_read_input_tokens"],
+                "creation_tokens": totals["cache_creation_input_tokens"],
+                "hit_rate": totals["cache_read_input_tokens"] / prompt_tokens if prompt_tokens else 0.0
+            },
+            "estimator": self.token_estimator.stats()
+        }
     
     def _create_system_prompt(self, analysis_type: str) -> str:
         """
-        ایجاد پرامپت سیستمی مناسب برای نوع تحلیل
+        پرامپت سیستمی مناسب برای نوع تحلیل
+        
+        هر پرامپت یک بار برای هر نوع و نسخه ساخته (و تورفتگی‌های آن حذف) می‌شود
+        تا متن آن در همه درخواست‌ها دقیقاً یکسان و قابل کش در سمت سرویس باشد.
         
         Args:
-            analysis_type: نوع تحلیل (screening, sentiment, spam, inappropriate, full)
-            
+            analysis_type: نوع تحلیل (screening, sentiment, spam, inappropriate, full, combined)
+        
         Returns:
             پرامپت سیستمی مناسب
         """
+        key = (analysis_type, PROMPT_VERSION)
+        prompt = self._cached_prompts.get(key)
+        if prompt is None:
+            prompt = inspect.cleandoc(self._build_system_prompt(analysis_type))
+            self._cached_prompts[key] = prompt
+        return prompt
+    
+    def _build_system_prompt(self, analysis_type: str) -> str:
+        """ساخت متن پرامپت سیستمی (از طریق _create_system_prompt استفاده شود)"""
         if analysis_type == "screening":
             return """You are a content screening assistant. Your task is ONLY to determine if text needs further analysis.
             Return a JSON with a single "needs_analysis" field set to true if the text:
@@ -152,12 +456,107 @@ class AnthropicTextAnalyzer:
             - topics: list of detected topics
             ONLY output valid JSON."""
         
+        elif analysis_type == "combined":
+            return """You are a text analysis assistant. Analyze the sentiment, spam likelihood and appropriateness of the given text in one pass.
+            Return a JSON object with exactly these three fields:
+            - sentiment: object with
+                - sentiment: "positive", "negative", or "neutral"
+                - confidence: a float from 0 to 1 indicating your confidence
+                - intensity: a float from 0 to 1 indicating sentiment strength
+                - primary_emotion: the main emotion detected (joy, anger, sadness, etc.)
+                - emotional_words: list of emotion-laden words found in the text
+            - spam: object with
+                - is_spam: boolean
+                - confidence: a float from 0 to 1 indicating your confidence
+                - spam_type: the type of spam if detected (ad, scam, promotional, etc.) or null
+                - spam_indicators: list of patterns or words that indicate spam
+            - inappropriate_content: object with
+                - is_inappropriate: boolean
+                - confidence: a float from 0 to 1 indicating your confidence
+                - categories: list of detected content categories (profanity, hate_speech, violence, sexual, etc.)
+                - problematic_phrases: list of problematic phrases or terms
+            ONLY output valid JSON."""
+        
         else:
             return "You are a text analysis assistant. Provide an analysis of the given text."
     
-    async def _call_model_async(self, model: str, system: str, text: str, max_tokens: int = 1000) -> Dict[str, Any]:
+    def _create_batch_system_prompt(self, analysis_type: str) -> str:
         """
-        فراخوانی ناهمزمان مدل کلود
+        ایجاد پرامپت سیستمی برای تحلیل دسته‌ای چند متن در یک درخواست
+        
+        Args:
+            analysis_type: نوع تحلیل (sentiment, spam, inappropriate)
+            
+        Returns:
+            پرامپت سیستمی دسته‌ای
+        """
+        key = ("batch:" + analysis_type, PROMPT_VERSION)
+        prompt = self._cached_prompts.get(key)
+        if prompt is None:
+            prompt = self._create_system_prompt(analysis_type) + "\n\n" + inspect.cleandoc("""
+                BATCH MODE: The input is a JSON array of objects with "id" and "text" fields.
+                Analyze each text independently and return a JSON array with exactly one object per input text,
+                in the same order. Each object must contain an "id" field equal to the input id, plus the fields
+                described above. ONLY output the JSON array.""")
+            self._cached_prompts[key] = prompt
+        return prompt
+    
+    def _system_blocks(self, system: str) -> Union[str, List[Dict[str, Any]]]:
+        """
+        پرامپت سیستمی در قالب درخواست
+        
+        پرامپت ثابت ابتدای درخواست قرار می‌گیرد و متن متغیر در پیام کاربر؛ با نقطه
+        cache_control، سرویس پیشوند ثابت را بین درخواست‌ها از کش می‌خواند.
+        """
+        if not self.prompt_caching:
+            return system
+        return [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+    
+    def _parse_json_response(self, response_text: str) -> Optional[Union[Dict[str, Any], List[Any]]]:
+        """
+        استخراج JSON (شیء یا آرایه) از پاسخ متنی مدل
+        
+        Args:
+            response_text: پاسخ متنی مدل
+            
+        Returns:
+            شیء یا آرایه JSON، یا None در صورت شکست پارس
+        """
+        text = response_text.strip()
+        candidates = []
+        
+        if (text.startswith('{') and text.endswith('}')) or (text.startswith('[') and text.endswith(']')):
+            candidates.append(text)
+        
+        # جستجوی بلوک JSON در پاسخ
+        json_match = re.search(r'```(?:json)?\s*(.*?)\s*```', text, re.DOTALL)
+        if json_match:
+            candidates.append(json_match.group(1))
+        
+        # تلاش دوباره با یافتن اولین { یا [ و آخرین } یا ] متناظر (هر کدام زودتر آمده باشد)
+        brackets = []
+        for open_char, close_char in (('{', '}'), ('[', ']')):
+            start_idx = text.find(open_char)
+            end_idx = text.rfind(close_char)
+            if start_idx != -1 and end_idx > start_idx:
+                brackets.append((start_idx, end_idx))
+        for start_idx, end_idx in sorted(brackets):
+            candidates.append(text[start_idx:end_idx+1])
+        
+        for candidate in candidates:
+            try:
+                return json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+        
+        return None
+    
+    async def _request_text_async(self, model: str, system: str, text: str, max_tokens: int = 1000) -> str:
+        """
+        ارسال ناهمزمان درخواست به مدل و دریافت پاسخ متنی (خطاها به فراخواننده منتقل می‌شوند)
+        
+        تعداد درخواست‌های همزمان با پنجره تطبیقی کنترل‌کننده همزمانی محدود می‌شود
+        و خطاهای شلوغی و گذرا با تأخیر دوباره تلاش می‌شوند.
         
         Args:
             model: مدل مورد استفاده
@@ -166,50 +565,31 @@ class AnthropicTextAnalyzer:
             max_tokens: حداکثر توکن‌های خروجی
             
         Returns:
-            پاسخ مدل
+            پاسخ متنی مدل
         """
+        reservation = self._reserve_tokens(system, text, max_tokens)
+        response = None
         try:
-            response = await self.client.messages.create(
+            response = await self.concurrency.call(
+                self.async_client.messages.create,
+                # تأخیر هر مدل و هر بازه توان دوی max_tokens جداگانه سنجیده می‌شود
+                latency_class=(model, max_tokens.bit_length()),
                 model=model,
                 max_tokens=max_tokens,
-                system=system,
+                system=self._system_blocks(system),
                 messages=[
                     {"role": "user", "content": text}
                 ]
             )
-            
-            # استخراج پاسخ متنی
-            response_text = response.content[0].text if response.content else ""
-            
-            # تلاش برای پارس JSON
-            try:
-                if response_text.strip().startswith('{') and response_text.strip().endswith('}'):
-                    return json.loads(response_text)
-                else:
-                    # جستجوی بلوک JSON در پاسخ
-                    import re
-                    json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
-                    if json_match:
-                        return json.loads(json_match.group(1))
-                    
-                    # تلاش دوباره با یافتن اولین { و آخرین }
-                    start_idx = response_text.find('{')
-                    end_idx = response_text.rfind('}')
-                    if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                        return json.loads(response_text[start_idx:end_idx+1])
-            except json.JSONDecodeError:
-                pass
-            
-            # اگر پارس JSON شکست خورد، پاسخ متنی برگردانده می‌شود
-            return {"raw_response": response_text}
-            
-        except Exception as e:
-            self.logger.error(f"Model call error: {str(e)}")
-            return {"error": str(e)}
+        finally:
+            self._record_usage(model, reservation, response)
+        
+        # استخراج پاسخ متنی
+        return response.content[0].text if response.content else ""
     
-    def _call_model(self, model: str, system: str, text: str, max_tokens: int = 1000) -> Dict[str, Any]:
+    async def _call_model_async(self, model: str, system: str, text: str, max_tokens: int = 1000) -> Dict[str, Any]:
         """
-        فراخوانی همزمان مدل کلود
+        فراخوانی ناهمزمان مدل کلود
         
         Args:
             model: مدل مورد استفاده
@@ -221,45 +601,147 @@ class AnthropicTextAnalyzer:
             پاسخ مدل
         """
         try:
-            response = self.client.messages.create(
-                model=model,
-                max_tokens=max_tokens,
-                system=system,
-                messages=[
-                    {"role": "user", "content": text}
-                ]
-            )
-            
-            # استخراج پاسخ متنی
-            response_text = response.content[0].text if response.content else ""
+            response_text = await self._request_text_async(model, system, text, max_tokens)
             
             # تلاش برای پارس JSON
-            try:
-                if response_text.strip().startswith('{') and response_text.strip().endswith('}'):
-                    return json.loads(response_text)
-                else:
-                    # جستجوی بلوک JSON در پاسخ
-                    import re
-                    json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
-                    if json_match:
-                        return json.loads(json_match.group(1))
-                    
-                    # تلاش دوباره با یافتن اولین { و آخرین }
-                    start_idx = response_text.find('{')
-                    end_idx = response_text.rfind('}')
-                    if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                        return json.loads(response_text[start_idx:end_idx+1])
-            except json.JSONDecodeError:
-                pass
+            parsed = self._parse_json_response(response_text)
+            if isinstance(parsed, dict):
+                return parsed
             
             # اگر پارس JSON شکست خورد، پاسخ متنی برگردانده می‌شود
             return {"raw_response": response_text}
             
+        except TokenBudgetExceeded as e:
+            self.logger.info(str(e))
+            return {"error": str(e), "budget_exceeded": True}
         except Exception as e:
             self.logger.error(f"Model call error: {str(e)}")
             return {"error": str(e)}
     
-    def _screen_text(self, text: str) -> bool:
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        """حلقه رویداد اختصاصی آنالایزر (در یک thread پس‌زمینه)"""
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="anthropic-analyzer-loop", daemon=True)
+                thread.start()
+                self._loop, self._loop_thread = loop, thread
+            return self._loop
+    
+    def _run_sync(self, coro):
+        """
+        اجرای یک coroutine روی حلقه رویداد آنالایزر و انتظار برای نتیجه
+        
+        نمای همزمان متدهای ناهمزمان برای routeهای Flask و کارهای زمان‌بندی شده؛
+        متغیرهای context فراخواننده به task منتقل می‌شوند.
+        
+        Args:
+            coro: coroutine برای اجرا
+            
+        Returns:
+            نتیجه coroutine
+        """
+        loop = self._get_loop()
+        
+        if threading.current_thread() is self._loop_thread:
+            coro.close()
+            raise RuntimeError("Synchronous analyzer methods cannot be called from the analyzer event loop; await the *_async method instead")
+        
+        context = contextvars.copy_context()
+        future = concurrent.futures.Future()
+        
+        def on_done(task):
+            if task.cancelled():
+                future.set_exception(concurrent.futures.CancelledError())
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+        
+        def start():
+            if not future.set_running_or_notify_cancel():
+                coro.close()
+                return
+            # task در context کپی شده فراخواننده ساخته می‌شود
+            task = context.run(loop.create_task, coro)
+            task.add_done_callback(on_done)
+        
+        loop.call_soon_threadsafe(start)
+        return future.result()
+    
+    def _cache_get(self, text: str, analysis_type: str, model: str) -> Optional[Dict[str, Any]]:
+        """دریافت نتیجه کش شده برای متن (در صورت وجود)"""
+        if self.result_cache is None:
+            return None
+        
+        try:
+            cached = self.result_cache.get(self.result_cache.make_key(text, analysis_type, model, PROMPT_VERSION))
+        except Exception as e:
+            self.logger.error(f"Analysis cache read error: {str(e)}")
+            return None
+        
+        if cached is not None:
+            cached["cache_hit"] = True
+        return cached
+    
+    def _cache_set(self, text: str, analysis_type: str, model: str, result: Dict[str, Any]) -> None:
+        """ذخیره نتیجه در کش (نتایج خطادار ذخیره نمی‌شوند)"""
+        if self.result_cache is None or "error" in result:
+            return
+        
+        try:
+            self.result_cache.set(self.result_cache.make_key(text, analysis_type, model, PROMPT_VERSION), result)
+        except Exception as e:
+            self.logger.error(f"Analysis cache write error: {str(e)}")
+    
+    async def _call_model_cached_async(self, analysis_type: str, model: str, system: str, text: str, max_tokens: int = 1000, validator=None, cache_text: Optional[str] = None) -> Dict[str, Any]:
+        """
+        فراخوانی مدل با استفاده از کش نتایج
+        
+        کلید کش از متن نرمال‌شده، نوع تحلیل، مدل و نسخه پرامپت ساخته می‌شود؛
+        نتایج خطادار ذخیره نمی‌شوند.
+        
+        Args:
+            analysis_type: نوع تحلیل (بخشی از کلید کش)
+            model: مدل مورد استفاده
+            system: پرامپت سیستمی
+            text: متن ارسالی به مدل
+            max_tokens: حداکثر توکن‌های خروجی
+            validator: تابع اعتبارسنجی نتیجه (اختیاری)؛ نتایج نامعتبر ذخیره نمی‌شوند
+            cache_text: متن مبنای کلید کش در صورت تفاوت با متن ارسالی (اختیاری)
+            
+        Returns:
+            پاسخ مدل (از کش یا فراخوانی جدید)
+        """
+        if cache_text is None:
+            cache_text = text
+        
+        cached = self._cache_get(cache_text, analysis_type, model)
+        if cached is not None:
+            return cached
+        
+        result = await self._call_model_async(model=model, system=system, text=text, max_tokens=max_tokens)
+        if validator is None or validator(result):
+            self._cache_set(cache_text, analysis_type, model, result)
+        
+        return result
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        آمار کش نتایج تحلیل
+        
+        Returns:
+            آمار hit/miss کش یا وضعیت غیرفعال بودن آن
+        """
+        if self.result_cache is None:
+            return {"enabled": False}
+        
+        stats = self.result_cache.stats()
+        stats["enabled"] = True
+        stats["prompt_version"] = PROMPT_VERSION
+        return stats
+    
+    async def _screen_text_async(self, text: str) -> bool:
         """
         بررسی اولیه متن برای تشخیص نیاز به تحلیل عمیق‌تر
         از مدل ارزان‌تر استفاده می‌کند
@@ -278,112 +760,335 @@ class AnthropicTextAnalyzer:
         else:
             sample = text
         
-        result = self._call_model(
+        result = await self._call_model_cached_async(
+            analysis_type="screening",
             model=self.screening_model,
             system=system,
             text=sample,
-            max_tokens=100  # پاسخ کوتاه کافی است
+            max_tokens=100,  # پاسخ کوتاه کافی است
+            validator=lambda r: isinstance(r, dict) and isinstance(r.get("needs_analysis"), bool)
         )
         
         return result.get("needs_analysis", True)  # در صورت هر گونه خطا، True برمی‌گرداند
     
-    def analyze_sentiment(self, text: str, force_full_analysis: bool = False) -> Dict[str, Any]:
+    def _screen_text_locally(self, text: str) -> Optional[bool]:
         """
-        تحلیل احساسات متن
-        از استراتژی بهینه‌سازی هزینه استفاده می‌کند
+        بررسی اولیه متن با غربالگر محلی (بدون فراخوانی شبکه)
+        
+        Returns:
+            True/False در صورت اطمینان غربالگر، None اگر غربالگری وجود ندارد یا نامطمئن است
+        """
+        if self.local_screener is None:
+            return None
+        
+        decision = self.local_screener.decide(text, self.screener_low, self.screener_high)
+        if decision is None:
+            self.screening_stats["escalated"] += 1
+        elif decision:
+            self.screening_stats["local_analyze"] += 1
+        else:
+            self.screening_stats["local_skip"] += 1
+        
+        return decision
+    
+    def get_screening_stats(self) -> Dict[str, Any]:
+        """
+        آمار غربالگری محلی
+        
+        Returns:
+            تعداد تصمیم‌های محلی، ارجاع‌ها به مدل و اطلاعات آموزش غربالگر
+        """
+        stats = dict(self.screening_stats)
+        total = sum(stats.values())
+        stats["local_rate"] = (total - stats["escalated"]) / total if total else 0.0
+        stats["enabled"] = self.local_screener is not None
+        stats["model"] = self.local_screener.metadata if self.local_screener is not None else None
+        return stats
+    
+    def get_concurrency_stats(self) -> Dict[str, Any]:
+        """
+        آمار کنترل‌کننده همزمانی
+        
+        Returns:
+            اندازه فعلی پنجره، درخواست‌های در جریان، تلاش‌های مجدد و تأخیرها
+        """
+        return self.concurrency.stats()
+    
+    def _screen_text(self, text: str) -> bool:
+        """نسخه همزمان _screen_text_async"""
+        return self._run_sync(self._screen_text_async(text))
+    
+    async def _analyze_single_async(self, analysis_type: str, text: str, force_full_analysis: bool = False) -> Dict[str, Any]:
+        """
+        اجرای یک نوع تحلیل تکی (sentiment, spam, inappropriate) روی متن
         
         Args:
+            analysis_type: نوع تحلیل
             text: متن برای تحلیل
             force_full_analysis: اجبار به تحلیل کامل بدون بررسی اولیه
             
         Returns:
-            نتایج تحلیل احساسات
+            نتایج تحلیل
         """
-        # بررسی اولیه متن با مدل ارزان
-        needs_analysis = force_full_analysis or self._screen_text(text)
+        # بررسی اولیه متن با غربالگر محلی یا مدل ارزان
+        needs_analysis = True
+        screened_by = self.screening_model
+        if not force_full_analysis:
+            # غربالگر محلی فقط روی برچسب‌های احساسات آموزش دیده است؛ متن خنثی ممکن است
+            # اسپم یا نامناسب باشد، پس سایر تحلیل‌ها همیشه با مدل غربال می‌شوند
+            decision = self._screen_text_locally(text) if analysis_type == "sentiment" else None
+            if decision is None:
+                needs_analysis = await self._screen_text_async(text)
+            else:
+                needs_analysis = decision
+                screened_by = LOCAL_SCREENER_MODEL
         
         if not needs_analysis:
             # اگر متن نیاز به تحلیل بیشتر نداشته باشد، یک نتیجه ساده برمی‌گرداند
-            return {
-                "sentiment": "neutral",
-                "confidence": 0.9,
-                "intensity": 0.1,
-                "primary_emotion": "none",
-                "emotional_words": [],
-                "screening": "passed",
-                "model_used": self.screening_model
-            }
-        
-        # تحلیل کامل احساسات با مدل ارزان‌تر
-        system = self._create_system_prompt("sentiment")
-        result = self._call_model(
+            result = copy.deepcopy(SCREENED_RESULTS[analysis_type])
+            result["screening"] = "passed"
+            result["model_used"] = screened_by
+            return result
+        
+        # تحلیل کامل با مدل ارزان‌تر
+        system = self._create_system_prompt(analysis_type)
+        result = await self._call_model_cached_async(
+            analysis_type=analysis_type,
             model=self.analysis_model,
             system=system,
             text=text,
-            max_tokens=500
+            max_tokens=500,
+            validator=lambda r: self._validate_result(analysis_type, r)
         )
         
+        return self._finalize_result(analysis_type, text, result)
+    
+    def _finalize_result(self, analysis_type: str, text: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """افزودن اطلاعات تکمیلی به نتیجه تحلیل و ثبت آن در تاریخچه"""
         # اضافه کردن اطلاعات اضافی به نتیجه
         result["analysis_timestamp"] = datetime.now().isoformat()
         result["model_used"] = self.analysis_model
         
         # ذخیره در تاریخچه
-        self.analysis_history.append({
-            "type": "sentiment",
+        self._record_history(analysis_type, text, result)
+        
+        return result
+    
+    def _record_history(self, analysis_type: str, text: str, result: Dict[str, Any], timestamp: Optional[str] = None) -> None:
+        """ثبت یک تحلیل در بافر تاریخچه و ذخیره‌ساز روی دیسک"""
+        entry = {
+            "type": analysis_type,
             "text": text[:100] + "..." if len(text) > 100 else text,
             "result": result,
-            "timestamp": datetime.now().isoformat()
-        })
+            "timestamp": timestamp or datetime.now().isoformat()
+        }
         
-        return result
+        # append روی deque اتمیک است؛ نوشتن روی دیسک در thread ذخیره‌ساز انجام می‌شود
+        self.analysis_history.append(entry)
+        if self.history_sink is not None:
+            self.history_sink.write(entry)
     
-    def analyze_spam(self, text: str, force_full_analysis: bool = False) -> Dict[str, Any]:
+    def _validate_result(self, analysis_type: str, result: Any) -> bool:
         """
-        تحلیل متن برای تشخیص اسپم
+        اعتبارسنجی ساختار نتیجه یک تحلیل تکی
         
         Args:
-            text: متن برای تحلیل
-            force_full_analysis: اجبار به تحلیل کامل بدون بررسی اولیه
+            analysis_type: نوع تحلیل (sentiment, spam, inappropriate)
+            result: نتیجه دریافتی از مدل
             
         Returns:
-            نتایج تحلیل اسپم
+            آیا نتیجه فیلدهای لازم را با مقادیر معتبر دارد
         """
-        # بررسی اولیه متن با مدل ارزان
-        needs_analysis = force_full_analysis or self._screen_text(text)
+        if not isinstance(result, dict):
+            return False
         
-        if not needs_analysis:
-            # اگر متن نیاز به تحلیل بیشتر نداشته باشد، یک نتیجه ساده برمی‌گرداند
-            return {
-                "is_spam": False,
-                "confidence": 0.9,
-                "spam_type": None,
-                "spam_indicators": [],
-                "screening": "passed",
-                "model_used": self.screening_model
-            }
+        confidence = result.get("confidence")
+        if isinstance(confidence, bool) or not isinstance(confidence, (int, float)) or not 0 <= confidence <= 1:
+            return False
         
-        # تحلیل کامل اسپم با مدل ارزان‌تر
-        system = self._create_system_prompt("spam")
-        result = self._call_model(
-            model=self.analysis_model,
-            system=system,
-            text=text,
-            max_tokens=500
-        )
+        if analysis_type == "sentiment":
+            return result.get("sentiment") in ("positive", "negative", "neutral")
+        elif analysis_type == "spam":
+            return isinstance(result.get("is_spam"), bool)
+        elif analysis_type == "inappropriate":
+            return isinstance(result.get("is_inappropriate"), bool)
         
-        # اضافه کردن اطلاعات اضافی به نتیجه
-        result["analysis_timestamp"] = datetime.now().isoformat()
-        result["model_used"] = self.analysis_model
+        return True
+    
+    async def _call_model_batch_async(self, analysis_type: str, texts: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """
+        تحلیل چند متن در یک درخواست با قرارداد پاسخ آرایه JSON شماره‌گذاری شده
         
-        # ذخیره در تاریخچه
-        self.analysis_history.append({
-            "type": "spam",
-            "text": text[:100] + "..." if len(text) > 100 else text,
-            "result": result,
-            "timestamp": datetime.now().isoformat()
-        })
+        Args:
+            analysis_type: نوع تحلیل
+            texts: متن‌های دسته
+            
+        Returns:
+            نتیجه معتبر هر متن به ترتیب ورودی (None برای موارد نامعتبر یا گم‌شده)
+        """
+        items = [None] * len(texts)
         
-        return result
+        system = self._create_batch_system_prompt(analysis_type)
+        payload = json.dumps([{"id": index + 1, "text": text} for index, text in enumerate(texts)], ensure_ascii=False)
+        
+        try:
+            response_text = await self._request_text_async(
+                model=self.analysis_model,
+                system=system,
+                text=payload,
+                max_tokens=min(8192, BATCH_ITEM_MAX_TOKENS * len(texts))
+            )
+        except TokenBudgetExceeded as e:
+            self.logger.info(str(e))
+            # باقیمانده بودجه برای کل دسته کافی نیست؛ دو نیمه دسته جداگانه امتحان می‌شوند
+            if len(texts) > 1 and not self.budget_exhausted():
+                middle = len(texts) // 2
+                first = await self._call_model_batch_async(analysis_type, texts[:middle])
+                return first + await self._call_model_batch_async(analysis_type, texts[middle:])
+            return items
+        except Exception as e:
+            self.logger.error(f"Batch model call error: {str(e)}")
+            return items
+        
+        parsed = self._parse_json_response(response_text)
+        if isinstance(parsed, dict):
+            # برخی پاسخ‌ها آرایه را درون یک شیء قرار می‌دهند
+            parsed = parsed.get("results")
+        if not isinstance(parsed, list):
+            self.logger.warning("Batch response is not a JSON array, retrying items individually")
+            return items
+        
+        for position, item in enumerate(parsed):
+            if not isinstance(item, dict):
+                continue
+            
+            try:
+                index = int(item.pop("id", position + 1)) - 1
+            except (TypeError, ValueError):
+                continue
+            
+            if 0 <= index < len(texts) and items[index] is None and self._validate_result(analysis_type, item):
+                items[index] = item
+        
+        return items
+    
+    async def analyze_batch_async(self, texts: List[str], analysis_type: str = "sentiment") -> List[Dict[str, Any]]:
+        """
+        تحلیل دسته‌ای متن‌های کوتاه با ارسال چند متن در هر درخواست
+        
+        بررسی اولیه انجام نمی‌شود، چون هزینه یک درخواست دسته‌ای از بررسی
+        تک‌تک متن‌ها کمتر است. متن‌های تکراری یک بار تحلیل می‌شوند، نتایج کش شده
+        بدون درخواست برگردانده می‌شوند و مواردی که در پاسخ دسته‌ای نامعتبر باشند
+        به صورت تکی دوباره تحلیل می‌شوند. همه دسته‌ها به صورت همزمان ارسال
+        می‌شوند (محدود به پنجره کنترل‌کننده همزمانی).
+        
+        Args:
+            texts: لیست متن‌ها
+            analysis_type: نوع تحلیل (sentiment, spam, inappropriate)
+            
+        Returns:
+            لیست نتایج به ترتیب متن‌های ورودی
+        """
+        if analysis_type not in BATCH_ANALYSIS_TYPES:
+            raise ValueError(f"Batch analysis is not supported for: {analysis_type}")
+        
+        results = [None] * len(texts)
+        
+        # متن‌های تکراری (مثلاً ریتوییت‌ها) فقط یک بار ارسال می‌شوند
+        duplicates = {}
+        for index, text in enumerate(texts):
+            duplicates.setdefault(normalize_for_cache(text), []).append(index)
+        
+        pending = []
+        for indices in duplicates.values():
+            index = indices[0]
+            cached = self._cache_get(texts[index], analysis_type, self.analysis_model)
+            if cached is not None:
+                results[index] = self._finalize_result(analysis_type, texts[index], cached)
+            else:
+                pending.append(index)
+        
+        chunks = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        chunk_results = await asyncio.gather(*[
+            self._call_model_batch_async(analysis_type, [texts[index] for index in chunk])
+            for chunk in chunks
+        ])
+        
+        retry = []
+        for chunk, items in zip(chunks, chunk_results):
+            for index, item in zip(chunk, items):
+                if item is None:
+                    retry.append(index)
+                    continue
+                
+                self._cache_set(texts[index], analysis_type, self.analysis_model, item)
+                results[index] = self._finalize_result(analysis_type, texts[index], item)
+        
+        # پس از پایان بودجه توکن، تحلیل تکی هم انجام نمی‌شود
+        if retry and self.budget_exhausted():
+            for index in retry:
+                results[index] = {"error": "Token budget exhausted", "budget_exceeded": True}
+            retry = []
+        
+        # تحلیل تکی مواردی که در پاسخ دسته‌ای معتبر نبودند
+        if retry:
+            self.logger.info(f"Retrying {len(retry)} of {len(texts)} batch items individually")
+            retry_results = await asyncio.gather(*[
+                self._analyze_single_async(analysis_type, texts[index], force_full_analysis=True)
+                for index in retry
+            ])
+            for index, result in zip(retry, retry_results):
+                results[index] = result
+        
+        for indices in duplicates.values():
+            for index in indices[1:]:
+                results[index] = copy.deepcopy(results[indices[0]])
+        
+        return results
+    
+    def analyze_batch(self, texts: List[str], analysis_type: str = "sentiment") -> List[Dict[str, Any]]:
+        """نسخه همزمان analyze_batch_async"""
+        self._calibrate_token_estimator_once(texts)
+        return self._run_sync(self.analyze_batch_async(texts, analysis_type))
+    
+    async def analyze_sentiment_async(self, text: str, force_full_analysis: bool = False) -> Dict[str, Any]:
+        """نسخه ناهمزمان analyze_sentiment"""
+        return await self._analyze_single_async("sentiment", text, force_full_analysis)
+    
+    async def analyze_spam_async(self, text: str, force_full_analysis: bool = False) -> Dict[str, Any]:
+        """نسخه ناهمزمان analyze_spam"""
+        return await self._analyze_single_async("spam", text, force_full_analysis)
+    
+    async def analyze_inappropriate_content_async(self, text: str, force_full_analysis: bool = False) -> Dict[str, Any]:
+        """نسخه ناهمزمان analyze_inappropriate_content"""
+        return await self._analyze_single_async("inappropriate", text, force_full_analysis)
+    
+    def analyze_sentiment(self, text: str, force_full_analysis: bool = False) -> Dict[str, Any]:
+        """
+        تحلیل احساسات متن
+        از استراتژی بهینه‌سازی هزینه استفاده می‌کند
+        
+        Args:
+            text: متن برای تحلیل
+            force_full_analysis: اجبار به تحلیل کامل بدون بررسی اولیه
+            
+        Returns:
+            نتایج تحلیل احساسات
+        """
+        return self._run_sync(self.analyze_sentiment_async(text, force_full_analysis))
+    
+    def analyze_spam(self, text: str, force_full_analysis: bool = False) -> Dict[str, Any]:
+        """
+        تحلیل متن برای تشخیص اسپم
+        
+        Args:
+            text: متن برای تحلیل
+            force_full_analysis: اجبار به تحلیل کامل بدون بررسی اولیه
+            
+        Returns:
+            نتایج تحلیل اسپم
+        """
+        return self._run_sync(self.analyze_spam_async(text, force_full_analysis))
     
     def analyze_inappropriate_content(self, text: str, force_full_analysis: bool = False) -> Dict[str, Any]:
         """
@@ -396,47 +1101,108 @@ class AnthropicTextAnalyzer:
         Returns:
             نتایج تحلیل محتوای نامناسب
         """
-        # بررسی اولیه متن با مدل ارزان
-        needs_analysis = force_full_analysis or self._screen_text(text)
-        
-        if not needs_analysis:
-            # اگر متن نیاز به تحلیل بیشتر نداشته باشد، یک نتیجه ساده برمی‌گرداند
-            return {
-                "is_inappropriate": False,
-                "confidence": 0.9,
-                "categories": [],
-                "problematic_phrases": [],
-                "screening": "passed",
-                "model_used": self.screening_model
-            }
+        return self._run_sync(self.analyze_inappropriate_content_async(text, force_full_analysis))
+    
+    def _validate_combined_result(self, result: Any) -> bool:
+        """
+        اعتبارسنجی دقیق نتیجه تحلیل ترکیبی (هر سه بخش باید معتبر باشند)
+        
+        Args:
+            result: نتیجه دریافتی از مدل
+            
+        Returns:
+            آیا نتیجه ساختار و مقادیر معتبر دارد
+        """
+        return (
+            isinstance(result, dict) and
+            self._validate_result("sentiment", result.get("sentiment")) and
+            self._validate_result("spam", result.get("spam")) and
+            self._validate_result("inappropriate", result.get("inappropriate_content"))
+        )
+    
+    async def analyze_text_full_async(self, text: str) -> Dict[str, Any]:
+        """
+        تحلیل کامل متن (احساسات، اسپم، و محتوای نامناسب)
+        
+        در حالت combined هر سه تحلیل با یک پرامپت و یک فراخوانی مدل انجام می‌شوند
+        و فقط در صورت نامعتبر بودن پاسخ، تحلیل با فراخوانی‌های جداگانه تکرار می‌شود.
+        
+        Args:
+            text: متن برای تحلیل
+            
+        Returns:
+            نتایج کامل تحلیل
+        """
+        if self.full_analysis_mode != "combined":
+            return await self._analyze_text_full_split_async(text)
         
-        # تحلیل کامل محتوای نامناسب با مدل ارزان‌تر
-        system = self._create_system_prompt("inappropriate")
-        result = self._call_model(
+        # غربالگر محلی اینجا استفاده نمی‌شود: خنثی بودن احساس، اسپم نبودن یا مناسب
+        # بودن متن را تضمین نمی‌کند و پاسخ ترکیبی هر سه را در یک فراخوانی می‌دهد
+        result = await self._call_model_cached_async(
+            analysis_type="combined",
             model=self.analysis_model,
-            system=system,
+            system=self._create_system_prompt("combined"),
             text=text,
-            max_tokens=500
+            max_tokens=800,
+            validator=self._validate_combined_result
         )
         
-        # اضافه کردن اطلاعات اضافی به نتیجه
-        result["analysis_timestamp"] = datetime.now().isoformat()
-        result["model_used"] = self.analysis_model
+        if result.get("budget_exceeded"):
+            return result
+        
+        if not self._validate_combined_result(result):
+            self.logger.warning("Combined analysis response failed validation, falling back to split analysis")
+            return await self._analyze_text_full_split_async(text)
+        
+        timestamp = datetime.now().isoformat()
+        for part in ("sentiment", "spam", "inappropriate_content"):
+            result[part]["analysis_timestamp"] = timestamp
+            result[part]["model_used"] = self.analysis_model
+        
+        # ترکیب نتایج
+        full_result = {
+            "sentiment": result["sentiment"],
+            "spam": result["spam"],
+            "inappropriate_content": result["inappropriate_content"],
+            "analysis_timestamp": timestamp,
+            "analysis_mode": "combined",
+            "models_used": {
+                "sentiment": self.analysis_model,
+                "spam": self.analysis_model,
+                "inappropriate": self.analysis_model
+            }
+        }
+        
+        if result.get("cache_hit"):
+            full_result["cache_hit"] = True
         
         # ذخیره در تاریخچه
-        self.analysis_history.append({
-            "type": "inappropriate",
-            "text": text[:100] + "..." if len(text) > 100 else text,
-            "result": result,
-            "timestamp": datetime.now().isoformat()
-        })
+        self._record_history("full", text, full_result, timestamp)
         
-        return result
+        return full_result
     
-    def analyze_text_full(self, text: str) -> Dict[str, Any]:
+    def _screened_full_result(self, model_used: str) -> Dict[str, Any]:
+        """نتیجه ساده تحلیل کامل برای متن‌هایی که در بررسی اولیه نیاز به تحلیل ندارند"""
+        return {
+            "summary": "متن خنثی بدون علامت خاص",
+            "screening": "passed",
+            "sentiment": {
+                "sentiment": "neutral",
+                "confidence": 0.9,
+                "intensity": 0.1
+            },
+            "content_flags": {
+                "is_inappropriate": False,
+                "categories": []
+            },
+            "spam_score": 0.1,
+            "model_used": model_used
+        }
+    
+    async def _analyze_text_full_split_async(self, text: str) -> Dict[str, Any]:
         """
-        تحلیل کامل متن (احساسات، اسپم، و محتوای نامناسب)
-        از اجرای موازی تحلیل‌ها استفاده می‌کند
+        تحلیل کامل متن با بررسی اولیه و سه فراخوانی جداگانه مدل
+        سه تحلیل به صورت همزمان روی حلقه رویداد اجرا می‌شوند
         
         Args:
             text: متن برای تحلیل
@@ -445,35 +1211,18 @@ class AnthropicTextAnalyzer:
             نتایج کامل تحلیل
         """
         # بررسی اولیه متن با مدل ارزان
-        needs_analysis = self._screen_text(text)
+        needs_analysis = await self._screen_text_async(text)
         
         if not needs_analysis:
             # اگر متن نیاز به تحلیل بیشتر نداشته باشد، یک نتیجه ساده برمی‌گرداند
-            return {
-                "summary": "متن خنثی بدون علامت خاص",
-                "screening": "passed",
-                "sentiment": {
-                    "sentiment": "neutral",
-                    "confidence": 0.9,
-                    "intensity": 0.1
-                },
-                "content_flags": {
-                    "is_inappropriate": False,
-                    "categories": []
-                },
-                "spam_score": 0.1,
-                "model_used": self.screening_model
-            }
+            return self._screened_full_result(self.screening_model)
         
-        # انجام تحلیل‌های موازی برای بهینه‌سازی زمان
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            future_sentiment = executor.submit(self.analyze_sentiment, text, True)
-            future_spam = executor.submit(self.analyze_spam, text, True)
-            future_inappropriate = executor.submit(self.analyze_inappropriate_content, text, True)
-            
-            sentiment_result = future_sentiment.result()
-            spam_result = future_spam.result()
-            inappropriate_result = future_inappropriate.result()
+        # انجام تحلیل‌های همزمان برای بهینه‌سازی زمان
+        sentiment_result, spam_result, inappropriate_result = await asyncio.gather(
+            self.analyze_sentiment_async(text, True),
+            self.analyze_spam_async(text, True),
+            self.analyze_inappropriate_content_async(text, True)
+        )
         
         # ترکیب نتایج
         full_result = {
@@ -489,84 +1238,109 @@ class AnthropicTextAnalyzer:
         }
         
         # ذخیره در تاریخچه
-        self.analysis_history.append({
-            "type": "full",
-            "text": text[:100] + "..." if len(text) > 100 else text,
-            "result": full_result,
-            "timestamp": datetime.now().isoformat()
-        })
+        self._record_history("full", text, full_result)
         
         return full_result
     
+    async def analyze_text_full_batch_async(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        تحلیل کامل دسته‌ای متن‌ها
+        
+        هر سه تحلیل (احساسات، اسپم و محتوای نامناسب) با analyze_batch_async و به صورت
+        همزمان انجام می‌شوند، بنابراین برای هر دسته از متن‌ها سه درخواست ارسال می‌شود
+        به جای یک درخواست به ازای هر متن.
+        
+        Args:
+            texts: لیست متن‌ها
+            
+        Returns:
+            لیست نتایج کامل به ترتیب متن‌های ورودی
+        """
+        if not texts:
+            return []
+        
+        sentiment_results, spam_results, inappropriate_results = await asyncio.gather(
+            self.analyze_batch_async(texts, "sentiment"),
+            self.analyze_batch_async(texts, "spam"),
+            self.analyze_batch_async(texts, "inappropriate")
+        )
+        
+        full_results = []
+        for text, sentiment_result, spam_result, inappropriate_result in zip(
+            texts, sentiment_results, spam_results, inappropriate_results
+        ):
+            parts = (sentiment_result, spam_result, inappropriate_result)
+            if any(part.get("budget_exceeded") for part in parts):
+                full_results.append({"error": "Token budget exhausted", "budget_exceeded": True})
+                continue
+            
+            full_result = {
+                "sentiment": sentiment_result,
+                "spam": spam_result,
+                "inappropriate_content": inappropriate_result,
+                "analysis_timestamp": datetime.now().isoformat(),
+                "analysis_mode": "batch",
+                "models_used": {
+                    "sentiment": sentiment_result.get("model_used"),
+                    "spam": spam_result.get("model_used"),
+                    "inappropriate": inappropriate_result.get("model_used")
+                }
+            }
+            self._record_history("full", text, full_result)
+            full_results.append(full_result)
+        
+        return full_results
+    
+    def analyze_text_full(self, text: str) -> Dict[str, Any]:
+        """
+        تحلیل کامل متن (احساسات، اسپم، و محتوای نامناسب)
+        
+        Args:
+            text: متن برای تحلیل
+            
+        Returns:
+            نتایج کامل تحلیل
+        """
+        return self._run_sync(self.analyze_text_full_async(text))
+    
     def generate_analysis_report(self, texts: List[str], report_type: str = "text") -> Dict[str, Any]:
         """
         تولید گزارش تحلیلی برای مجموعه‌ای از متن‌ها
-        از مدل متوسط یا بهتر استفاده می‌کند
+        
+        متن‌ها به تکه‌های وابسته به محتوا تقسیم و به صورت موازی با مدل ارزان خلاصه
+        می‌شوند، خلاصه‌ها به صورت سلسله‌مراتبی ادغام می‌شوند و گزارش نهایی با مدل
+        گزارش‌دهی فقط از خلاصه نهایی و آمار تجمعی ساخته می‌شود (MapReduceReportEngine).
         
         Args:
             texts: لیست متن‌ها برای تحلیل
             report_type: نوع گزارش (text, json، html)
-            
+        
         Returns:
-            گزارش تحلیلی
+            گزارش تحلیلی به همراه aggregate_stats و آمار اجرای map-reduce
         """
-        # تحلیل هر متن با استفاده از مدل ارزان‌تر
-        analysis_results = []
-        for text in texts:
-            # از تحلیل سریع استفاده می‌کنیم
-            if len(text) < 100:
-                # متن‌های کوتاه را مستقیماً تحلیل می‌کنیم
-                result = self.analyze_text_full(text)
-            else:
-                # بررسی اولیه متن
-                needs_analysis = self._screen_text(text)
-                if not needs_analysis:
-                    # اگر نیاز به تحلیل نباشد، نتیجه ساده می‌دهیم
-                    result = {
-                        "summary": "متن خنثی بدون علامت خاص",
-                        "screening": "passed",
-                        "sentiment": "neutral",
-                        "spam_score": 0.1,
-                        "inappropriate": False
-                    }
-                else:
-                    # تحلیل کامل
-                    result = self.analyze_text_full(text)
-            
-            analysis_results.append({
-                "text": text[:100] + "..." if len(text) > 100 else text,
-                "analysis": result
-            })
-        
-        # اضافه کردن آمار کلی
-        stats = self._calculate_aggregate_stats(analysis_results)
-        
-        # ساخت درخواست برای مدل متوسط یا بهتر
-        system_prompt = """You are an expert text analysis reporter. Generate a comprehensive analysis report based on the provided data.
-        Your report should include:
-        1. An executive summary
-        2. Detailed sentiment analysis
-        3. Content safety analysis
-        4. Spam detection results
-        5. Key insights and patterns
-        6. Recommended actions based on the analysis
-        
-        Format the report according to the requested output type."""
-        
-        request_data = {
-            "analysis_results": analysis_results,
-            "aggregate_stats": stats,
-            "report_type": report_type
-        }
-        
-        # استفاده از مدل متوسط یا بهتر برای تولید گزارش
-        report_response = self._call_model(
-            model=self.reporting_model,
-            system=system_prompt,
-            text=json.dumps(request_data),
-            max_tokens=4000  # گزارش دقیق و کامل
+        self._calibrate_token_estimator_once(texts)
+        return self._run_sync(self.generate_analysis_report_async(texts, report_type))
+    
+    async def generate_analysis_report_async(self, texts: List[str], report_type: str = "text") -> Dict[str, Any]:
+        """نسخه ناهمزمان generate_analysis_report"""
+        engine = MapReduceReportEngine(
+            self,
+            chunk_size=self.report_chunk_size,
+            reduce_fanout=self.report_reduce_fanout
         )
+        return await engine.generate_async(texts, report_type)
+    
+    def _format_report(self, report_response: Dict[str, Any], report_type: str) -> Dict[str, Any]:
+        """
+        قالب‌بندی پاسخ مدل گزارش‌دهی بر اساس نوع گزارش
+        
+        Args:
+            report_response: پاسخ مدل
+            report_type: نوع گزارش (text, json، html)
         
+        Returns:
+            گزارش قالب‌بندی شده
+        """
         if "raw_response" in report_response:
             # پردازش گزارش متنی
             report_text = report_response["raw_response"]
@@ -602,198 +1376,274 @@ class AnthropicTextAnalyzer:
             # برگرداندن گزارش به شکل اصلی
             return {"report": report_response, "format": "json"}
     
-    def _calculate_aggregate_stats(self, analysis_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    def submit_message_batch(self, items: List[Tuple[str, str]], analysis_type: str = "sentiment") -> Dict[str, Any]:
         """
-        محاسبه آمار تجمعی از نتایج تحلیل
+        ارسال مجموعه‌ای از تحلیل‌ها به صورت یک کار دسته‌ای ناهمزمان (Message Batches)
+        
+        نتایج معمولاً تا چند ساعت بعد آماده می‌شوند و هزینه آنها کمتر از
+        درخواست‌های همزمان است؛ مناسب برای پردازش‌های پس‌زمینه و غیرفوری.
         
         Args:
-            analysis_results: لیست نتایج تحلیل
+            items: لیست (شناسه سفارشی، متن)
+            analysis_type: نوع تحلیل (sentiment, spam, inappropriate)
             
         Returns:
-            آمار تجمعی
+            اطلاعات کار ایجاد شده (id, processing_status, request_counts, model)
         """
-        total_items = len(analysis_results)
-        if total_items == 0:
-            return {"error": "No analysis results provided"}
-        
-        # شمارش‌های اولیه
-        sentiment_counts = {"positive": 0, "negative": 0, "neutral": 0}
-        spam_count = 0
-        inappropriate_count = 0
+        if analysis_type not in BATCH_ANALYSIS_TYPES:
+            raise ValueError(f"Batch analysis is not supported for: {analysis_type}")
+        
+        system = self._create_system_prompt(analysis_type)
+        requests = [{
+            "custom_id": custom_id,
+            "params": {
+                "model": self.analysis_model,
+                "max_tokens": 500,
+                "system": self._system_blocks(system),
+                "messages": [
+                    {"role": "user", "content": text}
+                ]
+            }
+        } for custom_id, text in items]
         
-        # برای میانگین‌گیری
-        sentiment_score_sum = 0
-        spam_score_sum = 0
+        batch = self.client.messages.batches.create(requests=requests)
         
-        # جمع‌آوری همه برچسب‌ها و کلمات احساسی
-        all_categories = []
-        all_emotional_words = []
+        info = self._message_batch_info(batch)
+        info["model"] = self.analysis_model
+        return info
+    
+    def get_message_batch(self, batch_id: str) -> Dict[str, Any]:
+        """
+        دریافت وضعیت یک کار دسته‌ای
         
-        for item in analysis_results:
-            analysis = item.get("analysis", {})
+        Args:
+            batch_id: شناسه کار
             
-            # استخراج احساسات
-            sentiment_info = analysis.get("sentiment", {})
-            if isinstance(sentiment_info, dict):
-                sentiment = sentiment_info.get("sentiment", "neutral")
-                sentiment_counts[sentiment] = sentiment_counts.get(sentiment, 0) + 1
-                sentiment_score_sum += sentiment_info.get("intensity", 0.5)
-                
-                # جمع‌آوری کلمات احساسی
-                emotional_words = sentiment_info.get("emotional_words", [])
-                if isinstance(emotional_words, list):
-                    all_emotional_words.extend(emotional_words)
-            else:
-                # اگر sentiment یک رشته باشد
-                sentiment_counts[sentiment_info] = sentiment_counts.get(sentiment_info, 0) + 1
-            
-            # استخراج اطلاعات اسپم
-            spam_info = analysis.get("spam", {})
-            if isinstance(spam_info, dict):
-                if spam_info.get("is_spam", False):
-                    spam_count += 1
-                spam_score_sum += spam_info.get("spam_score", spam_info.get("confidence", 0.5))
-            
-            # استخراج اطلاعات محتوای نامناسب
-            inappropriate_info = analysis.get("inappropriate_content", {})
-            if isinstance(inappropriate_info, dict):
-                if inappropriate_info.get("is_inappropriate", False):
-                    inappropriate_count += 1
-                
-                # جمع‌آوری دسته‌بندی‌ها
-                categories = inappropriate_info.get("categories", [])
-                if isinstance(categories, list):
-                    all_categories.extend(categories)
-        
-        # محاسبه آمار
-        from collections import Counter
-        
-        # محاسبه فراوانی کلمات احساسی و دسته‌بندی‌ها
-        emotional_word_counts = Counter(all_emotional_words).most_common(10)
-        category_counts = Counter(all_categories).most_common(10)
-        
+        Returns:
+            اطلاعات کار (id, processing_status, request_counts, ended_at)
+        """
+        return self._message_batch_info(self.client.messages.batches.retrieve(batch_id))
+    
+    def _message_batch_info(self, batch) -> Dict[str, Any]:
+        counts = getattr(batch, "request_counts", None)
         return {
-            "total_analyzed": total_items,
-            "sentiment_distribution": {
-                "positive": sentiment_counts.get("positive", 0) / total_items,
-                "negative": sentiment_counts.get("negative", 0) / total_items,
-                "neutral": sentiment_counts.get("neutral", 0) / total_items
+            "id": batch.id,
+            "processing_status": batch.processing_status,
+            "request_counts": {
+                "processing": getattr(counts, "processing", 0),
+                "succeeded": getattr(counts, "succeeded", 0),
+                "errored": getattr(counts, "errored", 0),
+                "canceled": getattr(counts, "canceled", 0),
+                "expired": getattr(counts, "expired", 0)
             },
-            "sentiment_counts": sentiment_counts,
-            "average_sentiment_score": sentiment_score_sum / total_items,
-            "spam_percentage": spam_count / total_items,
-            "inappropriate_percentage": inappropriate_count / total_items,
-            "top_emotional_words": emotional_word_counts,
-            "top_content_categories": category_counts
+            "ended_at": getattr(batch, "ended_at", None)
         }
     
-    def bulk_analyze(self, texts: List[str], analysis_type: str = "sentiment") -> List[Dict[str, Any]]:
+    def iter_message_batch_results(self, batch_id: str, analysis_type: str = "sentiment"):
         """
-        تحلیل انبوه متن‌ها
+        پیمایش جریانی نتایج یک کار دسته‌ای پایان‌یافته
+        
+        Args:
+            batch_id: شناسه کار
+            analysis_type: نوع تحلیل (برای اعتبارسنجی نتایج)
+            
+        Yields:
+            (شناسه سفارشی، نتیجه): نتیجه معتبر یا دیکشنری شامل error
+        """
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type != "succeeded":
+                yield entry.custom_id, {"error": entry.result.type}
+                continue
+            
+            message = entry.result.message
+            response_text = message.content[0].text if message.content else ""
+            
+            usage = getattr(message, "usage", None)
+            if usage is not None:
+                self._add_token_usage(message.model, usage)
+            
+            result = self._parse_json_response(response_text)
+            if not self._validate_result(analysis_type, result):
+                yield entry.custom_id, {"error": "invalid_response", "raw_response": response_text}
+                continue
+            
+            result["model_used"] = message.model
+            yield entry.custom_id, result
+    
+    async def bulk_analyze_async(self, texts: List[str], analysis_type: str = "sentiment", concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        تحلیل انبوه متن‌ها روی حلقه رویداد
+        
+        تحلیل‌های تکی به صورت دسته‌ای ارسال می‌شوند و تحلیل کامل برای هر متن
+        با gather محدود به یک semaphore اجرا می‌شود؛ بنابراین صدها تحلیل همزمان
+        بدون ایجاد thread ممکن است.
         
         Args:
             texts: لیست متن‌ها برای تحلیل
             analysis_type: نوع تحلیل (sentiment, spam, inappropriate, full)
+            concurrency: حداکثر تحلیل‌های کامل همزمان (پیش‌فرض: max_concurrency)
             
         Returns:
             لیست نتایج تحلیل
         """
-        results = []
-        
-        # استفاده از تحلیل موازی برای سرعت بیشتر
-        with ThreadPoolExecutor(max_workers=5) as executor:
-            futures = []
-            
-            for text in texts:
-                if analysis_type == "sentiment":
-                    future = executor.submit(self.analyze_sentiment, text)
-                elif analysis_type == "spam":
-                    future = executor.submit(self.analyze_spam, text)
-                elif analysis_type == "inappropriate":
-                    future = executor.submit(self.analyze_inappropriate_content, text)
-                elif analysis_type == "full":
-                    future = executor.submit(self.analyze_text_full, text)
-                else:
-                    raise ValueError(f"Unknown analysis type: {analysis_type}")
-                
-                futures.append((text, future))
+        if analysis_type in BATCH_ANALYSIS_TYPES:
+            # تحلیل دسته‌ای چند متن در هر درخواست
+            try:
+                batch_results = await self.analyze_batch_async(texts, analysis_type)
+            except Exception as e:
+                self.logger.error(f"Error in batch analysis: {str(e)}")
+                return [{
+                    "text": text[:100] + "..." if len(text) > 100 else text,
+                    "error": str(e)
+                } for text in texts]
             
-            # جمع‌آوری نتایج
-            for text, future in futures:
+            return [{
+                "text": text[:100] + "..." if len(text) > 100 else text,
+                "result": result
+            } for text, result in zip(texts, batch_results)]
+        
+        if analysis_type != "full":
+            raise ValueError(f"Unknown analysis type: {analysis_type}")
+        
+        semaphore = asyncio.Semaphore(concurrency or self.max_concurrency)
+        
+        async def analyze(text):
+            async with semaphore:
                 try:
-                    result = future.result()
-                    results.append({
+                    return {
                         "text": text[:100] + "..." if len(text) > 100 else text,
-                        "result": result
-                    })
+                        "result": await self.analyze_text_full_async(text)
+                    }
                 except Exception as e:
                     self.logger.error(f"Error analyzing text: {str(e)}")
-                    results.append({
+                    return {
                         "text": text[:100] + "..." if len(text) > 100 else text,
                         "error": str(e)
-                    })
+                    }
         
-        return results
+        return list(await asyncio.gather(*[analyze(text) for text in texts]))
     
-    def export_analysis_history(self, format: str = "json", file_path: Optional[str] = None) -> Union[str, Dict[str, Any]]:
+    def bulk_analyze(self, texts: List[str], analysis_type: str = "sentiment") -> List[Dict[str, Any]]:
         """
-        صدور تاریخچه تحلیل‌ها
+        تحلیل انبوه متن‌ها
         
         Args:
-            format: فرمت خروجی (json, csv)
-            file_path: مسیر فایل برای ذخیره (اختیاری)
+            texts: لیست متن‌ها برای تحلیل
+            analysis_type: نوع تحلیل (sentiment, spam, inappropriate, full)
             
         Returns:
-            داده‌های تاریخچه در فرمت درخواستی
+            لیست نتایج تحلیل
         """
-        if not self.analysis_history:
-            return {"error": "Analysis history is empty"}
+        return self._run_sync(self.bulk_analyze_async(texts, analysis_type))
+    
+    def iter_analysis_history(self, from_sink: bool = True, limit: Optional[int] = None):
+        """
+        پیمایش تاریخچه تحلیل‌ها (از قدیمی‌ترین به جدیدترین)
+        
+        Args:
+            from_sink: در صورت وجود ذخیره‌ساز، کل تاریخچه به صورت جریانی از دیسک خوانده شود
+            limit: فقط آخرین limit رکورد (حافظه مصرفی به همین تعداد محدود است)
+        
+        Yields:
+            رکوردهای تاریخچه
+        """
+        if from_sink and self.history_sink is not None:
+            records = self.history_sink.iter_records()
+        else:
+            records = iter(list(self.analysis_history))
+        
+        if limit and limit > 0:
+            records = iter(deque(records, maxlen=limit))
+        
+        yield from records
+    
+    def iter_history_export(self, format: str = "jsonl", from_sink: bool = True, limit: Optional[int] = None):
+        """
+        صدور جریانی تاریخچه تحلیل‌ها بدون بارگذاری کامل آن در حافظه
+        
+        Args:
+            format: فرمت خروجی (jsonl, csv)
+            from_sink: خواندن از ذخیره‌ساز روی دیسک در صورت وجود
+            limit: فقط آخرین limit رکورد
+        
+        Yields:
+            خطوط متن خروجی
+        """
+        records = self.iter_analysis_history(from_sink=from_sink, limit=limit)
         
         if format == "csv":
-            import csv
-            import io
-            
-            output = io.StringIO()
-            fieldnames = ["type", "text", "result", "timestamp"]
-            writer = csv.DictWriter(output, fieldnames=fieldnames)
-            writer.writeheader()
-            
-            for item in self.analysis_history:
-                # تبدیل result به رشته JSON
-                if isinstance(item.get("result"), dict):
-                    item["result"] = json.dumps(item["result"])
-                writer.writerow(item)
-            
-            csv_data = output.getvalue()
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(["type", "text", "result", "timestamp"])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
             
+            for item in records:
+                writer.writerow([
+                    item.get("type"),
+                    item.get("text"),
+                    json.dumps(item.get("result"), ensure_ascii=False, default=str),
+                    item.get("timestamp")
+                ])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        
+        elif format == "jsonl":
+            for item in records:
+                yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+        
+        else:
+            raise ValueError(f"Unsupported history export format: {format}")
+    
+    def export_analysis_history(self, format: str = "json", file_path: Optional[str] = None) -> Union[str, Dict[str, Any]]:
+        """
+        صدور تاریخچه تحلیل‌ها
+        
+        قالب json از بافر حافظه ساخته می‌شود؛ قالب‌های csv و jsonl در صورت تعیین
+        file_path به صورت جریانی از کل تاریخچه روی دیسک در فایل نوشته می‌شوند.
+        
+        Args:
+            format: فرمت خروجی (json, csv, jsonl)
+            file_path: مسیر فایل برای ذخیره (اختیاری)
+        
+        Returns:
+            داده‌های تاریخچه در فرمت درخواستی (یا خلاصه فایل نوشته شده)
+        """
+        if format in ("csv", "jsonl"):
             if file_path:
+                lines = 0
                 with open(file_path, 'w', newline='', encoding='utf-8') as f:
-                    f.write(csv_data)
-            
-            return csv_data
+                    for chunk in self.iter_history_export(format):
+                        f.write(chunk)
+                        lines += 1
+                return {"path": file_path, "format": format, "records": max(0, lines - (format == "csv"))}
             
-        else:  # json
-            json_data = {
-                "history": self.analysis_history,
-                "stats": {
-                    "total_entries": len(self.analysis_history),
-                    "types": {}
-                }
+            return "".join(self.iter_history_export(format, from_sink=False))
+        
+        history = list(self.analysis_history)
+        if not history:
+            return {"error": "Analysis history is empty"}
+        
+        json_data = {
+            "history": history,
+            "stats": {
+                "total_entries": len(history),
+                "types": {}
             }
-            
-            # محاسبه آمار ساده
-            for item in self.analysis_history:
-                item_type = item.get("type", "unknown")
-                if item_type in json_data["stats"]["types"]:
-                    json_data["stats"]["types"][item_type] += 1
-                else:
-                    json_data["stats"]["types"][item_type] = 1
-            
-            if file_path:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    json.dump(json_data, f, ensure_ascii=False, indent=2)
-            
-            return json_data
+        }
+        
+        # محاسبه آمار ساده
+        for item in history:
+            item_type = item.get("type", "unknown")
+            json_data["stats"]["types"][item_type] = json_data["stats"]["types"].get(item_type, 0) + 1
+        
+        if file_path:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(json_data, f, ensure_ascii=False, indent=2, default=str)
+        
+        return json_data
 
 # کلاس کمکی برای ادغام با TwitterAnalyzer موجود
 class IntegratedTextAnalyzer:
@@ -813,6 +1663,11 @@ class IntegratedTextAnalyzer:
         self.anthropic_analyzer = anthropic_analyzer
         self.persian_processor = persian_processor
         
+        # آستانه‌های آبشار تحلیل و شمارنده پذیرش/ارجاع هر مرحله
+        self.cascade = CascadeThresholds()
+        self.cascade_stats = {tier: {"hits": 0, "escalations": 0} for tier in CASCADE_TIERS}
+        self.cascade_stats["budget_fallbacks"] = 0
+        
         if app is not None:
             self.init_app(app)
     
@@ -822,58 +1677,294 @@ class IntegratedTextAnalyzer:
         if not self.persian_processor and 'persian_content_analyzer' in app.extensions:
             self.persian_processor = app.extensions['persian_content_analyzer']
         
+        self.cascade.ai_min_confidence = app.config.get('CASCADE_AI_MIN_CONFIDENCE', self.cascade.ai_min_confidence)
+        
+        thresholds_path = app.config.get('CASCADE_THRESHOLDS_PATH')
+        if thresholds_path and os.path.exists(thresholds_path):
+            try:
+                self.cascade = CascadeThresholds.load(thresholds_path)
+            except (OSError, ValueError, KeyError) as e:
+                app.logger.error(f"Error loading cascade thresholds from {thresholds_path}: {str(e)}")
+        
         app.extensions['integrated_text_analyzer'] = self
     
     def analyze_text(self, text: str, use_local_first: bool = True) -> Dict[str, Any]:
         """
-        تحلیل متن با استفاده از پردازشگر محلی و آنتروپیک
+        تحلیل متن با آبشار کالیبره شده از ارزان به گران
+        
+        مراحل: واژه‌نامه محلی ← غربالگر محلی ← تحلیل تک‌مرحله‌ای مدل ← تحلیل کامل مدل.
+        هر مرحله فقط وقتی پاسخ می‌دهد که اطمینانش از آستانه کالیبره شده بیشتر باشد
+        و در غیر این صورت متن به مرحله بعد ارجاع می‌شود.
         
         Args:
             text: متن برای تحلیل
             use_local_first: ابتدا از پردازشگر محلی استفاده شود
+        
+        Returns:
+            نتایج تحلیل ترکیبی (مرحله پاسخ‌دهنده در فیلد cascade)
+        """
+        results, next_tier = self._triage_local(text, use_local_first)
+        if next_tier is None:
+            return results
+        
+        if next_tier == "single_ai":
+            # پس از پایان بودجه توکن کار جاری فقط تحلیل محلی انجام می‌شود
+            if self.anthropic_analyzer.budget_exhausted():
+                return self._local_only_result(text, results)
             
+            # مرحله ۳: تحلیل احساسات با یک فراخوانی مدل ارزان
+            sentiment_results = self.anthropic_analyzer.analyze_sentiment(text, force_full_analysis=True)
+            if sentiment_results.get("budget_exceeded"):
+                return self._local_only_result(text, results)
+            if self._accept_single_ai(results, sentiment_results):
+                return results
+        
+        # مرحله ۴: تحلیل کامل
+        if self.persian_processor and self.anthropic_analyzer.budget_exhausted():
+            return self._local_only_result(text, results)
+        return self._apply_full_analysis(text, results, self.anthropic_analyzer.analyze_text_full(text))
+    
+    def _triage_local(self, text: str, use_local_first: bool = True) -> Tuple[Dict[str, Any], Optional[str]]:
+        """
+        مراحل محلی آبشار (بدون فراخوانی شبکه)
+        
         Returns:
-            نتایج تحلیل ترکیبی
+            tuple: (نتایج، مرحله بعدی) که مرحله بعدی None (پاسخ محلی)، single_ai یا full_ai است
         """
         results = {
             "text": text,
             "timestamp": datetime.now().isoformat()
         }
         
-        # اگر پردازشگر محلی موجود باشد و استراتژی local-first باشد
-        if self.persian_processor and use_local_first:
-            # تحلیل با پردازشگر محلی
-            local_results = self.persian_processor.analyze_content(text)
-            results["local_analysis"] = local_results
-            
-            # بررسی اینکه آیا نیاز به تحلیل با آنتروپیک است یا خیر
-            needs_advanced_analysis = (
-                local_results.get("is_inappropriate", False) or
-                local_results.get("is_spam", False) or
-                local_results.get("sentiment") in ["positive", "negative"] or
-                len(local_results.get("negative_words", [])) > 2 or
-                len(local_results.get("positive_words", [])) > 3
-            )
-            
-            if not needs_advanced_analysis:
-                # اگر نیاز به تحلیل پیشرفته نباشد، نتایج محلی را بازمی‌گردانیم
-                results["source"] = "local_only"
-                return results
+        # بدون پردازشگر محلی فقط تحلیل کامل مدل ممکن است
+        if not (self.persian_processor and use_local_first):
+            return results, "full_ai"
+        
+        local_results = self.persian_processor.analyze_content(text)
+        results["local_analysis"] = local_results
+        
+        # اسپم و محتوای نامناسب فقط در تحلیل کامل بررسی می‌شوند
+        flagged = local_results.get("is_spam", False) or local_results.get("is_inappropriate", False)
+        
+        # مرحله ۱: واژه‌نامه محلی
+        accepted, confidence = self.cascade.accepts_lexicon(local_results)
+        if accepted and not flagged:
+            return self._cascade_hit(results, "lexicon", local_results.get("sentiment", "neutral"), confidence), None
+        self.cascade_stats["lexicon"]["escalations"] += 1
+        
+        if flagged:
+            return results, "full_ai"
+        
+        # مرحله ۲: غربالگر محلی (متن خنثی از نظر مدل)
+        screener = self.anthropic_analyzer.local_screener
+        if screener is not None:
+            probability = screener.predict_proba(text)
+            low = self.cascade.screener_low
+            if low is None:
+                low = self.anthropic_analyzer.screener_low
+            if probability <= low:
+                return self._cascade_hit(results, "local_screen", "neutral", 1.0 - probability), None
+            self.cascade_stats["local_screen"]["escalations"] += 1
+        
+        return results, "single_ai"
+    
+    def _accept_single_ai(self, results: Dict[str, Any], sentiment_results: Dict[str, Any]) -> bool:
+        """
+        پذیرش نتیجه تحلیل تک‌مرحله‌ای مدل در صورت اطمینان کافی
+        
+        Returns:
+            آیا نتیجه پذیرفته شد (در غیر این صورت متن به تحلیل کامل ارجاع می‌شود)
+        """
+        confidence = sentiment_results.get("confidence")
+        if (
+            "error" in sentiment_results or
+            isinstance(confidence, bool) or
+            not isinstance(confidence, (int, float)) or
+            confidence < self.cascade.ai_min_confidence
+        ):
+            self.cascade_stats["single_ai"]["escalations"] += 1
+            return False
+        
+        results["anthropic_analysis"] = {"sentiment": sentiment_results}
+        results["combined_analysis"] = self._combine_analysis_results(results["local_analysis"], results["anthropic_analysis"])
+        self._cascade_hit(results, "single_ai", sentiment_results.get("sentiment", "neutral"), confidence, source="hybrid")
+        return True
+    
+    def _cascade_hit(self, results: Dict[str, Any], tier: str, sentiment: str, confidence: float,
+                     source: str = "local_only") -> Dict[str, Any]:
+        """ثبت پاسخ یک مرحله آبشار در نتیجه و شمارنده‌ها"""
+        self.cascade_stats[tier]["hits"] += 1
+        results["source"] = source
+        results["cascade"] = {
+            "tier": tier,
+            "sentiment": sentiment,
+            "confidence": round(confidence, 4)
+        }
+        return results
+    
+    def _apply_full_analysis(self, text: str, results: Dict[str, Any], anthropic_results: Dict[str, Any]) -> Dict[str, Any]:
+        """آخرین مرحله آبشار: افزودن نتیجه تحلیل کامل مدل به نتایج"""
+        if anthropic_results.get("budget_exceeded") and self.persian_processor:
+            return self._local_only_result(text, results)
         
-        # تحلیل با آنتروپیک
-        anthropic_results = self.anthropic_analyzer.analyze_text_full(text)
         results["anthropic_analysis"] = anthropic_results
         
         # اگر هر دو تحلیل انجام شده، نتایج را ترکیب می‌کنیم
         if "local_analysis" in results:
-            results["source"] = "hybrid"
+            source = "hybrid"
             results["combined_analysis"] = self._combine_analysis_results(
                 results["local_analysis"],
                 results["anthropic_analysis"]
             )
         else:
-            results["source"] = "anthropic_only"
+            source = "anthropic_only"
+        
+        sentiment = anthropic_results.get("sentiment")
+        sentiment = sentiment if isinstance(sentiment, dict) else {}
+        return self._cascade_hit(results, "full_ai", sentiment.get("sentiment", "neutral"),
+                                 sentiment.get("confidence") or 0.0, source=source)
+    
+    async def analyze_texts_async(self, texts: List[str], use_local_first: bool = True) -> List[Dict[str, Any]]:
+        """
+        تحلیل دسته‌ای متن‌ها با همان آبشار analyze_text
+        
+        ابتدا مراحل محلی روی همه متن‌ها اجرا می‌شود؛ سپس فقط متن‌های ارجاع شده، به
+        صورت دسته‌ای و همزمان به مدل ارسال می‌شوند (محدود به پنجره کنترل‌کننده
+        همزمانی آنالایزر) و نتایج به ترتیب ورودی برگردانده می‌شوند.
+        
+        مراحل محلی (پردازش CPU) در thread جداگانه اجرا می‌شوند تا حلقه رویداد مشترک
+        آنالایزر مسدود نشود.
+        
+        Args:
+            texts: لیست متن‌ها
+            use_local_first: ابتدا از پردازشگر محلی استفاده شود
+        
+        Returns:
+            لیست نتایج به ترتیب متن‌های ورودی
+        """
+        triaged = await asyncio.get_running_loop().run_in_executor(
+            None, self._triage_local_batch, texts, use_local_first
+        )
+        return await self._analyze_triaged_async(texts, triaged)
+    
+    def _triage_local_batch(self, texts: List[str], use_local_first: bool = True) -> List[Tuple[Dict[str, Any], Optional[str]]]:
+        """مراحل محلی آبشار برای همه متن‌ها (خارج از حلقه رویداد اجرا می‌شود)"""
+        return [self._triage_local(text, use_local_first) for text in texts]
+    
+    async def _analyze_triaged_async(self, texts: List[str], triaged: List[Tuple[Dict[str, Any], Optional[str]]]) -> List[Dict[str, Any]]:
+        """
+        مراحل مدل آبشار برای متن‌هایی که مراحل محلی به مدل ارجاع داده‌اند
+        
+        Args:
+            texts: لیست متن‌ها
+            triaged: خروجی _triage_local_batch برای همین متن‌ها
+        
+        Returns:
+            لیست نتایج به ترتیب متن‌های ورودی
+        """
+        analyzer = self.anthropic_analyzer
+        outputs = [results if next_tier is None else None for results, next_tier in triaged]
+        
+        single = [index for index, (_, next_tier) in enumerate(triaged) if next_tier == "single_ai"]
+        full = [index for index, (_, next_tier) in enumerate(triaged) if next_tier == "full_ai"]
+        
+        async def full_stage(indices):
+            if not indices:
+                return
+            if self.persian_processor and analyzer.budget_exhausted():
+                for index in indices:
+                    outputs[index] = self._local_only_result(texts[index], triaged[index][0])
+                return
+            
+            full_results = await analyzer.analyze_text_full_batch_async([texts[index] for index in indices])
+            for index, anthropic_results in zip(indices, full_results):
+                outputs[index] = self._apply_full_analysis(texts[index], triaged[index][0], anthropic_results)
+        
+        async def single_stage(indices):
+            if not indices:
+                return
+            if analyzer.budget_exhausted():
+                for index in indices:
+                    outputs[index] = self._local_only_result(texts[index], triaged[index][0])
+                return
+            
+            sentiment_results = await analyzer.analyze_batch_async([texts[index] for index in indices], "sentiment")
+            escalated = []
+            for index, result in zip(indices, sentiment_results):
+                results = triaged[index][0]
+                if result.get("budget_exceeded"):
+                    outputs[index] = self._local_only_result(texts[index], results)
+                elif self._accept_single_ai(results, result):
+                    outputs[index] = results
+                else:
+                    escalated.append(index)
+            
+            # متن‌های نامطمئن بلافاصله پس از دسته خودشان به تحلیل کامل می‌روند
+            await full_stage(escalated)
+        
+        await asyncio.gather(single_stage(single), full_stage(full))
+        return outputs
+    
+    def analyze_texts(self, texts: List[str], use_local_first: bool = True) -> List[Dict[str, Any]]:
+        """نسخه همزمان analyze_texts_async"""
+        # مراحل محلی در thread فراخواننده؛ فقط مراحل مدل روی حلقه رویداد آنالایزر اجرا می‌شوند
+        triaged = self._triage_local_batch(texts, use_local_first)
+        return self.anthropic_analyzer._run_sync(self._analyze_triaged_async(texts, triaged))
+    
+    def get_cascade_stats(self) -> Dict[str, Any]:
+        """
+        آمار آبشار تحلیل
+        
+        Returns:
+            تعداد پاسخ و ارجاع هر مرحله، سهم هر مرحله از کل پاسخ‌ها و آستانه‌های فعلی
+        """
+        stats = copy.deepcopy(self.cascade_stats)
+        total = sum(stats[tier]["hits"] for tier in CASCADE_TIERS) + stats["budget_fallbacks"]
+        for tier in CASCADE_TIERS:
+            stats[tier]["share"] = stats[tier]["hits"] / total if total else 0.0
+        stats["total"] = total
+        stats["ai_rate"] = (stats["single_ai"]["hits"] + stats["full_ai"]["hits"]) / total if total else 0.0
+        stats["thresholds"] = self.cascade.to_dict()
+        return stats
+    
+    def calibrate_cascade(self, samples: List[Tuple[str, str]], target_agreement: float = 0.9,
+                          min_samples: int = 50) -> CascadeThresholds:
+        """
+        یادگیری آستانه‌های آبشار از توافق برچسب‌های محلی با برچسب‌های مدل
+        
+        Args:
+            samples: لیست (متن، برچسب احساس ذخیره شده مدل)
+            target_agreement: حداقل توافق لازم هر مرحله محلی با مدل
+            min_samples: حداقل تعداد نمونه برای اعتماد به یک آستانه
         
+        Returns:
+            CascadeThresholds: آستانه‌های جدید (جایگزین آستانه‌های فعلی می‌شوند)
+        """
+        if not self.persian_processor:
+            raise ValueError("Cascade calibration requires a Persian text processor")
+        
+        screener = self.anthropic_analyzer.local_screener
+        labeled = []
+        for text, ai_label in samples:
+            local_results = self.persian_processor.analyze_content(text, record_history=False)
+            probability = screener.predict_proba(text) if screener is not None else None
+            labeled.append((local_results, probability, ai_label))
+        
+        self.cascade = CascadeThresholds.fit(
+            labeled,
+            target_agreement=target_agreement,
+            min_samples=min_samples,
+            ai_min_confidence=self.cascade.ai_min_confidence
+        )
+        return self.cascade
+    
+    def _local_only_result(self, text: str, results: Dict[str, Any]) -> Dict[str, Any]:
+        """نتیجه تحلیل محلی در زمان پایان بودجه توکن"""
+        if "local_analysis" not in results:
+            results["local_analysis"] = self.persian_processor.analyze_content(text)
+        results["source"] = "local_only"
+        results["budget_exceeded"] = True
+        self.cascade_stats["budget_fallbacks"] += 1
         return results
     
     def _combine_analysis_results(self, local_results: Dict[str, Any], anthropic_results: Dict[str, Any]) -> Dict[str, Any]:
@@ -883,7 +1974,7 @@ class IntegratedTextAnalyzer:
         Args:
             local_results: نتایج تحلیل محلی
             anthropic_results: نتایج تحلیل آنتروپیک
-            
+        
         Returns:
             نتایج ترکیبی
         """
@@ -951,55 +2042,25 @@ class IntegratedTextAnalyzer:
         """
         تحلیل چندین متن و تولید گزارش ترکیبی
         
+        تحلیل آبشاری متن‌ها و گزارش map-reduce (که فقط به خود متن‌ها نیاز دارد)
+        به صورت همزمان اجرا می‌شوند.
+        
         Args:
             texts: لیست متن‌ها برای تحلیل
             use_local_first: ابتدا از پردازشگر محلی استفاده شود
-            
+        
         Returns:
             گزارش تحلیلی ترکیبی
         """
-        # تحلیل هر متن
-        analysis_results = []
-        for text in texts:
-            analysis_results.append(self.analyze_text(text, use_local_first))
-        
-        # تولید گزارش با استفاده از آنتروپیک
-        report_data = []
-        for result in analysis_results:
-            if "combined_analysis" in result:
-                # استفاده از نتایج ترکیبی
-                report_data.append({
-                    "text": result["text"],
-                    "analysis": result["combined_analysis"]
-                })
-            elif "anthropic_analysis" in result:
-                # استفاده از نتایج آنتروپیک
-                report_data.append({
-                    "text": result["text"],
-                    "analysis": result["anthropic_analysis"]
-                })
-            else:
-                # استفاده از نتایج محلی
-                report_data.append({
-                    "text": result["text"],
-                    "analysis": {
-                        "sentiment": {
-                            "sentiment": result["local_analysis"].get("sentiment", "neutral"),
-                            "intensity": 0.5
-                        },
-                        "spam": {
-                            "is_spam": result["local_analysis"].get("is_spam", False),
-                            "spam_type": result["local_analysis"].get("spam_type", None)
-                        },
-                        "inappropriate_content": {
-                            "is_inappropriate": result["local_analysis"].get("is_inappropriate", False),
-                            "categories": []
-                        }
-                    }
-                })
-        
-        # تولید گزارش نهایی با مدل متوسط یا بهتر
-        report = self.anthropic_analyzer.generate_analysis_report([r["text"] for r in report_data])
+        return self.anthropic_analyzer._run_sync(self.analyze_multiple_texts_async(texts, use_local_first))
+    
+    async def analyze_multiple_texts_async(self, texts: List[str], use_local_first: bool = True) -> Dict[str, Any]:
+        """نسخه ناهمزمان analyze_multiple_texts"""
+        # تولید گزارش نهایی با مدل متوسط یا بهتر، همزمان با تحلیل تک‌تک متن‌ها
+        analysis_results, report = await asyncio.gather(
+            self.analyze_texts_async(texts, use_local_first),
+            self.anthropic_analyzer.generate_analysis_report_async(texts)
+        )
         
         # اضافه کردن نتایج تحلیل به گزارش
         report["analysis_results"] = analysis_results
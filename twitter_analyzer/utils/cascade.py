@@ -0,0 +1,220 @@
+import os
+import json
+import logging
+from datetime import datetime
+
+logger = logging.getLogger("analysis_cascade")
+
+# نسخه قالب فایل آستانه‌ها
+CASCADE_FORMAT_VERSION = 1
+
+# مراحل آبشار تحلیل به ترتیب هزینه
+CASCADE_TIERS = ("lexicon", "local_screen", "single_ai", "full_ai")
+
+# آستانه‌های پیش‌فرض (پیش از کالیبراسیون): فقط متن‌های بدون هیچ واژه احساسی محلی پذیرفته می‌شوند
+DEFAULT_LEXICON_THRESHOLDS = {
+    "neutral": 1.0,
+    "positive": None,
+    "negative": None
+}
+
+
+def lexicon_confidence(local_results):
+    """
+    اطمینان برچسب احساس تحلیل واژه‌نامه‌ای
+    
+    برای برچسب‌های مثبت و منفی قدر مطلق امتیاز احساس (که با غلبه واژه‌های یک قطب
+    بیشتر می‌شود) و برای برچسب خنثی عکس تعداد واژه‌های احساسی یافت شده است.
+    
+    Args:
+        local_results: خروجی analyze_content پردازشگر متن فارسی
+    
+    Returns:
+        float: عددی بین 0 و 1
+    """
+    sentiment = local_results.get("sentiment", "neutral")
+    if sentiment in ("positive", "negative"):
+        return min(1.0, abs(local_results.get("sentiment_score") or 0.0))
+    
+    hits = len(local_results.get("negative_words", [])) + len(local_results.get("positive_words", []))
+    return 1.0 / (1 + hits)
+
+
+class CascadeThresholds:
+    """
+    آستانه‌های کالیبره شده آبشار تحلیل
+    
+    آستانه‌ها از میزان توافق برچسب‌های محلی با برچسب‌های مدل که قبلاً در
+    توییت‌ها ذخیره شده‌اند یاد گرفته می‌شوند: هر مرحله محلی فقط در
+    محدوده‌ای تصمیم می‌گیرد که توافق آن با مدل دست کم به اندازه هدف بوده است.
+    """
+    
+    def __init__(self, lexicon=None, screener_low=None, ai_min_confidence=0.7, metadata=None):
+        """
+        Args:
+            lexicon: حداقل اطمینان پذیرش هر برچسب واژه‌نامه‌ای (None: هرگز پذیرفته نمی‌شود)
+            screener_low: حداکثر احتمال غربالگر برای پذیرش متن به عنوان خنثی (None: آستانه آنالایزر)
+            ai_min_confidence: حداقل اطمینان تحلیل تک‌مرحله‌ای مدل برای پذیرش
+            metadata: اطلاعات کالیبراسیون (اختیاری)
+        """
+        self.lexicon = dict(DEFAULT_LEXICON_THRESHOLDS)
+        if lexicon:
+            self.lexicon.update(lexicon)
+        self.screener_low = screener_low
+        self.ai_min_confidence = ai_min_confidence
+        self.metadata = metadata or {}
+    
+    def accepts_lexicon(self, local_results):
+        """
+        آیا برچسب واژه‌نامه‌ای به اندازه کافی مطمئن است
+        
+        Returns:
+            tuple: (پذیرفته شده، اطمینان)
+        """
+        confidence = lexicon_confidence(local_results)
+        threshold = self.lexicon.get(local_results.get("sentiment", "neutral"))
+        return threshold is not None and confidence >= threshold, confidence
+    
+    @staticmethod
+    def _lowest_reliable_threshold(pairs, target, min_samples):
+        """
+        کمترین آستانه‌ای که توافق نمونه‌های بالای آن به هدف برسد
+        
+        Args:
+            pairs: لیست (اطمینان، توافق)
+        """
+        pairs = sorted(pairs, key=lambda pair: pair[0], reverse=True)
+        best = None
+        count = agreed = 0
+        for index, (confidence, agrees) in enumerate(pairs):
+            count += 1
+            agreed += agrees
+            # آستانه فقط در مرز بین مقادیر متفاوت قابل انتخاب است
+            if index + 1 < len(pairs) and pairs[index + 1][0] == confidence:
+                continue
+            if count >= min_samples and agreed / count >= target:
+                best = confidence
+        return best
+    
+    @staticmethod
+    def _highest_reliable_probability(pairs, target, min_samples):
+        """
+        بیشترین احتمال غربالگر که نرخ خنثی بودن نمونه‌های زیر آن به هدف برسد
+        
+        Args:
+            pairs: لیست (احتمال، خنثی بودن از نظر مدل)
+        """
+        pairs = sorted(pairs, key=lambda pair: pair[0])
+        best = None
+        count = neutral = 0
+        for index, (probability, is_neutral) in enumerate(pairs):
+            count += 1
+            neutral += is_neutral
+            if index + 1 < len(pairs) and pairs[index + 1][0] == probability:
+                continue
+            if count >= min_samples and neutral / count >= target:
+                best = probability
+        return best
+    
+    @classmethod
+    def fit(cls, samples, target_agreement=0.9, min_samples=50, ai_min_confidence=0.7):
+        """
+        یادگیری آستانه‌ها از نمونه‌های برچسب‌دار
+        
+        Args:
+            samples: لیست (نتیجه تحلیل محلی، احتمال غربالگر یا None، برچسب احساس مدل)
+            target_agreement: حداقل توافق لازم با برچسب‌های مدل
+            min_samples: حداقل تعداد نمونه برای اعتماد به یک آستانه
+            ai_min_confidence: حداقل اطمینان تحلیل تک‌مرحله‌ای مدل
+        
+        Returns:
+            CascadeThresholds: آستانه‌های یاد گرفته شده همراه با پوشش و توافق هر مرحله
+        """
+        by_label = {label: [] for label in DEFAULT_LEXICON_THRESHOLDS}
+        screened = []
+        for local_results, probability, ai_label in samples:
+            label = local_results.get("sentiment", "neutral")
+            if label in by_label:
+                by_label[label].append((lexicon_confidence(local_results), label == ai_label))
+            if probability is not None:
+                screened.append((probability, ai_label == "neutral"))
+        
+        # برچسب‌هایی که نمونه کافی ندارند آستانه پیش‌فرض را نگه می‌دارند
+        lexicon = {
+            label: cls._lowest_reliable_threshold(pairs, target_agreement, min_samples)
+            if len(pairs) >= min_samples else DEFAULT_LEXICON_THRESHOLDS[label]
+            for label, pairs in by_label.items()
+        }
+        screener_low = cls._highest_reliable_probability(screened, target_agreement, min_samples)
+        
+        thresholds = cls(lexicon=lexicon, screener_low=screener_low, ai_min_confidence=ai_min_confidence)
+        
+        # پوشش هر مرحله محلی روی همان نمونه‌ها (سهم متن‌هایی که بدون مدل پاسخ می‌گیرند)
+        accepted = agreed = 0
+        for label, pairs in by_label.items():
+            threshold = lexicon[label]
+            if threshold is None:
+                continue
+            decided = [agrees for confidence, agrees in pairs if confidence >= threshold]
+            accepted += len(decided)
+            agreed += sum(decided)
+        
+        screen_decided = [is_neutral for probability, is_neutral in screened
+                          if screener_low is not None and probability <= screener_low]
+        
+        thresholds.metadata = {
+            "calibrated_at": datetime.now().isoformat(),
+            "samples": len(samples),
+            "target_agreement": target_agreement,
+            "min_samples": min_samples,
+            "lexicon_coverage": accepted / len(samples) if samples else 0.0,
+            "lexicon_agreement": agreed / accepted if accepted else None,
+            "screener_samples": len(screened),
+            "screener_coverage": len(screen_decided) / len(screened) if screened else 0.0,
+            "screener_agreement": sum(screen_decided) / len(screen_decided) if screen_decided else None
+        }
+        return thresholds
+    
+    def to_dict(self):
+        return {
+            "lexicon": dict(self.lexicon),
+            "screener_low": self.screener_low,
+            "ai_min_confidence": self.ai_min_confidence,
+            "metadata": self.metadata
+        }
+    
+    def save(self, path):
+        """ذخیره اتمیک آستانه‌ها در فایل JSON"""
+        data = dict(self.to_dict(), format_version=CASCADE_FORMAT_VERSION)
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path):
+        """
+        بارگذاری آستانه‌ها از فایل JSON
+        
+        Args:
+            path: مسیر فایل آستانه‌ها
+        
+        Returns:
+            CascadeThresholds: آستانه‌های بارگذاری شده
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        if data.get('format_version') != CASCADE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported cascade format version: {data.get('format_version')}")
+        
+        return cls(
+            lexicon=data.get('lexicon'),
+            screener_low=data.get('screener_low'),
+            ai_min_confidence=data.get('ai_min_confidence', 0.7),
+            metadata=data.get('metadata')
+        )
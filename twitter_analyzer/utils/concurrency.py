@@ -0,0 +1,237 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger("adaptive_concurrency")
+
+# کدهای وضعیتی که نشانه شلوغی سرویس هستند (کاهش ضربی پنجره)
+OVERLOAD_STATUSES = (429, 529)
+
+# کدهای وضعیت گذرا که ارزش تلاش مجدد دارند
+RETRY_STATUSES = (408, 409, 500, 502, 503, 504)
+
+
+class AdaptiveConcurrencyController:
+    """
+    کنترل‌کننده تطبیقی همزمانی (AIMD) با تلاش مجدد
+    
+    تا وقتی تأخیر و نرخ خطا سالم باشند، پنجره درخواست‌های همزمان به صورت جمعی
+    (حدود یک واحد در هر رفت‌وبرگشت) بزرگ می‌شود و با خطاهای شلوغی (429/529) یا
+    افزایش شدید تأخیر به صورت ضربی کوچک می‌شود. خطاهای گذرا با تأخیر نمایی
+    همراه با jitter (یا مقدار retry-after سرور) دوباره تلاش می‌شوند.
+    
+    میانگین‌های تأخیر برای هر دسته درخواست (مثلاً مدل و اندازه خروجی) جدا نگه داشته
+    می‌شوند تا یک درخواست دسته‌ای طولانی پس از چند درخواست کوتاه، افزایش تأخیر به نظر نیاید.
+    
+    متدهای ناهمزمان باید فقط از یک حلقه رویداد فراخوانی شوند.
+    """
+    
+    def __init__(self, min_limit=1, max_limit=50, initial_limit=None, backoff_factor=0.5,
+                 latency_tolerance=2.0, max_retries=4, base_delay=0.5, max_delay=30.0,
+                 retry_exceptions=()):
+        """
+        Args:
+            min_limit: حداقل اندازه پنجره
+            max_limit: حداکثر اندازه پنجره
+            initial_limit: اندازه اولیه پنجره (پیش‌فرض: حداکثر 10)
+            backoff_factor: ضریب کاهش پنجره در زمان شلوغی
+            latency_tolerance: نسبت مجاز میانگین کوتاه‌مدت تأخیر به میانگین بلندمدت آن
+            max_retries: حداکثر تعداد تلاش مجدد هر درخواست
+            base_delay: تأخیر پایه تلاش مجدد (ثانیه)
+            max_delay: سقف تأخیر تلاش مجدد (ثانیه)
+            retry_exceptions: استثناهای بدون کد وضعیت که قابل تلاش مجدد هستند (مثلاً خطای اتصال)
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial_limit or 10)))
+        self.backoff_factor = backoff_factor
+        self.latency_tolerance = latency_tolerance
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_exceptions = tuple(retry_exceptions)
+        
+        self.in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._last_decrease = 0.0
+        
+        # آمار (دسته درخواست -> [میانگین کوتاه‌مدت، میانگین بلندمدت تأخیر])
+        self._latency = {}
+        self.error_rate = 0.0
+        self.requests = 0
+        self.successes = 0
+        self.overloads = 0
+        self.errors = 0
+        self.retries = 0
+    
+    @property
+    def window(self):
+        """اندازه فعلی پنجره درخواست‌های همزمان"""
+        return max(self.min_limit, int(self.limit))
+    
+    async def acquire(self):
+        """گرفتن یک جایگاه در پنجره (در صورت پر بودن پنجره منتظر می‌ماند)"""
+        if self.in_flight < self.window and not self._waiters:
+            self.in_flight += 1
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # جایگاه داده شده بود ولی task لغو شد
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(future)
+                except ValueError:
+                    pass
+            raise
+    
+    def release(self):
+        """آزاد کردن جایگاه و بیدار کردن منتظرها به اندازه ظرفیت پنجره"""
+        self.in_flight -= 1
+        while self._waiters and self.in_flight < self.window:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_flight += 1
+                future.set_result(None)
+    
+    def classify(self, error):
+        """
+        دسته‌بندی خطا
+        
+        Returns:
+            'overload'، 'transient' یا None (خطای غیرقابل تلاش مجدد)
+        """
+        status = getattr(error, 'status_code', None)
+        if status in OVERLOAD_STATUSES:
+            return 'overload'
+        if status in RETRY_STATUSES:
+            return 'transient'
+        if status is None and self.retry_exceptions and isinstance(error, self.retry_exceptions):
+            return 'transient'
+        return None
+    
+    def _record_success(self, latency, latency_class=None):
+        with self._lock:
+            self.successes += 1
+            self.error_rate *= 0.9
+            averages = self._latency.get(latency_class)
+            if averages is None:
+                averages = self._latency[latency_class] = [latency, latency]
+            else:
+                averages[0] = 0.8 * averages[0] + 0.2 * latency
+                averages[1] = 0.99 * averages[1] + 0.01 * latency
+            
+            if averages[0] > averages[1] * self.latency_tolerance:
+                # صف شدن درخواست‌ها در سمت سرور: کاهش ملایم
+                self._decrease(0.9, latency_class)
+            elif self.error_rate < 0.1 and (self._waiters or self.in_flight >= self.window):
+                # افزایش جمعی فقط وقتی پنجره واقعاً پر است
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+    
+    def _record_failure(self, kind, latency_class=None):
+        with self._lock:
+            self.error_rate = 0.9 * self.error_rate + 0.1
+            if kind == 'overload':
+                self.overloads += 1
+                self._decrease(self.backoff_factor, latency_class)
+            else:
+                self.errors += 1
+    
+    def _decrease(self, factor, latency_class=None):
+        # حداکثر یک کاهش در هر رفت‌وبرگشت (همان دسته درخواست) تا پاسخ‌های همزمان یک موج، پنجره را فرو نریزند
+        averages = self._latency.get(latency_class)
+        now = time.monotonic()
+        if now - self._last_decrease < (averages[0] if averages else 1.0):
+            return
+        
+        previous = self.window
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * factor)
+        if self.window != previous:
+            logger.info(f"Concurrency window decreased: {previous} -> {self.window}")
+    
+    def _retry_delay(self, attempt, error):
+        """تأخیر قبل از تلاش مجدد: retry-after سرور یا تأخیر نمایی با jitter کامل"""
+        headers = getattr(getattr(error, 'response', None), 'headers', None)
+        if headers:
+            try:
+                retry_after = float(headers.get('retry-after'))
+                return min(self.max_delay, max(0.0, retry_after))
+            except (TypeError, ValueError):
+                pass
+        
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+    
+    async def call(self, func, *args, latency_class=None, **kwargs):
+        """
+        اجرای یک فراخوانی ناهمزمان داخل پنجره با تلاش مجدد
+        
+        Args:
+            func: تابع ناهمزمان
+            latency_class: دسته درخواست برای میانگین‌های جداگانه تأخیر (به func داده نمی‌شود)
+        
+        Returns:
+            نتیجه func؛ خطاهای غیرقابل تلاش مجدد یا آخرین خطا به فراخواننده منتقل می‌شوند
+        """
+        for attempt in range(self.max_retries + 1):
+            await self.acquire()
+            self.requests += 1
+            started = time.monotonic()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                kind = self.classify(e)
+                if kind is None:
+                    raise
+                
+                self._record_failure(kind, latency_class)
+                if attempt == self.max_retries:
+                    raise
+                error = e
+            else:
+                self._record_success(time.monotonic() - started, latency_class)
+                return result
+            finally:
+                self.release()
+            
+            self.retries += 1
+            delay = self._retry_delay(attempt, error)
+            logger.warning(f"Retrying model call in {delay:.2f}s after {kind} error (attempt {attempt + 1}): {error}")
+            await asyncio.sleep(delay)
+    
+    def stats(self):
+        """
+        آمار کنترل‌کننده
+        
+        Returns:
+            dict: اندازه پنجره، درخواست‌های در جریان و منتظر، شمارنده‌ها و تأخیرها
+        """
+        return {
+            "window": self.window,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "requests": self.requests,
+            "successes": self.successes,
+            "overloads": self.overloads,
+            "errors": self.errors,
+            "retries": self.retries,
+            "error_rate": round(self.error_rate, 4),
+            "latency": {
+                str(latency_class): {
+                    "ewma": round(ewma, 4),
+                    "baseline": round(baseline, 4)
+                }
+                for latency_class, (ewma, baseline) in list(self._latency.items())
+            }
+        }
@@ -0,0 +1,122 @@
+import os
+import io
+import json
+import queue
+import logging
+import threading
+
+logger = logging.getLogger("history_sink")
+
+
+class JsonlHistorySink:
+    """
+    ذخیره‌ساز ناهمزمان تاریخچه در فایل‌های JSONL چرخشی
+    
+    رکوردها در یک صف قرار می‌گیرند و یک thread پس‌زمینه آنها را به فایل
+    اضافه می‌کند، بنابراین نوشتن روی دیسک مسیر پردازش را کند نمی‌کند.
+    وقتی حجم فایل از max_bytes بیشتر شود، فایل‌ها مانند RotatingFileHandler
+    چرخانده می‌شوند (path، path.1، ...، path.N).
+    """
+    
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5, queue_size=10000):
+        """
+        Args:
+            path: مسیر فایل اصلی
+            max_bytes: حداکثر حجم هر فایل پیش از چرخش
+            backup_count: تعداد فایل‌های قدیمی نگهداری شده
+            queue_size: حداکثر رکوردهای در انتظار نوشتن
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._file_lock = threading.Lock()
+        self.dropped_count = 0
+        
+        self._writer = threading.Thread(target=self._write_loop, name="history-sink", daemon=True)
+        self._writer.start()
+    
+    def write(self, record):
+        """
+        افزودن یک رکورد به صف نوشتن (بدون انتظار)
+        
+        اگر صف پر باشد رکورد کنار گذاشته می‌شود تا پردازش متوقف نشود.
+        """
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_count += 1
+    
+    def flush(self):
+        """انتظار تا نوشته شدن همه رکوردهای در صف"""
+        self._queue.join()
+    
+    def _write_loop(self):
+        while True:
+            record = self._queue.get()
+            try:
+                line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+                with self._file_lock:
+                    self._rotate_if_needed(len(line.encode('utf-8')))
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(line)
+            except Exception as e:
+                logger.error(f"Error writing history record: {e}")
+            finally:
+                self._queue.task_done()
+    
+    def _rotate_if_needed(self, incoming_bytes):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        
+        if size + incoming_bytes <= self.max_bytes:
+            return
+        
+        if self.backup_count <= 0:
+            os.remove(self.path)
+            return
+        
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+    
+    def files(self):
+        """مسیر فایل‌های موجود از قدیمی‌ترین تا جدیدترین"""
+        paths = [f"{self.path}.{index}" for index in range(self.backup_count, 0, -1)]
+        paths.append(self.path)
+        return [path for path in paths if os.path.exists(path)]
+    
+    def iter_records(self):
+        """
+        پیمایش جریانی رکوردها از دیسک (از قدیمی‌ترین تا جدیدترین)
+        
+        Yields:
+            dict: هر رکورد ذخیره شده
+        """
+        self.flush()
+        
+        with self._file_lock:
+            paths = self.files()
+        
+        for path in paths:
+            try:
+                with io.open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            yield json.loads(line)
+                        except json.JSONDecodeError:
+                            continue
+            except FileNotFoundError:
+                # فایل در حین پیمایش چرخانده شده است
+                continue
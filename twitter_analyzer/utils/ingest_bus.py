@@ -0,0 +1,129 @@
+import queue
+import threading
+import time
+
+
+class IngestBus:
+    """
+    صف درون‌فرایندی شناسه توییت‌های تازه دریافت شده
+    
+    سرویس جمع‌آوری پس از ثبت هر توییت شناسه آن را منتشر می‌کند و کارگرهای
+    پردازنده توییت بلافاصله آن را برمی‌دارند. صف محدود است و انتشار هرگز
+    جمع‌آوری را متوقف نمی‌کند: در صورت پر بودن صف یا نبود مصرف‌کننده، شناسه
+    کنار گذاشته می‌شود و توییت در پیمایش دوره‌ای (صف کار پایگاه داده) پردازش می‌شود.
+    """
+    
+    def __init__(self, app=None, maxsize=10000):
+        """
+        Args:
+            app: نمونه برنامه Flask (اختیاری)
+            maxsize: حداکثر تعداد شناسه‌های در انتظار
+        """
+        self.maxsize = maxsize
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._open = threading.Event()
+        
+        # آمار
+        self.published = 0
+        self.consumed = 0
+        self.dropped = 0
+        self.last_latency = None
+        self._lock = threading.Lock()
+        
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app):
+        """اتصال به برنامه Flask"""
+        self.maxsize = app.config.get('INGEST_BUS_MAXSIZE', self.maxsize)
+        self._queue = queue.Queue(maxsize=self.maxsize)
+        
+        app.extensions['ingest_bus'] = self
+    
+    @property
+    def is_open(self):
+        """آیا مصرف‌کننده‌ای برای صف فعال است"""
+        return self._open.is_set()
+    
+    def open(self):
+        """شروع پذیرش شناسه‌ها (هنگام شروع کارگرها)"""
+        self._open.set()
+    
+    def close(self):
+        """توقف پذیرش شناسه‌ها؛ شناسه‌های باقی‌مانده در پیمایش دوره‌ای پردازش می‌شوند"""
+        self._open.clear()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+    
+    def publish(self, tweet_ids):
+        """
+        انتشار شناسه توییت‌های جدید (بدون انتظار)
+        
+        Args:
+            tweet_ids: شناسه توییت‌های ثبت شده (commit شده)
+        
+        Returns:
+            int: تعداد شناسه‌های پذیرفته شده
+        """
+        if not self.is_open:
+            return 0
+        
+        now = time.monotonic()
+        accepted = 0
+        for tweet_id in tweet_ids:
+            try:
+                self._queue.put_nowait((tweet_id, now))
+                accepted += 1
+            except queue.Full:
+                break
+        
+        with self._lock:
+            self.published += accepted
+            self.dropped += len(tweet_ids) - accepted
+        return accepted
+    
+    def get_batch(self, max_items=100, timeout=1.0):
+        """
+        دریافت یک دسته از شناسه‌ها
+        
+        تا رسیدن اولین شناسه (حداکثر timeout ثانیه) منتظر می‌ماند و سپس بدون انتظار
+        هر آنچه در صف هست تا max_items برمی‌دارد.
+        
+        Returns:
+            list: شناسه توییت‌ها (خالی در صورت پایان مهلت)
+        """
+        try:
+            items = [self._queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        
+        while len(items) < max_items:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        with self._lock:
+            self.consumed += len(items)
+            self.last_latency = time.monotonic() - items[0][1]
+        return [tweet_id for tweet_id, _ in items]
+    
+    def stats(self):
+        """
+        آمار صف
+        
+        Returns:
+            dict: تعداد شناسه‌های منتشر شده، مصرف شده، کنار گذاشته شده و در انتظار
+        """
+        return {
+            "open": self.is_open,
+            "pending": self._queue.qsize(),
+            "maxsize": self.maxsize,
+            "published": self.published,
+            "consumed": self.consumed,
+            "dropped": self.dropped,
+            "last_wait_seconds": self.last_latency
+        }
@@ -0,0 +1,160 @@
+from collections import deque, namedtuple
+
+# یک مورد یافت شده از واژه‌نامه در متن
+LexiconHit = namedtuple('LexiconHit', ['term', 'categories', 'start', 'end'])
+
+
+def _is_word_char(char):
+    """آیا کاراکتر بخشی از یک کلمه است (حروف، ارقام، _ و حروف فارسی)"""
+    return char.isalnum() or char == '_' or '\u0600' <= char <= '\u06FF'
+
+
+class LexiconMatcher:
+    """
+    موتور تطبیق واژه‌نامه مبتنی بر الگوریتم Aho-Corasick
+    
+    همه مدخل‌های واژه‌نامه‌ها (شامل عبارات چندکلمه‌ای) در یک اتوماتا کامپایل
+    می‌شوند و متن در یک پیمایش خطی بررسی می‌شود. هر مدخل می‌تواند
+    به چند دسته (مثلاً positive و negative) تعلق داشته باشد.
+    """
+    
+    def __init__(self):
+        # جدول انتقال، پیوند شکست و خروجی هر گره
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        
+        # مدخل‌ها: [متن مدخل، دسته‌ها]
+        self._terms = []
+        self._term_ids = {}
+        self._built = False
+    
+    def __len__(self):
+        return len(self._terms)
+    
+    def add(self, term, category):
+        """
+        افزودن یک مدخل به واژه‌نامه
+        
+        Args:
+            term: متن مدخل (باید با همان روش متن ورودی نرمال‌سازی شده باشد)
+            category: دسته مدخل
+        """
+        if not term:
+            return
+        
+        term_id = self._term_ids.get(term)
+        if term_id is None:
+            node = 0
+            for char in term:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[node][char] = next_node
+                node = next_node
+            
+            term_id = len(self._terms)
+            self._terms.append([term, set()])
+            self._term_ids[term] = term_id
+            self._output[node].append(term_id)
+        
+        self._terms[term_id][1].add(category)
+        self._built = False
+    
+    def add_many(self, terms, category):
+        """افزودن چند مدخل با یک دسته"""
+        for term in terms:
+            self.add(term, category)
+    
+    def build(self):
+        """ساخت پیوندهای شکست اتوماتا (پس از افزودن همه مدخل‌ها)"""
+        for term in self._terms:
+            term[1] = frozenset(term[1])
+        
+        queue = deque()
+        for next_node in self._goto[0].values():
+            self._fail[next_node] = 0
+            queue.append(next_node)
+        
+        # پیمایش سطح به سطح برای محاسبه پیوندهای شکست
+        while queue:
+            node = queue.popleft()
+            for char, next_node in self._goto[node].items():
+                queue.append(next_node)
+                
+                fail_node = self._fail[node]
+                while fail_node and char not in self._goto[fail_node]:
+                    fail_node = self._fail[fail_node]
+                
+                self._fail[next_node] = self._goto[fail_node].get(char, 0)
+                self._output[next_node] = self._output[next_node] + self._output[self._fail[next_node]]
+        
+        self._built = True
+        return self
+    
+    def iter_matches(self, text):
+        """
+        یافتن همه رخدادهای مدخل‌ها در متن (شامل رخدادهای همپوشان)
+        
+        Yields:
+            LexiconHit: مدخل یافت شده با دسته‌ها و موقعیت آن
+        """
+        if not self._built:
+            self.build()
+        
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        terms = self._terms
+        
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            
+            for term_id in output[node]:
+                term, categories = terms[term_id]
+                yield LexiconHit(term, categories, position - len(term) + 1, position + 1)
+    
+    def find(self, text, whole_words=True):
+        """
+        یافتن مدخل‌های واژه‌نامه در متن در یک پیمایش
+        
+        از بین رخدادهای همپوشان، طولانی‌ترین رخداد از چپ انتخاب می‌شود تا
+        یک عبارت چندکلمه‌ای فقط یک بار (و نه به ازای هر کلمه آن) شمرده شود.
+        
+        Args:
+            text: متن نرمال‌سازی شده
+            whole_words: فقط رخدادهایی که در مرز کلمه قرار دارند
+        
+        Returns:
+            list: لیست LexiconHit به ترتیب موقعیت در متن
+        """
+        if not text or not self._terms:
+            return []
+        
+        text_length = len(text)
+        candidates = []
+        for hit in self.iter_matches(text):
+            if whole_words:
+                if hit.start > 0 and _is_word_char(text[hit.start - 1]):
+                    continue
+                if hit.end < text_length and _is_word_char(text[hit.end]):
+                    continue
+            candidates.append(hit)
+        
+        # انتخاب رخدادهای غیرهمپوشان (چپ‌ترین و سپس طولانی‌ترین)
+        candidates.sort(key=lambda hit: (hit.start, -hit.end))
+        
+        hits = []
+        last_end = 0
+        for hit in candidates:
+            if hit.start >= last_end:
+                hits.append(hit)
+                last_end = hit.end
+        
+        return hits
@@ -0,0 +1,226 @@
+import os
+import re
+import json
+import time
+import logging
+import threading
+
+# نسخه قالب فایل واژه‌نامه‌ها
+LEXICON_FORMAT_VERSION = 1
+
+# مسیر پیش‌فرض فایل واژه‌نامه‌ها (همراه با بسته)
+DEFAULT_LEXICON_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'lexicons.json')
+
+logger = logging.getLogger("lexicon_store")
+
+
+class Lexicons:
+    """
+    نسخه تغییرناپذیر واژه‌نامه‌ها که بین همه پردازشگرها به اشتراک گذاشته می‌شود
+    
+    ساختارهای کامپایل شده (اتوماتا، عبارت منظم اسپم) یک بار برای هر نسخه
+    ساخته و در همین شیء نگهداری می‌شوند.
+    """
+    
+    def __init__(self, data, path=None, mtime_ns=None):
+        if data.get('format_version') != LEXICON_FORMAT_VERSION:
+            raise ValueError(f"Unsupported lexicon format version: {data.get('format_version')}")
+        
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.version = data.get('version')
+        
+        self.stopwords = frozenset(data.get('stopwords', []))
+        self.negative_words = frozenset(data.get('negative_words', []))
+        self.positive_words = frozenset(data.get('positive_words', []))
+        self.inappropriate_words = frozenset(data.get('inappropriate_words', []))
+        
+        # الگوهای اسپم به صورت لیست تخت و نگاشت دسته -> اندیس الگوها
+        spam_patterns = []
+        spam_categories = {}
+        for rule in data.get('spam_rules', []):
+            indices = spam_categories.setdefault(rule['category'], [])
+            for pattern in rule.get('patterns', []):
+                indices.append(len(spam_patterns))
+                spam_patterns.append(pattern)
+        
+        # الگوهای نامعتبر پیش از جایگزینی نسخه فعلی رد می‌شوند
+        for pattern in spam_patterns:
+            try:
+                re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid spam pattern {pattern!r}: {e}")
+        
+        self.spam_patterns = tuple(spam_patterns)
+        self.spam_categories = spam_categories
+        
+        self._compiled = {}
+        self._compile_lock = threading.Lock()
+    
+    def compiled(self, key, builder):
+        """
+        دریافت ساختار کامپایل شده برای این نسخه (فقط یک بار ساخته می‌شود)
+        
+        Args:
+            key: کلید ساختار
+            builder: تابعی که با دریافت این شیء ساختار را می‌سازد
+        """
+        value = self._compiled.get(key)
+        if value is None:
+            with self._compile_lock:
+                value = self._compiled.get(key)
+                if value is None:
+                    value = builder(self)
+                    self._compiled[key] = value
+        return value
+
+
+class LexiconStore:
+    """
+    مخزن واژه‌نامه‌های خارجی با بارگذاری مجدد خودکار
+    
+    فایل فقط هنگام تغییر (mtime یا اندازه) دوباره خوانده می‌شود و نسخه جدید
+    به صورت اتمیک جایگزین نسخه قبلی می‌شود. در صورت خطا در فایل جدید،
+    نسخه قبلی حفظ می‌شود.
+    """
+    
+    def __init__(self, path=None, reload_interval=5.0):
+        """
+        Args:
+            path: مسیر فایل واژه‌نامه‌ها (پیش‌فرض: فایل همراه بسته)
+            reload_interval: حداقل فاصله بین بررسی تغییرات فایل (ثانیه)
+        """
+        self.path = path or DEFAULT_LEXICON_PATH
+        self.reload_interval = reload_interval
+        
+        self._lock = threading.Lock()
+        self._lexicons = None
+        self._stat_key = None
+        self._last_check = 0.0
+        
+        # سازنده‌های ساختارهای کامپایل شده که پیش از جایگزینی هر نسخه اجرا می‌شوند
+        self._builders = {}
+    
+    def _stat(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _read(self):
+        """خواندن و پارس فایل"""
+        with open(self.path, 'rb') as f:
+            return json.loads(f.read())
+    
+    def add_builder(self, key, builder):
+        """
+        ثبت سازنده یک ساختار کامپایل شده (مانند Lexicons.compiled)
+        
+        سازنده‌ها هنگام بارگذاری هر نسخه و پیش از جایگزینی آن اجرا می‌شوند؛ خطای
+        هر سازنده (مثلاً عبارت منظم نامعتبر) باعث حفظ نسخه قبلی می‌شود.
+        """
+        self._builders.setdefault(key, builder)
+    
+    def _load(self):
+        stat_key = self._stat()
+        lexicons = Lexicons(self._read(), path=self.path, mtime_ns=stat_key[0])
+        for key, builder in list(self._builders.items()):
+            lexicons.compiled(key, builder)
+        
+        # جایگزینی اتمیک نسخه فعلی
+        self._lexicons = lexicons
+        self._stat_key = stat_key
+        logger.info(f"Loaded lexicons version {lexicons.version} from {self.path}")
+        return lexicons
+    
+    def current(self):
+        """
+        دریافت نسخه فعلی واژه‌نامه‌ها
+        
+        Returns:
+            Lexicons: نسخه فعلی (در صورت تغییر فایل، نسخه جدید)
+        """
+        lexicons = self._lexicons
+        now = time.monotonic()
+        
+        if lexicons is not None and now - self._last_check < self.reload_interval:
+            return lexicons
+        
+        with self._lock:
+            if self._lexicons is None:
+                self._last_check = now
+                return self._load()
+            
+            if now - self._last_check >= self.reload_interval:
+                self._last_check = now
+                stat_key = None
+                try:
+                    stat_key = self._stat()
+                    if stat_key != self._stat_key:
+                        self._load()
+                except Exception as e:
+                    logger.error(f"Error reloading lexicons from {self.path}: {e}; keeping version {self._lexicons.version}")
+                    # فایل نامعتبر تا تغییر بعدی دوباره خوانده نمی‌شود
+                    if stat_key is not None:
+                        self._stat_key = stat_key
+            
+            return self._lexicons
+    
+    def reload(self):
+        """بارگذاری مجدد اجباری فایل"""
+        with self._lock:
+            self._last_check = time.monotonic()
+            return self._load()
+    
+    def save(self, data):
+        """
+        ذخیره اتمیک واژه‌نامه‌ها با افزایش شماره نسخه
+        
+        Args:
+            data: دیکشنری واژه‌نامه‌ها در قالب فایل
+        
+        Returns:
+            Lexicons: نسخه ذخیره و بارگذاری شده
+        """
+        data = dict(data)
+        data['format_version'] = LEXICON_FORMAT_VERSION
+        
+        current = self._lexicons
+        if current is None and os.path.exists(self.path):
+            current = self.current()
+        
+        if current is not None and isinstance(current.version, int):
+            data['version'] = max(int(data.get('version') or 0), current.version + 1)
+        
+        # اعتبارسنجی پیش از نوشتن
+        Lexicons(data)
+        
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        
+        return self.reload()
+
+
+# یک مخزن برای هر مسیر در هر فرایند
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_lexicon_store(path=None, reload_interval=5.0):
+    """
+    دریافت مخزن مشترک واژه‌نامه‌ها برای یک مسیر
+    
+    Args:
+        path: مسیر فایل واژه‌نامه‌ها (اختیاری)
+        reload_interval: حداقل فاصله بین بررسی تغییرات فایل (ثانیه)
+    """
+    path = os.path.abspath(path or DEFAULT_LEXICON_PATH)
+    
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = LexiconStore(path, reload_interval)
+            _stores[path] = store
+        return store
@@ -0,0 +1,137 @@
+import os
+import logging
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+from .text_processor import PersianTextProcessor
+from .lexicon_store import get_lexicon_store
+
+logger = logging.getLogger("local_analysis_pool")
+
+# فیلدهای متنی حجیم که در نتیجه فشرده برگردانده نمی‌شوند
+_BULKY_FIELDS = ('original_text', 'normalized_text', 'preprocessed_text', 'timestamp')
+
+# پردازشگر هر فرایند کارگر (یک بار در زمان راه‌اندازی کارگر ساخته می‌شود)
+_worker_processor = None
+
+
+def _init_worker(lexicon_path):
+    """راه‌اندازی فرایند کارگر: ساخت پردازشگر و کامپایل واژه‌نامه‌ها"""
+    global _worker_processor
+    _worker_processor = PersianTextProcessor(history_size=0)
+    if lexicon_path:
+        _worker_processor.lexicon_store = get_lexicon_store(lexicon_path)
+    _worker_processor._compiled_lexicons()
+
+
+def analyze_text_compact(processor, text, mode='sentiment'):
+    """
+    تحلیل محلی یک متن با نتیجه فشرده
+    
+    Args:
+        processor: نمونه PersianTextProcessor
+        text: متن ورودی
+        mode: sentiment (فقط احساسات) یا content (تحلیل کامل بدون متن‌ها)
+    
+    Returns:
+        tuple یا dict: برای sentiment خروجی analyze_sentiment و برای content
+        نتیجه analyze_content بدون فیلدهای متنی
+    """
+    text = text or ''
+    
+    if mode == 'sentiment':
+        return processor.analyze_sentiment(text)
+    elif mode == 'content':
+        result = processor.analyze_content(text, record_history=False)
+        for field in _BULKY_FIELDS:
+            result.pop(field, None)
+        return result
+    else:
+        raise ValueError(f"Unknown local analysis mode: {mode}")
+
+
+def _analyze_chunk(texts, mode):
+    """تحلیل یک دسته از متن‌ها در فرایند کارگر"""
+    return [analyze_text_compact(_worker_processor, text, mode) for text in texts]
+
+
+class LocalAnalysisPool:
+    """
+    اجرای موازی تحلیل محلی در چند فرایند (بدون محدودیت GIL)
+    
+    کارگرها واژه‌نامه‌ها را یک بار در زمان راه‌اندازی بارگذاری می‌کنند، متن‌ها را
+    به صورت دسته‌ای دریافت می‌کنند و نتایج فشرده را به همان ترتیب ورودی برمی‌گردانند.
+    برای دسته‌های کوچک یا processes <= 1 تحلیل در همین فرایند انجام می‌شود.
+    """
+    
+    def __init__(self, processes=None, chunk_size=200, processor=None, lexicon_path=None):
+        """
+        Args:
+            processes: تعداد فرایندهای کارگر (None: تعداد هسته‌ها، 0 یا 1: بدون فرایند جداگانه)
+            chunk_size: تعداد متن‌های هر دسته ارسالی به کارگر
+            processor: پردازشگر محلی برای اجرای درون فرایند (اختیاری)
+            lexicon_path: مسیر واژه‌نامه‌های خارجی (اختیاری)
+        """
+        self.processes = os.cpu_count() if processes is None else processes
+        self.chunk_size = max(1, chunk_size)
+        self.processor = processor
+        self.lexicon_path = lexicon_path
+        self._executor = None
+    
+    def _get_processor(self):
+        if self.processor is None:
+            self.processor = PersianTextProcessor(history_size=0)
+            if self.lexicon_path:
+                self.processor.lexicon_store = get_lexicon_store(self.lexicon_path)
+        return self.processor
+    
+    def _get_executor(self):
+        if self._executor is None:
+            # آماده‌سازی واژه‌نامه‌ها در فرایند والد تا کارگرها پس از fork آن را به ارث ببرند
+            self._get_processor()._compiled_lexicons()
+            
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                initializer=_init_worker,
+                initargs=(self.lexicon_path,)
+            )
+        return self._executor
+    
+    def map(self, texts, mode='sentiment'):
+        """
+        تحلیل مجموعه‌ای از متن‌ها با حفظ ترتیب ورودی
+        
+        Args:
+            texts: لیست متن‌ها
+            mode: sentiment یا content
+        
+        Returns:
+            list: نتایج فشرده به ترتیب متن‌های ورودی
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        
+        if self.processes is None or self.processes <= 1 or len(texts) <= self.chunk_size:
+            processor = self._get_processor()
+            return [analyze_text_compact(processor, text, mode) for text in texts]
+        
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        
+        results = []
+        try:
+            for chunk_results in self._get_executor().map(_analyze_chunk, chunks, repeat(mode)):
+                results.extend(chunk_results)
+        except Exception as e:
+            # در صورت خرابی فرایندها، تحلیل در همین فرایند ادامه پیدا می‌کند
+            logger.error(f"Local analysis pool failed, falling back to in-process analysis: {e}")
+            self.close()
+            processor = self._get_processor()
+            return [analyze_text_compact(processor, text, mode) for text in texts]
+        
+        return results
+    
+    def close(self):
+        """توقف فرایندهای کارگر"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
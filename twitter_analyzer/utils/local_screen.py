@@ -0,0 +1,246 @@
+import re
+import os
+import math
+import json
+import zlib
+import random
+import logging
+from datetime import datetime
+
+logger = logging.getLogger("local_screener")
+
+# نسخه قالب فایل مدل
+SCREENER_FORMAT_VERSION = 1
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+_DIACRITICS = re.compile('[\u064B-\u0652\u0670]')
+_CHAR_REPLACEMENTS = str.maketrans({'\u064A': '\u06CC', '\u0643': '\u06A9', '\u0649': '\u06CC', '\u0629': '\u0647', '\u200c': ' ', '\u200d': ' '})
+
+
+class LocalScreener:
+    """
+    غربالگر محلی متن با ویژگی‌های n-gram درهم‌سازی شده و رگرسیون لجستیک
+    
+    احتمال نیاز متن به تحلیل عمیق‌تر را بدون فراخوانی شبکه (در چند میکروثانیه)
+    تخمین می‌زند. متن‌هایی که احتمال آنها بین دو آستانه باشد نامطمئن
+    محسوب می‌شوند و به مدل ارجاع داده می‌شوند.
+    """
+    
+    def __init__(self, n_features=2 ** 18, weights=None, bias=0.0, metadata=None):
+        """
+        Args:
+            n_features: تعداد سطل‌های درهم‌سازی ویژگی‌ها
+            weights: وزن‌های مدل (دیکشنری اندیس -> وزن، اختیاری)
+            bias: بایاس مدل
+            metadata: اطلاعات آموزش (اختیاری)
+        """
+        self.n_features = n_features
+        self.weights = weights or {}
+        self.bias = bias
+        self.metadata = metadata or {}
+    
+    @staticmethod
+    def _normalize(text):
+        text = (text or '').translate(_CHAR_REPLACEMENTS).lower()
+        return _DIACRITICS.sub('', text)
+    
+    def _hash(self, feature):
+        """اندیس و علامت یک ویژگی (پایدار بین فرایندها)"""
+        value = zlib.crc32(feature.encode('utf-8'))
+        return value % self.n_features, 1.0 if value & 0x80000000 else -1.0
+    
+    def features(self, text):
+        """
+        استخراج ویژگی‌های درهم‌سازی شده متن
+        
+        تک‌واژه‌ها، دوواژه‌ها و سه‌حرفی‌های هر واژه (برای پوشش صرف فارسی)
+        با نرمال‌سازی L2.
+        
+        Returns:
+            dict: اندیس -> مقدار
+        """
+        tokens = _TOKEN_PATTERN.findall(self._normalize(text))
+        
+        raw = []
+        for index, token in enumerate(tokens):
+            raw.append('w:' + token)
+            if index:
+                raw.append('b:' + tokens[index - 1] + ' ' + token)
+            
+            padded = '#' + token + '#'
+            for start in range(len(padded) - 2):
+                raw.append('c:' + padded[start:start + 3])
+        
+        vector = {}
+        for feature in raw:
+            index, sign = self._hash(feature)
+            vector[index] = vector.get(index, 0.0) + sign
+        
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        if norm:
+            for index in vector:
+                vector[index] /= norm
+        
+        return vector
+    
+    def _score(self, vector):
+        weights = self.weights
+        return self.bias + sum(weights.get(index, 0.0) * value for index, value in vector.items())
+    
+    @staticmethod
+    def _sigmoid(score):
+        if score >= 0:
+            return 1.0 / (1.0 + math.exp(-score))
+        exp_score = math.exp(score)
+        return exp_score / (1.0 + exp_score)
+    
+    def predict_proba(self, text):
+        """
+        احتمال نیاز متن به تحلیل عمیق‌تر
+        
+        Args:
+            text: متن ورودی
+        
+        Returns:
+            float: احتمال بین 0 و 1
+        """
+        return self._sigmoid(self._score(self.features(text)))
+    
+    def decide(self, text, low=0.15, high=0.85):
+        """
+        تصمیم غربالگری
+        
+        Args:
+            text: متن ورودی
+            low: آستانه پایین (کمتر یا مساوی: نیازی به تحلیل نیست)
+            high: آستانه بالا (بیشتر یا مساوی: نیاز به تحلیل)
+        
+        Returns:
+            True/False یا None در صورت عدم اطمینان (ارجاع به مدل)
+        """
+        probability = self.predict_proba(text)
+        if probability <= low:
+            return False
+        if probability >= high:
+            return True
+        return None
+    
+    def fit(self, texts, labels, epochs=5, learning_rate=0.5, l2=1e-6, seed=42):
+        """
+        آموزش مدل با گرادیان کاهشی تصادفی
+        
+        Args:
+            texts: لیست متن‌ها
+            labels: برچسب‌ها (1: نیاز به تحلیل، 0: بدون نیاز)
+            epochs: تعداد دورهای آموزش
+            learning_rate: نرخ یادگیری اولیه
+            l2: ضریب منظم‌سازی L2
+            seed: بذر تصادفی برای ترتیب نمونه‌ها
+        
+        Returns:
+            dict: آمار آموزش (تعداد نمونه‌ها، خطای log-loss دور آخر)
+        """
+        samples = [(self.features(text), 1.0 if label else 0.0) for text, label in zip(texts, labels)]
+        if not samples:
+            raise ValueError("No training samples provided")
+        
+        rng = random.Random(seed)
+        weights = self.weights
+        loss = 0.0
+        
+        for epoch in range(epochs):
+            rng.shuffle(samples)
+            rate = learning_rate / (1.0 + epoch)
+            loss = 0.0
+            
+            for vector, label in samples:
+                probability = self._sigmoid(self._score(vector))
+                loss -= math.log(max(probability if label else 1.0 - probability, 1e-12))
+                
+                gradient = probability - label
+                self.bias -= rate * gradient
+                for index, value in vector.items():
+                    weight = weights.get(index, 0.0)
+                    weights[index] = weight - rate * (gradient * value + l2 * weight)
+            
+            loss /= len(samples)
+            logger.info(f"Screener epoch {epoch + 1}/{epochs}: log-loss {loss:.4f}")
+        
+        # حذف وزن‌های بسیار کوچک برای کاهش حجم مدل
+        self.weights = {index: weight for index, weight in weights.items() if abs(weight) >= 1e-6}
+        
+        positives = sum(1 for _, label in samples if label)
+        self.metadata = {
+            "trained_at": datetime.utcnow().isoformat(),
+            "samples": len(samples),
+            "positive_rate": positives / len(samples),
+            "epochs": epochs,
+            "log_loss": loss
+        }
+        
+        return dict(self.metadata)
+    
+    def evaluate(self, texts, labels, low=0.15, high=0.85):
+        """
+        ارزیابی مدل روی داده‌های جدا شده
+        
+        Returns:
+            dict: دقت روی موارد مطمئن و نسبت موارد ارجاع شده به مدل
+        """
+        decided = correct = escalated = 0
+        for text, label in zip(texts, labels):
+            decision = self.decide(text, low, high)
+            if decision is None:
+                escalated += 1
+                continue
+            decided += 1
+            correct += int(decision == bool(label))
+        
+        total = decided + escalated
+        return {
+            "samples": total,
+            "accuracy_on_decided": correct / decided if decided else 0.0,
+            "escalation_rate": escalated / total if total else 0.0
+        }
+    
+    def save(self, path):
+        """ذخیره اتمیک مدل در فایل JSON"""
+        data = {
+            "format_version": SCREENER_FORMAT_VERSION,
+            "n_features": self.n_features,
+            "bias": self.bias,
+            "weights": {str(index): round(weight, 6) for index, weight in self.weights.items()},
+            "metadata": self.metadata
+        }
+        
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path):
+        """
+        بارگذاری مدل از فایل JSON
+        
+        Args:
+            path: مسیر فایل مدل
+        
+        Returns:
+            LocalScreener: مدل بارگذاری شده
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        
+        if data.get('format_version') != SCREENER_FORMAT_VERSION:
+            raise ValueError(f"Unsupported screener format version: {data.get('format_version')}")
+        
+        return cls(
+            n_features=data['n_features'],
+            weights={int(index): weight for index, weight in data.get('weights', {}).items()},
+            bias=data.get('bias', 0.0),
+            metadata=data.get('metadata')
+        )
@@ -0,0 +1,274 @@
+import zlib
+import random
+import logging
+import threading
+from collections import OrderedDict
+
+from .result_cache import normalize_for_cache
+
+logger = logging.getLogger("near_duplicate")
+
+# عدد اول مرسن برای توابع درهم‌سازی جایگشت‌ها
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+class NearDuplicateIndex:
+    """
+    شاخص تقریباً-تکراری متن‌ها با MinHash و LSH
+    
+    برای هر متن یک امضای MinHash از n-gramهای نویسه‌ای ساخته می‌شود و امضا به
+    باندهایی تقسیم می‌شود؛ متن‌هایی که دست کم در یک باند یکسان باشند نامزد شباهت
+    هستند و شباهت تخمینی آنها با نماینده خوشه سنجیده می‌شود. هر خوشه با شناسه
+    متن نماینده‌اش (اولین متن خوشه) شناخته می‌شود.
+    
+    شاخص در حافظه نگهداری می‌شود و با حداکثر تعداد خوشه (حذف قدیمی‌ترین‌ها) محدود است.
+    """
+    
+    def __init__(self, app=None, num_perm=64, bands=16, threshold=0.7, shingle_size=5,
+                 min_length=20, max_clusters=200000, seed=1):
+        """
+        Args:
+            app: نمونه برنامه Flask (اختیاری)
+            num_perm: تعداد جایگشت‌های MinHash (طول امضا)
+            bands: تعداد باندهای LSH (باید num_perm بر آن بخش‌پذیر باشد)
+            threshold: حداقل شباهت Jaccard تخمینی برای عضویت در خوشه
+            shingle_size: طول n-gramهای نویسه‌ای
+            min_length: متن‌های کوتاه‌تر (پس از نرمال‌سازی) خوشه‌بندی نمی‌شوند
+            max_clusters: حداکثر تعداد خوشه‌های نگهداری شده در حافظه
+            seed: بذر تولید جایگشت‌ها (امضاها فقط با بذر یکسان قابل مقایسه‌اند)
+        """
+        self.lock = threading.Lock()
+        self.warmed = False
+        self.enabled = True
+        self._configure(num_perm, bands, threshold, shingle_size, min_length, max_clusters, seed)
+        
+        if app is not None:
+            self.init_app(app)
+    
+    def _configure(self, num_perm, bands, threshold, shingle_size, min_length, max_clusters, seed):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.min_length = min_length
+        self.max_clusters = max_clusters
+        
+        rng = random.Random(seed)
+        self._permutations = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+        
+        # کلید باند -> شناسه خوشه؛ شناسه خوشه -> (امضای نماینده، کلیدهای باند)
+        self._buckets = {}
+        self._clusters = OrderedDict()
+        
+        # آمار
+        self.assigned = 0
+        self.duplicates = 0
+        self.skipped = 0
+        self.evictions = 0
+    
+    def init_app(self, app):
+        """اتصال به برنامه Flask"""
+        self.enabled = app.config.get('NEAR_DUPLICATE_ENABLED', True)
+        self._configure(
+            num_perm=app.config.get('NEAR_DUPLICATE_NUM_PERM', self.num_perm),
+            bands=app.config.get('NEAR_DUPLICATE_BANDS', self.bands),
+            threshold=app.config.get('NEAR_DUPLICATE_THRESHOLD', self.threshold),
+            shingle_size=self.shingle_size,
+            min_length=app.config.get('NEAR_DUPLICATE_MIN_LENGTH', self.min_length),
+            max_clusters=app.config.get('NEAR_DUPLICATE_MAX_CLUSTERS', self.max_clusters),
+            seed=1
+        )
+        
+        app.extensions['near_duplicate_index'] = self
+    
+    def shingles(self, text):
+        """
+        مجموعه n-gramهای نویسه‌ای متن نرمال شده
+        
+        Returns:
+            set: مجموعه هش‌های 32 بیتی n-gramها (خالی برای متن‌های کوتاه)
+        """
+        normalized = normalize_for_cache(text)
+        if len(normalized) < self.min_length:
+            return set()
+        
+        size = self.shingle_size
+        return {
+            zlib.crc32(normalized[i:i + size].encode('utf-8'))
+            for i in range(len(normalized) - size + 1)
+        }
+    
+    def signature(self, text):
+        """
+        امضای MinHash متن
+        
+        Returns:
+            tuple یا None برای متن‌هایی که قابل خوشه‌بندی نیستند
+        """
+        shingles = self.shingles(text)
+        if not shingles:
+            return None
+        
+        return tuple(
+            min((a * shingle + b) % _MERSENNE_PRIME for shingle in shingles)
+            for a, b in self._permutations
+        )
+    
+    @staticmethod
+    def similarity(first, second):
+        """شباهت Jaccard تخمینی دو امضا"""
+        return sum(1 for x, y in zip(first, second) if x == y) / len(first)
+    
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [(band, hash(signature[band * rows:(band + 1) * rows])) for band in range(self.bands)]
+    
+    def _find_cluster(self, signature, band_keys):
+        """شبیه‌ترین خوشه با شباهت بیشتر از آستانه (یا None)"""
+        best_id, best_similarity = None, self.threshold
+        for key in band_keys:
+            cluster_id = self._buckets.get(key)
+            if cluster_id is None or cluster_id == best_id:
+                continue
+            
+            similarity = self.similarity(signature, self._clusters[cluster_id][0])
+            if similarity >= best_similarity:
+                best_id, best_similarity = cluster_id, similarity
+        return best_id
+    
+    def _add_cluster(self, cluster_id, signature, band_keys):
+        self._clusters[cluster_id] = (signature, band_keys)
+        for key in band_keys:
+            self._buckets.setdefault(key, cluster_id)
+        
+        while len(self._clusters) > self.max_clusters:
+            evicted_id, (_, evicted_keys) = self._clusters.popitem(last=False)
+            for key in evicted_keys:
+                if self._buckets.get(key) == evicted_id:
+                    del self._buckets[key]
+            self.evictions += 1
+    
+    def match(self, text):
+        """
+        یافتن خوشه یک متن بدون افزودن آن به شاخص
+        
+        Args:
+            text: متن (ترجیحاً پیش‌پردازش شده)
+        
+        Returns:
+            tuple: (شناسه خوشه یا None، امضای متن یا None اگر متن قابل خوشه‌بندی نباشد)
+        """
+        if not self.enabled:
+            return None, None
+        
+        signature = self.signature(text)
+        if signature is None:
+            self.skipped += 1
+            return None, None
+        
+        band_keys = self._band_keys(signature)
+        with self.lock:
+            self.assigned += 1
+            cluster_id = self._find_cluster(signature, band_keys)
+            if cluster_id is not None:
+                # خوشه‌های فعال در انتهای صف حذف قرار می‌گیرند
+                self._clusters.move_to_end(cluster_id)
+                self.duplicates += 1
+        return cluster_id, signature
+    
+    def add(self, cluster_id, signature):
+        """
+        ثبت خوشه جدید با امضای نماینده‌اش (پس از ثبت قطعی نماینده در پایگاه داده)
+        
+        Args:
+            cluster_id: شناسه متن نماینده
+            signature: امضای برگردانده شده توسط match
+        """
+        if signature is None:
+            return
+        
+        band_keys = self._band_keys(signature)
+        with self.lock:
+            if cluster_id not in self._clusters:
+                self._add_cluster(cluster_id, signature, band_keys)
+    
+    def remove(self, cluster_id):
+        """حذف یک خوشه از شاخص (مثلاً وقتی نماینده‌اش دیگر وجود ندارد)"""
+        with self.lock:
+            entry = self._clusters.pop(cluster_id, None)
+            if entry is None:
+                return False
+            for key in entry[1]:
+                if self._buckets.get(key) == cluster_id:
+                    del self._buckets[key]
+            return True
+    
+    def assign(self, item_id, text):
+        """
+        تعیین خوشه یک متن جدید
+        
+        Args:
+            item_id: شناسه متن (در صورت ایجاد خوشه جدید، شناسه خوشه می‌شود)
+            text: متن (ترجیحاً پیش‌پردازش شده)
+        
+        Returns:
+            شناسه خوشه (شناسه نماینده) یا None اگر متن قابل خوشه‌بندی نباشد
+        """
+        cluster_id, signature = self.match(text)
+        if signature is None:
+            return None
+        if cluster_id is not None:
+            return cluster_id
+        
+        self.add(item_id, signature)
+        return item_id
+    
+    def warm(self, rows):
+        """
+        بارگذاری نمایندگان خوشه‌های موجود (مثلاً پس از راه‌اندازی مجدد)
+        
+        Args:
+            rows: iterable از (شناسه نماینده، متن)
+        
+        Returns:
+            تعداد خوشه‌های بارگذاری شده
+        """
+        count = 0
+        for cluster_id, text in rows:
+            signature = self.signature(text)
+            if signature is None:
+                continue
+            
+            with self.lock:
+                if cluster_id not in self._clusters:
+                    self._add_cluster(cluster_id, signature, self._band_keys(signature))
+                    count += 1
+        
+        self.warmed = True
+        logger.info(f"Near-duplicate index warmed with {count} clusters")
+        return count
+    
+    def stats(self):
+        """
+        آمار شاخص
+        
+        Returns:
+            dict: تعداد خوشه‌ها، متن‌های تخصیص یافته، تکراری‌ها و نرخ تکرار
+        """
+        return {
+            "enabled": self.enabled,
+            "clusters": len(self._clusters),
+            "assigned": self.assigned,
+            "duplicates": self.duplicates,
+            "skipped": self.skipped,
+            "evictions": self.evictions,
+            "duplicate_rate": self.duplicates / self.assigned if self.assigned else 0.0,
+            "threshold": self.threshold
+        }
@@ -0,0 +1,354 @@
+import json
+import asyncio
+import hashlib
+import inspect
+import logging
+from collections import Counter
+
+from .result_cache import normalize_for_cache
+
+logger = logging.getLogger("report_engine")
+
+# نسخه پرامپت‌های map و reduce (بخشی از کلید کش؛ با هر تغییر پرامپت‌ها افزایش یابد)
+REPORT_PROMPT_VERSION = 2
+
+MAP_SYSTEM_PROMPT = inspect.cleandoc("""
+    You summarize one chunk of social media posts (mostly Persian) for an analytics report.
+    The input is a JSON array of objects with "id" and "text" fields.
+    Return a JSON object with these fields:
+    - labels: list with one entry per post: [id, sentiment, is_spam, is_inappropriate], where sentiment is
+      "positive", "negative" or "neutral" and the last two are booleans
+    - themes: list of up to 5 objects with "theme" (short phrase) and "ids" (list of ids of posts on this theme)
+    - notable_examples: list of up to 3 short representative quotes
+    - summary: 2-3 sentences describing the chunk
+    ONLY output valid JSON.
+""")
+
+# توکن‌های خروجی map: بخش ثابت (خلاصه و مضامین) به علاوه برچسب هر متن
+MAP_BASE_TOKENS = 600
+MAP_LABEL_TOKENS = 16
+
+REDUCE_SYSTEM_PROMPT = inspect.cleandoc("""
+    You merge partial summaries of social media posts (mostly Persian) into one summary.
+    The input is a JSON array of partial summaries with "text_count", "themes", "notable_examples" and "summary".
+    Larger text_count values represent more posts and should carry more weight.
+    Return a JSON object with these fields:
+    - themes: list of up to 8 objects with "theme" and "weight" (integer number of posts), merging similar themes
+    - notable_examples: list of up to 5 short representative quotes
+    - summary: one paragraph describing all posts
+    ONLY output valid JSON.
+""")
+
+REPORT_SYSTEM_PROMPT = inspect.cleandoc("""
+    You are an expert text analysis reporter. Generate a comprehensive analysis report based on the provided data.
+    The data contains a merged summary of all analyzed texts and exact aggregate statistics.
+    Your report should include:
+    1. An executive summary
+    2. Detailed sentiment analysis
+    3. Content safety analysis
+    4. Spam detection results
+    5. Key insights and patterns
+    6. Recommended actions based on the analysis
+    
+    Format the report according to the requested output type.
+""")
+
+
+def _digest(normalized):
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+
+def content_defined_chunks(texts, average_size=100, max_chars=30000, max_text_chars=500):
+    """
+    تقسیم متن‌ها به تکه‌های وابسته به محتوا
+    
+    متن‌های تکراری (پس از نرمال‌سازی) یکی شده و با تعدادشان نگهداری می‌شوند، بر اساس
+    هش محتوا مرتب می‌شوند و مرز تکه‌ها نیز از روی هش تعیین می‌شود؛ بنابراین ترتیب ورودی
+    اهمیتی ندارد و افزودن یا حذف چند متن فقط تکه‌های همان ناحیه را تغییر می‌دهد و
+    نتایج کش شده بقیه تکه‌ها دوباره استفاده می‌شوند.
+    
+    Args:
+        texts: لیست متن‌ها
+        average_size: میانگین تعداد متن‌های یکتا در هر تکه
+        max_chars: حداکثر مجموع نویسه‌های هر تکه
+        max_text_chars: حداکثر طول هر متن (بقیه حذف می‌شود)
+    
+    Returns:
+        list: لیست تکه‌ها؛ هر تکه لیستی از {"digest", "text", "count"}
+    """
+    groups = {}
+    for text in texts:
+        if not text:
+            continue
+        normalized = normalize_for_cache(text)
+        if not normalized:
+            continue
+        
+        entry = groups.get(normalized)
+        if entry is None:
+            groups[normalized] = entry = {"digest": _digest(normalized), "text": text[:max_text_chars], "count": 0}
+        entry["count"] += 1
+    
+    entries = sorted(groups.values(), key=lambda entry: entry["digest"])
+    
+    average_size = max(1, average_size)
+    min_size = max(1, average_size // 4)
+    max_size = average_size * 4
+    
+    chunks = []
+    current = []
+    current_chars = 0
+    for entry in entries:
+        if current and (len(current) >= max_size or current_chars + len(entry["text"]) > max_chars):
+            chunks.append(current)
+            current, current_chars = [], 0
+        
+        current.append(entry)
+        current_chars += len(entry["text"])
+        
+        if len(current) >= min_size and int(entry["digest"][:8], 16) % average_size == 0:
+            chunks.append(current)
+            current, current_chars = [], 0
+    
+    if current:
+        chunks.append(current)
+    
+    return chunks
+
+
+class MapReduceReportEngine:
+    """
+    موتور گزارش map-reduce برای مجموعه‌های بزرگ متن
+    
+    هر تکه به صورت موازی با مدل ارزان خلاصه می‌شود (map)، خلاصه‌ها به صورت سلسله‌مراتبی
+    با همان مدل ادغام می‌شوند (reduce) و فقط خلاصه نهایی و آمار دقیق تجمعی به مدل
+    گزارش‌دهی داده می‌شود. نتایج map و reduce در کش نتایج آنالایزر ذخیره می‌شوند تا
+    اجرای دوباره گزارش روی داده‌های تقریباً یکسان فقط تکه‌های تغییر کرده را ارسال کند.
+    
+    مرحله map فقط متن‌های یکتا را می‌بیند و برای هر متن برچسب برمی‌گرداند؛ تعداد تکرارها
+    به صورت محلی در آمار و وزن مضامین اعمال می‌شود. بنابراین کلید کش map فقط به هش
+    متن‌ها و نسخه پرامپت بستگی دارد و با افزایش تعداد ریتوییت‌ها باطل نمی‌شود.
+    """
+    
+    def __init__(self, analyzer, chunk_size=100, reduce_fanout=8, max_chunk_chars=30000):
+        """
+        Args:
+            analyzer: نمونه AnthropicTextAnalyzer
+            chunk_size: میانگین تعداد متن‌های یکتا در هر تکه
+            reduce_fanout: تعداد خلاصه‌هایی که در هر مرحله reduce ادغام می‌شوند
+            max_chunk_chars: حداکثر مجموع نویسه‌های هر تکه
+        """
+        self.analyzer = analyzer
+        self.chunk_size = chunk_size
+        self.reduce_fanout = max(2, reduce_fanout)
+        self.max_chunk_chars = max_chunk_chars
+    
+    @staticmethod
+    def _validate_map_result(result):
+        if not isinstance(result, dict) or "error" in result:
+            return False
+        
+        return (
+            isinstance(result.get("labels"), list) and
+            isinstance(result.get("themes", []), list) and
+            isinstance(result.get("summary"), str)
+        )
+    
+    @staticmethod
+    def _labels(chunk, result):
+        """
+        برچسب‌های معتبر متن‌های یک تکه
+        
+        Returns:
+            dict: اندیس متن در تکه -> (احساس، اسپم، نامناسب)
+        """
+        labels = {}
+        for label in result.get("labels", []):
+            if not isinstance(label, list) or len(label) < 4:
+                continue
+            
+            text_id, sentiment, is_spam, is_inappropriate = label[:4]
+            if isinstance(text_id, bool) or not isinstance(text_id, int) or not 1 <= text_id <= len(chunk):
+                continue
+            if sentiment not in ("positive", "negative", "neutral"):
+                continue
+            
+            labels[text_id - 1] = (sentiment, is_spam is True, is_inappropriate is True)
+        return labels
+    
+    @staticmethod
+    def _themes(chunk, result):
+        """مضامین یک تکه با وزن برابر مجموع تعداد تکرار متن‌های هر مضمون"""
+        themes = []
+        for theme in result.get("themes", []):
+            if not isinstance(theme, dict) or not theme.get("theme") or not isinstance(theme.get("ids"), list):
+                continue
+            
+            ids = {text_id for text_id in theme["ids"]
+                   if isinstance(text_id, int) and not isinstance(text_id, bool) and 1 <= text_id <= len(chunk)}
+            weight = sum(chunk[text_id - 1]["count"] for text_id in ids)
+            if weight:
+                themes.append({"theme": theme["theme"], "weight": weight})
+        return themes
+    
+    @staticmethod
+    def _validate_reduce_result(result):
+        return (
+            isinstance(result, dict) and "error" not in result and
+            isinstance(result.get("themes", []), list) and
+            isinstance(result.get("summary"), str)
+        )
+    
+    @staticmethod
+    def _partial(result, text_count, themes=None):
+        """بخش‌های پایدار یک خلاصه (بدون نشانگرهایی مثل cache_hit) برای مرحله بعد"""
+        return {
+            "text_count": text_count,
+            "themes": (result.get("themes", []) if themes is None else themes)[:8],
+            "notable_examples": result.get("notable_examples", [])[:5],
+            "summary": result.get("summary", "")
+        }
+    
+    async def _map_chunk(self, chunk):
+        analyzer = self.analyzer
+        payload = [{"id": index + 1, "text": item["text"]} for index, item in enumerate(chunk)]
+        result = await analyzer._call_model_cached_async(
+            analysis_type=f"report_map:v{REPORT_PROMPT_VERSION}",
+            model=analyzer.analysis_model,
+            system=MAP_SYSTEM_PROMPT,
+            text=json.dumps(payload, ensure_ascii=False),
+            max_tokens=min(8192, MAP_BASE_TOKENS + MAP_LABEL_TOKENS * len(chunk)),
+            validator=self._validate_map_result,
+            cache_text=" ".join(item["digest"] for item in chunk)
+        )
+        return result if self._validate_map_result(result) else None
+    
+    async def _reduce_group(self, partials):
+        analyzer = self.analyzer
+        text_count = sum(partial["text_count"] for partial in partials)
+        if len(partials) == 1:
+            return partials[0]
+        
+        result = await analyzer._call_model_cached_async(
+            analysis_type=f"report_reduce:v{REPORT_PROMPT_VERSION}",
+            model=analyzer.analysis_model,
+            system=REDUCE_SYSTEM_PROMPT,
+            text=json.dumps(partials, ensure_ascii=False),
+            max_tokens=1200,
+            validator=self._validate_reduce_result
+        )
+        
+        if not self._validate_reduce_result(result):
+            # در صورت شکست، بزرگ‌ترین خلاصه گروه جایگزین می‌شود تا بقیه گزارش از دست نرود
+            logger.warning("Report reduce step failed; keeping the largest partial summary")
+            largest = max(partials, key=lambda partial: partial["text_count"])
+            return dict(largest, text_count=text_count)
+        
+        return self._partial(result, text_count)
+    
+    @classmethod
+    def _aggregate(cls, map_results):
+        """آمار دقیق تجمعی از برچسب متن‌ها با وزن تعداد تکرار (بدون اتکا به محاسبه مدل)"""
+        sentiment_counts = Counter()
+        spam_count = inappropriate_count = analyzed = 0
+        themes = Counter()
+        
+        for chunk, result in map_results:
+            for index, (sentiment, is_spam, is_inappropriate) in cls._labels(chunk, result).items():
+                count = chunk[index]["count"]
+                analyzed += count
+                sentiment_counts[sentiment] += count
+                spam_count += count if is_spam else 0
+                inappropriate_count += count if is_inappropriate else 0
+            
+            for theme in cls._themes(chunk, result):
+                themes[theme["theme"]] += theme["weight"]
+        
+        classified = sum(sentiment_counts.values()) or 1
+        
+        return {
+            "total_analyzed": analyzed,
+            "sentiment_distribution": {
+                key: sentiment_counts[key] / classified for key in ("positive", "negative", "neutral")
+            },
+            "sentiment_counts": dict(sentiment_counts),
+            "spam_percentage": spam_count / analyzed if analyzed else 0.0,
+            "inappropriate_percentage": inappropriate_count / analyzed if analyzed else 0.0,
+            "top_themes": themes.most_common(10)
+        }
+    
+    async def summarize_async(self, texts):
+        """
+        خلاصه map-reduce مجموعه متن‌ها
+        
+        Returns:
+            dict: خلاصه نهایی، آمار تجمعی و آمار اجرا (تعداد تکه‌ها، تکه‌های کش شده، پوشش)
+        """
+        chunks = content_defined_chunks(texts, self.chunk_size, self.max_chunk_chars)
+        results = await asyncio.gather(*[self._map_chunk(chunk) for chunk in chunks])
+        
+        map_results = [(chunk, result) for chunk, result in zip(chunks, results) if result is not None]
+        cached_chunks = sum(1 for _, result in map_results if result.get("cache_hit"))
+        
+        # تعداد تکرار متن‌ها فقط در مرحله reduce (وزن خلاصه‌ها و مضامین) به مدل داده می‌شود
+        partials = [
+            self._partial(result, sum(item["count"] for item in chunk), self._themes(chunk, result))
+            for chunk, result in map_results
+        ]
+        
+        levels = 0
+        while len(partials) > 1:
+            groups = [partials[i:i + self.reduce_fanout] for i in range(0, len(partials), self.reduce_fanout)]
+            partials = list(await asyncio.gather(*[self._reduce_group(group) for group in groups]))
+            levels += 1
+        
+        total_texts = sum(1 for text in texts if text)
+        stats = self._aggregate(map_results)
+        
+        return {
+            "summary": partials[0] if partials else None,
+            "aggregate_stats": stats,
+            "map_reduce": {
+                "chunks": len(chunks),
+                "failed_chunks": len(chunks) - len(map_results),
+                "cached_chunks": cached_chunks,
+                "reduce_levels": levels,
+                "coverage": stats["total_analyzed"] / total_texts if total_texts else 0.0
+            }
+        }
+    
+    async def generate_async(self, texts, report_type="text"):
+        """
+        تولید گزارش نهایی از خلاصه map-reduce با مدل گزارش‌دهی
+        
+        Returns:
+            dict: گزارش قالب‌بندی شده به همراه aggregate_stats و map_reduce
+        """
+        analyzer = self.analyzer
+        summary = await self.summarize_async(texts)
+        
+        if summary["summary"] is None:
+            return {
+                "error": "No chunk of the input could be summarized",
+                "aggregate_stats": summary["aggregate_stats"],
+                "map_reduce": summary["map_reduce"]
+            }
+        
+        request_data = {
+            "summary": summary["summary"],
+            "aggregate_stats": summary["aggregate_stats"],
+            "report_type": report_type
+        }
+        
+        report_response = await analyzer._call_model_async(
+            model=analyzer.reporting_model,
+            system=REPORT_SYSTEM_PROMPT,
+            text=json.dumps(request_data, ensure_ascii=False),
+            max_tokens=4000  # گزارش دقیق و کامل
+        )
+        
+        report = analyzer._format_report(report_response, report_type)
+        if isinstance(report, dict):
+            report["aggregate_stats"] = summary["aggregate_stats"]
+            report["map_reduce"] = summary["map_reduce"]
+        return report
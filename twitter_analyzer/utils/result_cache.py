@@ -0,0 +1,219 @@
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger("analysis_result_cache")
+
+# پیشوند ریتوییت (RT @user:) که در محتوای تحلیل تأثیری ندارد
+_RETWEET_PREFIX = re.compile(r'^rt\s+@\w+:\s*')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_for_cache(text):
+    """
+    نرمال‌سازی متن برای کلید کش
+    
+    فاصله‌ها، نیم‌فاصله‌ها، حروف بزرگ/کوچک و پیشوند ریتوییت یکسان‌سازی می‌شوند
+    تا ریتوییت‌ها و متن‌های کپی شده به یک کلید برسند.
+    """
+    if not text:
+        return ""
+    
+    text = text.replace('‌', ' ').replace('‎', ' ').lower()
+    text = _WHITESPACE.sub(' ', text).strip()
+    return _RETWEET_PREFIX.sub('', text)
+
+
+class AnalysisResultCache:
+    """
+    کش پایدار نتایج تحلیل با کلید مبتنی بر محتوا
+    
+    کلید از هش متن نرمال‌شده، نوع تحلیل، مدل و نسخه پرامپت ساخته می‌شود.
+    نتایج در SQLite ذخیره می‌شوند و با TTL و حداکثر تعداد مدخل (حذف کم‌استفاده‌ترین‌ها)
+    محدود می‌شوند.
+    """
+    
+    def __init__(self, path=':memory:', ttl=7 * 24 * 3600, max_entries=100000,
+                 evict_interval=300, access_flush_size=500, access_flush_interval=60):
+        """
+        Args:
+            path: مسیر فایل SQLite (پیش‌فرض: حافظه)
+            ttl: مدت اعتبار هر نتیجه (ثانیه، 0: بدون انقضا)
+            max_entries: حداکثر تعداد مدخل‌ها
+            evict_interval: فاصله حذف مدخل‌های منقضی (ثانیه)
+            access_flush_size: تعداد زمان‌های دسترسی انباشته پیش از نوشتن در پایگاه داده
+            access_flush_interval: حداکثر فاصله نوشتن زمان‌های دسترسی (ثانیه)
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.evict_interval = evict_interval
+        self.access_flush_size = access_flush_size
+        self.access_flush_interval = access_flush_interval
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS analysis_cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_analysis_cache_accessed_at ON analysis_cache (accessed_at)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS ix_analysis_cache_created_at ON analysis_cache (created_at)')
+        self._conn.commit()
+        
+        # تعداد مدخل‌ها در حافظه نگهداری می‌شود تا در هر درج شمارش نشوند
+        self._count = self._conn.execute('SELECT COUNT(*) FROM analysis_cache').fetchone()[0]
+        self._last_evict = time.monotonic()
+        
+        # زمان‌های دسترسی hitها به صورت دسته‌ای نوشته می‌شوند (فقط برای ترتیب حذف LRU)
+        self._pending_access = {}
+        self._last_access_flush = time.monotonic()
+        
+        # آمار
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def make_key(text, analysis_type, model, prompt_version):
+        """
+        ساخت کلید کش
+        
+        Args:
+            text: متن ورودی
+            analysis_type: نوع تحلیل
+            model: نام مدل
+            prompt_version: نسخه پرامپت‌ها
+        """
+        digest = hashlib.sha256(normalize_for_cache(text).encode('utf-8')).hexdigest()
+        return f"{analysis_type}:{model}:{prompt_version}:{digest}"
+    
+    def get(self, key):
+        """
+        دریافت نتیجه از کش
+        
+        Returns:
+            dict یا None: نتیجه ذخیره شده (یک نسخه جدید در هر فراخوانی)
+        """
+        now = time.time()
+        
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, created_at FROM analysis_cache WHERE key = ?', (key,)
+            ).fetchone()
+            
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            
+            self.hits += 1
+            self._pending_access[key] = now
+            if (len(self._pending_access) >= self.access_flush_size
+                    or time.monotonic() - self._last_access_flush >= self.access_flush_interval):
+                self._flush_access()
+                self._conn.commit()
+        
+        return json.loads(row[0])
+    
+    def set(self, key, value):
+        """ذخیره نتیجه در کش"""
+        now = time.time()
+        
+        try:
+            serialized = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Result is not cacheable: {e}")
+            return
+        
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT OR IGNORE INTO analysis_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, serialized, now, now)
+            )
+            if cursor.rowcount:
+                self._count += 1
+            else:
+                self._conn.execute(
+                    'UPDATE analysis_cache SET value = ?, created_at = ?, accessed_at = ? WHERE key = ?',
+                    (serialized, now, now, key)
+                )
+                self._pending_access.pop(key, None)
+            
+            self._evict_if_needed(now)
+            self._conn.commit()
+    
+    def _flush_access(self):
+        """نوشتن زمان‌های دسترسی انباشته (با قفل، بدون commit)"""
+        if self._pending_access:
+            self._conn.executemany(
+                'UPDATE analysis_cache SET accessed_at = ? WHERE key = ?',
+                [(accessed_at, key) for key, accessed_at in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+        self._last_access_flush = time.monotonic()
+    
+    def _evict_if_needed(self, now):
+        """حذف دوره‌ای مدخل‌های منقضی و حذف کم‌استفاده‌ترین‌ها در صورت عبور از حداکثر (با قفل)"""
+        if self.ttl and time.monotonic() - self._last_evict >= self.evict_interval:
+            self._last_evict = time.monotonic()
+            cursor = self._conn.execute('DELETE FROM analysis_cache WHERE created_at < ?', (now - self.ttl,))
+            self._count -= cursor.rowcount
+            self.evictions += cursor.rowcount
+        
+        if self._count <= self.max_entries:
+            return
+        
+        # ترتیب LRU به زمان‌های دسترسی به‌روز نیاز دارد
+        self._flush_access()
+        
+        # حذف ده درصد کم‌استفاده‌ترین مدخل‌ها تا حذف در هر درج تکرار نشود
+        overflow = self._count - self.max_entries + max(1, self.max_entries // 10)
+        cursor = self._conn.execute(
+            'DELETE FROM analysis_cache WHERE key IN '
+            '(SELECT key FROM analysis_cache ORDER BY accessed_at LIMIT ?)',
+            (overflow,)
+        )
+        self._count -= cursor.rowcount
+        self.evictions += cursor.rowcount
+    
+    def flush(self):
+        """نوشتن زمان‌های دسترسی انباشته در پایگاه داده"""
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+    
+    def clear(self):
+        """پاک کردن کامل کش"""
+        with self._lock:
+            self._conn.execute('DELETE FROM analysis_cache')
+            self._conn.commit()
+            self._count = 0
+            self._pending_access.clear()
+    
+    def stats(self):
+        """
+        آمار استفاده از کش
+        
+        Returns:
+            dict: تعداد hit/miss، نرخ hit، تعداد مدخل‌ها و حذف‌ها
+        """
+        entries = self._count
+        
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "evictions": self.evictions,
+            "pending_access_updates": len(self._pending_access),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl
+        }
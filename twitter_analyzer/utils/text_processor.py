@@ -2,28 +2,34 @@ import re
 import string
 import json
 from functools import lru_cache
-from collections import Counter
+from collections import Counter, deque
 import os
 from datetime import datetime
+from flask import current_app, has_app_context
+from .lexicon_matcher import LexiconMatcher
+from .lexicon_store import get_lexicon_store
+from .history import JsonlHistorySink
+
+# فیلدهایی از نتیجه تحلیل که در ذخیره‌ساز تاریخچه نوشته می‌شوند
+HISTORY_SINK_FIELDS = (
+    'language', 'hashtags', 'mentions', 'sentiment', 'sentiment_score',
+    'negative_words', 'positive_words', 'is_inappropriate', 'is_spam',
+    'spam_type', 'timestamp'
+)
+
+# الگوهای لینک و منشن که در همان پیمایش الگوهای اسپم شمرده می‌شوند
+_URL_PATTERN = r'https?://\S+|www\.\S+'
+_MENTION_PATTERN = r'@\w+'
 
 class PersianTextProcessor:
     """
     پردازشگر پیشرفته متن فارسی با قابلیت فیلترینگ اسپم و محتوای نامناسب
     """
     
-    def __init__(self, app=None):
-        # کلمات ایست فارسی
-        self.stopwords = self._load_stopwords()
-        
-        # کلمات احساسی
-        self.negative_words = self._load_negative_words()
-        self.positive_words = self._load_positive_words()
-        
-        # کلمات و عبارات نامناسب
-        self.inappropriate_words = self._load_inappropriate_words()
-        
-        # الگوهای اسپم
-        self.spam_patterns = self._load_spam_patterns()
+    def __init__(self, app=None, history_size=1000, history_sink=None):
+        # واژه‌نامه‌ها (کلمات ایست، احساسی، نامناسب و الگوهای اسپم) از مخزن مشترک خوانده می‌شوند
+        self.lexicon_store = self._configured_lexicon_store(current_app if has_app_context() else None)
+        self.lexicon_store.add_builder('persian_text_processor', self._compile_lexicons)
         
         # علائم نگارشی
         self.punctuations = string.punctuation + '،؛»«؟!' 
@@ -38,121 +44,163 @@ class PersianTextProcessor:
             'ـ': '', 'إ': 'ا', 'أ': 'ا', 'آ': 'ا'
         }
         
-        # ذخیره تاریخچه پردازش
-        self.processing_history = []
+        # الگوهای مخفی‌سازی فحش
+        # برخی کاربران با گذاشتن نقطه یا فاصله بین حروف سعی می‌کنند فیلترها را دور بزنند
+        self.obfuscation_pattern = re.compile(
+            r'\w\.\w\.\w\.\w'  # مثال: ف.ح.ش
+            r'|\w\s+\w\s+\w\s+\w'  # مثال: ف ح ش
+        )
+        
+        # تاریخچه پردازش: بافر حلقوی محدود در حافظه و ذخیره‌ساز اختیاری روی دیسک
+        self.processing_history = deque(maxlen=history_size)
+        self.history_sink = history_sink
         
         if app is not None:
             self.init_app(app)
     
     def init_app(self, app):
+        # مسیر واژه‌نامه‌های خارجی در صورت تنظیم
+        self.lexicon_store = self._configured_lexicon_store(app)
+        self.lexicon_store.add_builder('persian_text_processor', self._compile_lexicons)
+        
+        # اندازه بافر تاریخچه و ذخیره‌ساز روی دیسک
+        history_size = app.config.get('TEXT_PROCESSOR_HISTORY_SIZE')
+        if history_size and history_size != self.processing_history.maxlen:
+            self.processing_history = deque(self.processing_history, maxlen=history_size)
+        
+        history_path = app.config.get('TEXT_PROCESSOR_HISTORY_PATH')
+        if history_path and self.history_sink is None:
+            self.history_sink = JsonlHistorySink(
+                history_path,
+                max_bytes=app.config.get('TEXT_PROCESSOR_HISTORY_MAX_BYTES', 10 * 1024 * 1024),
+                backup_count=app.config.get('TEXT_PROCESSOR_HISTORY_BACKUPS', 5)
+            )
+        
         app.extensions['persian_content_analyzer'] = self
+    
+    @staticmethod
+    def _configured_lexicon_store(app=None):
+        """مخزن واژه‌نامه‌های تنظیم شده در برنامه (LEXICON_PATH) یا مخزن پیش‌فرض"""
+        if app is not None and app.config.get('LEXICON_PATH'):
+            return get_lexicon_store(
+                app.config['LEXICON_PATH'],
+                reload_interval=app.config.get('LEXICON_RELOAD_INTERVAL', 5)
+            )
+        return get_lexicon_store()
+    
+    @property
+    def lexicons(self):
+        """نسخه فعلی واژه‌نامه‌ها (با بارگذاری مجدد خودکار در صورت تغییر فایل)"""
+        return self.lexicon_store.current()
+    
+    @property
+    def stopwords(self):
+        """کلمات ایست فارسی"""
+        return self.lexicons.stopwords
+    
+    @property
+    def negative_words(self):
+        """کلمات منفی فارسی"""
+        return self.lexicons.negative_words
+    
+    @property
+    def positive_words(self):
+        """کلمات مثبت فارسی"""
+        return self.lexicons.positive_words
+    
+    @property
+    def inappropriate_words(self):
+        """کلمات و عبارات نامناسب فارسی"""
+        return self.lexicons.inappropriate_words
+    
+    @property
+    def spam_patterns(self):
+        """الگوهای اسپم فارسی"""
+        return self.lexicons.spam_patterns
+    
+    @property
+    def spam_categories(self):
+        """دسته‌بندی الگوهای اسپم به ترتیب اولویت (نام دسته -> اندیس الگوها)"""
+        return self.lexicons.spam_categories
+    
+    def _compiled_lexicons(self):
+        """
+        ساختارهای کامپایل شده نسخه فعلی واژه‌نامه‌ها
         
-    def _load_stopwords(self):
-        """بارگذاری کلمات ایست فارسی"""
-        return {
-            'و', 'در', 'به', 'از', 'که', 'این', 'را', 'با', 'است', 'برای', 
-            'آن', 'یک', 'خود', 'تا', 'کرد', 'بر', 'هم', 'نیز', 'اما', 'شده', 
-            'باید', 'می', 'ما', 'هر', 'آنها', 'او', 'شد', 'دارد', 'شود', 'بود',
-            'دیگر', 'دو', 'بین', 'بسیار', 'چه', 'همه', 'گفت', 'نمی', 'پس', 'چند',
-            'هستند', 'کند', 'وی', 'شما', 'آقای', 'درباره', 'اگر', 'ولی', 'چون', 'بی',
-            'من', 'کنند', 'بخش', 'شوند', 'تان', 'همین', 'هایی', 'دارند', 'چرا'
-        }
+        برای هر نسخه فقط یک بار ساخته می‌شوند و بین همه نمونه‌های پردازشگر مشترک هستند.
+        """
+        return self.lexicons.compiled('persian_text_processor', self._compile_lexicons)
     
-    def _load_negative_words(self):
-        """بارگذاری کلمات منفی فارسی"""
+    def _compile_lexicons(self, lexicons):
+        """کامپایل اتوماتای واژه‌نامه و عبارت منظم اسپم برای یک نسخه"""
+        spam_matcher, spam_group_categories = self._compile_spam_matcher(lexicons)
+        
         return {
-            # کلمات منفی احساسی
-            'بد', 'ضعیف', 'افتضاح', 'مزخرف', 'زشت', 'وحشتناک', 'ناراضی', 'نامناسب',
-            'نارضایتی', 'مشکل', 'اختلال', 'قطعی', 'کند', 'تأخیر', 'گران', 'خراب',
-            'داغون', 'نابود', 'کلاهبرداری', 'دزدی', 'غیرقانونی', 'ناعادلانه', 'نابرابر',
-            'گرانفروشی', 'تحریم', 'تنبلی', 'فساد', 'دروغ', 'تقلب', 'سانسور', 'فیلتر',
-            
-            # کلمات منفی مرتبط با ارتباطات
-            'قطع', 'اختلال', 'کندی', 'فیلترینگ', 'سرقت', 'هک', 'گرانی',
-            'تحریم', 'ضعیف', 'آنتن‌دهی', 'آپلود', 'دانلود', 'پینگ', 'لترنسی',
-            'پکت', 'لس', 'تعرفه', 'گرونی', 'نارضایتی', 'شکایت', 'انتقاد',
-            
-            # احساسات منفی
-            'نگران', 'عصبانی', 'خشمگین', 'ناراحت', 'متأسف', 'متاسف', 'ناامید',
-            'خسته', 'کلافه', 'عاصی', 'بیزار', 'متنفر', 'خشم', 'نفرت',
-            'حسرت', 'اندوه', 'غم', 'درد', 'رنج', 'پشیمان'
+            'lexicon_matcher': self._build_lexicon_matcher(lexicons),
+            'spam_matcher': spam_matcher,
+            'spam_group_categories': spam_group_categories
         }
     
-    def _load_positive_words(self):
-        """بارگذاری کلمات مثبت فارسی"""
-        return {
-            # کلمات مثبت احساسی
-            'خوب', 'عالی', 'بهترین', 'لذت', 'رضایت', 'مفید', 'کارآمد', 'سریع',
-            'پیشرفت', 'توسعه', 'بهبود', 'کیفیت', 'برتر', 'ممتاز', 'ارزشمند',
-            'کاربردی', 'مناسب', 'درست', 'تشکر', 'سپاس', 'قدردانی', 'تحسین',
-            
-            # کلمات مثبت مرتبط با ارتباطات
-            'سرعت', 'پوشش', 'دسترسی', 'امنیت', 'پایداری', 'ارتقا', 'خدمات',
-            'پشتیبانی', 'رایگان', 'هدیه', 'تخفیف', 'جایزه', 'همراه', 'ارزان',
-            'پهنای‌باند', 'فناوری', 'موفقیت', 'طرح', 'جدید', 'نوآوری',
-            
-            # احساسات مثبت
-            'خوشحال', 'راضی', 'خرسند', 'شاد', 'خشنود', 'امیدوار', 'سپاسگزار',
-            'مشتاق', 'علاقه‌مند', 'دوست', 'عشق', 'محبت', 'همدلی', 'اعتماد',
-            'اطمینان', 'خوشبین', 'خوشبختی', 'شادی', 'لذت', 'آسایش'
-        }
+    def _compile_spam_matcher(self, lexicons):
+        """
+        ترکیب همه الگوهای اسپم در یک alternation از lookaheadهای نام‌دار
+        
+        هر الگو در یک lookahead با گروه sp<اندیس> قرار می‌گیرد؛ چون lookahead طولی
+        مصرف نمی‌کند، پیمایش از هر موقعیت متن انجام می‌شود و تطبیق یک الگوی کم‌اهمیت‌تر
+        که زودتر شروع شده تطبیق‌های دیگر را پنهان نمی‌کند. در هر موقعیت نیز گروه‌ها
+        به ترتیب اولویت دسته‌ها امتحان می‌شوند، بنابراین کمترین اولویت دیده شده همان
+        دسته‌ای است که بررسی ترتیبی الگوها برمی‌گرداند. گروه‌های url و mention در
+        انتهای alternation قرار دارند تا لینک‌ها و منشن‌ها در همان پیمایش شمرده شوند.
+        
+        Returns:
+            tuple: (عبارت منظم کامپایل شده، نام گروه -> (اولویت، نام دسته))
+        """
+        alternatives = []
+        group_categories = {}
+        
+        for priority, (category, pattern_indices) in enumerate(lexicons.spam_categories.items()):
+            for idx in pattern_indices:
+                group_name = f'sp{idx}'
+                alternatives.append(f'(?=(?P<{group_name}>{lexicons.spam_patterns[idx]}))')
+                group_categories[group_name] = (priority, category)
+        
+        alternatives.append(f'(?=(?P<url>{_URL_PATTERN}))')
+        alternatives.append(f'(?=(?P<mention>{_MENTION_PATTERN}))')
+        
+        return re.compile('|'.join(alternatives)), group_categories
     
-    def _load_inappropriate_words(self):
-        """بارگذاری کلمات و عبارات نامناسب فارسی"""
-        # این لیست را می‌توانید با کلمات مناسب تکمیل کنید
-        # برای رعایت اصول اخلاقی تنها چند نمونه کلی آورده شده است
-        return {
-            # فحش‌های فارسی (از آوردن موارد صریح خودداری شده)
-            'فحش۱', 'فحش۲', 'فحش۳',
-            
-            # کلمات توهین‌آمیز 
-            'احمق', 'نادان', 'بی‌شعور', 'بیشعور', 'عوضی', 'آشغال', 'کثافت',
-            'بی‌سواد', 'بی‌فرهنگ', 'خفه', 'گمشو', 'دهنت', 
-            
-            # عبارات نامناسب مرتبط با مقامات
-            'بی‌لیاقت', 'بی‌کفایت', 'دزد', 'اختلاس‌گر', 'رانت‌خوار',
-            
-            # الگوهای حروف جایگزین برای دور زدن فیلتر
-            'ا.ح.م.ق', 'ب.ی.ش.ع.و.ر'
-        }
+    def _build_lexicon_matcher(self, lexicons):
+        """
+        ساخت موتور تطبیق واژه‌نامه از کلمات مثبت، منفی و نامناسب
+        
+        مدخل‌ها با همان روش متن ورودی نرمال‌سازی می‌شوند تا عبارات دارای
+        فاصله یا نیم‌فاصله نیز قابل تطبیق باشند.
+        """
+        matcher = LexiconMatcher()
+        categories = (
+            ('negative', lexicons.negative_words),
+            ('positive', lexicons.positive_words),
+            ('inappropriate', lexicons.inappropriate_words)
+        )
+        
+        for category, words in categories:
+            for word in words:
+                matcher.add(self.normalize_text(word.lower()), category)
+        
+        return matcher.build()
     
-    def _load_spam_patterns(self):
-        """بارگذاری الگوهای اسپم فارسی"""
-        return [
-            # تبلیغات شبکه‌های اجتماعی و کانال‌ها
-            r'(?:عضو شوید|فالو کنید|دنبال کنید|جوین شید|بپیوندید|جوین بدید)\s+(?:کانال|گروه|پیج)\s+(?:تلگرام|اینستاگرام|توییتر|روبیکا)',
-            r'(?:کانال|گروه|پیج)\s+(?:تلگرام|اینستاگرام|توییتر|روبیکا)\s+(?:ما|من)\s+[^.]*(?:عضو|فالو|دنبال)',
-            r'(?:لینک|آدرس)\s+(?:کانال|گروه|پیج)\s+(?:تلگرام|اینستاگرام|توییتر|روبیکا)',
-            r'@\w+\s+(?:کانال|گروه|پیج)\s+(?:تلگرام|اینستاگرام|توییتر|روبیکا)',
-            
-            # تبلیغات فروش
-            r'(?:فروش|خرید)\s+(?:ویژه|فوری|استثنایی|باورنکردنی)',
-            r'(?:تخفیف|حراج)\s+(?:ویژه|باورنکردنی|استثنایی|فوق‌العاده)',
-            r'(?:ارزان‌ترین|بهترین|مناسب‌ترین)\s+(?:قیمت|فروش)',
-            r'(?:قیمت|هزینه)\s+(?:پایین|مناسب|ارزان|باورنکردنی)',
-            
-            # شماره تماس و آگهی
-            r'(?:شماره|تلفن|موبایل)\s*(?:تماس|سفارش)[^.]*[۰-۹0-9]{10,}',
-            r'[۰-۹0-9]{2,}[- ][۰-۹0-9]{8,}',
-            r'[۰-۹0-9]{11}',
-            
-            # تبلیغات درآمدزایی
-            r'(?:درآمد|پول|ثروت)\s+(?:آسان|راحت|سریع|میلیونی|بدون سرمایه)',
-            r'(?:کسب درآمد|درآمدزایی|پولدار شوید)\s+(?:از|با|در)\s+(?:اینترنت|تلگرام|خانه)',
-            r'(?:میلیون|میلیارد)\s+(?:تومان|تومن)\s+(?:درآمد|سود)',
-            
-            # تبلیغات سایت شرط‌بندی
-            r'(?:شرط|بندی|پیش‌بینی)\s+(?:فوتبال|ورزشی|آنلاین|زنده)',
-            r'(?:بازی|قمار|کازینو|پوکر)\s+(?:آنلاین|زنده)',
-            r'(?:برد|سود)\s+(?:تضمینی|۱۰۰٪|صددرصد)',
-            
-            # تبلیغات محصولات خاص
-            r'(?:لاغری|چاقی|رشد قد|رشد مو|زیبایی|جوانسازی|سفیدکننده)\s+(?:سریع|فوری|معجزه‌آسا|شگفت‌انگیز|باورنکردنی)',
-            
-            # دامنه‌های تبلیغاتی و لینک‌ها
-            r'https?://(?:t\.me|bit\.ly|goo\.gl|tinyurl\.com)',
-            r'https?://[a-zA-Z0-9-]+\.[a-zA-Z]{2,}\S*'
-        ]
+    def match_lexicons(self, text):
+        """
+        یافتن همه مدخل‌های واژه‌نامه‌ها در متن در یک پیمایش
+        
+        Returns:
+            list: لیست LexiconHit (مدخل، دسته‌ها، موقعیت)
+        """
+        if not text:
+            return []
+        
+        lexicon_matcher = self._compiled_lexicons()['lexicon_matcher']
+        return lexicon_matcher.find(self.normalize_text(text.lower()))
     
     def normalize_text(self, text):
         """نرمال‌سازی متن فارسی"""
@@ -174,14 +222,30 @@ class PersianTextProcessor:
         
         return text
     
-    @lru_cache(maxsize=1000)
     def preprocess(self, text, remove_stopwords=True, remove_urls=True, remove_punctuation=True):
         """
         پیش‌پردازش متن فارسی
+        
+        نتایج برای هر نسخه واژه‌نامه‌ها جداگانه کش می‌شوند تا پس از بارگذاری مجدد
+        کلمات ایست، نتیجه قدیمی برگردانده نشود.
         """
         if not text:
             return ""
         
+        preprocess_cached = self.lexicons.compiled('preprocess', self._build_preprocess_cache)
+        return preprocess_cached(text, remove_stopwords, remove_urls, remove_punctuation)
+    
+    def _build_preprocess_cache(self, lexicons):
+        """ساخت کش پیش‌پردازش برای یک نسخه واژه‌نامه‌ها"""
+        stopwords = lexicons.stopwords
+        
+        @lru_cache(maxsize=1000)
+        def preprocess_cached(text, remove_stopwords, remove_urls, remove_punctuation):
+            return self._preprocess(text, stopwords, remove_stopwords, remove_urls, remove_punctuation)
+        
+        return preprocess_cached
+    
+    def _preprocess(self, text, stopwords, remove_stopwords, remove_urls, remove_punctuation):
         # نرمال‌سازی متن
         text = self.normalize_text(text)
         
@@ -196,7 +260,7 @@ class PersianTextProcessor:
         # حذف کلمات ایست
         if remove_stopwords:
             words = text.split()
-            words = [word for word in words if word not in self.stopwords]
+            words = [word for word in words if word not in stopwords]
             text = ' '.join(words)
         
         # حذف فاصله‌های اضافی
@@ -224,36 +288,37 @@ class PersianTextProcessor:
         else:
             return 'mixed'
     
-    def analyze_sentiment(self, text):
+    def analyze_sentiment(self, text, lexicon_hits=None):
         """
         تحلیل احساسات ساده متن فارسی
         
+        Args:
+            text: متن ورودی
+            lexicon_hits: نتایج match_lexicons در صورتی که از قبل محاسبه شده باشد (اختیاری)
+        
         Returns:
             tuple: (احساس، امتیاز، کلمات منفی یافت شده، کلمات مثبت یافت شده)
         """
-        normalized_text = self.normalize_text(text.lower())
-        words = re.findall(r'[\w\u0600-\u06FF]+', normalized_text)
+        if lexicon_hits is None:
+            lexicon_hits = self.match_lexicons(text)
         
-        # شمارش کلمات مثبت و منفی
-        negative_count = 0
-        positive_count = 0
+        if not lexicon_hits:
+            return 'neutral', 0.0, [], []
         
+        # شمارش کلمات مثبت و منفی
         found_negative_words = []
         found_positive_words = []
         
-        for word in words:
-            if word in self.negative_words:
-                negative_count += 1
-                found_negative_words.append(word)
-            elif word in self.positive_words:
-                positive_count += 1
-                found_positive_words.append(word)
+        for hit in lexicon_hits:
+            if 'negative' in hit.categories:
+                found_negative_words.append(hit.term)
+            elif 'positive' in hit.categories:
+                found_positive_words.append(hit.term)
         
-        # محاسبه امتیاز نهایی (-1 تا 1)
-        total_words = len(words)
-        if total_words == 0:
-            return 'neutral', 0, [], []
+        negative_count = len(found_negative_words)
+        positive_count = len(found_positive_words)
         
+        # محاسبه امتیاز نهایی (-1 تا 1)
         score = (positive_count - negative_count) / (positive_count + negative_count + 1)
         
         # تعیین احساس کلی
@@ -266,33 +331,27 @@ class PersianTextProcessor:
         
         return sentiment, score, found_negative_words, found_positive_words
     
-    def detect_inappropriate_content(self, text):
+    def detect_inappropriate_content(self, text, lexicon_hits=None):
         """
         تشخیص محتوای نامناسب (توهین، فحش و ...)
         
+        Args:
+            text: متن ورودی
+            lexicon_hits: نتایج match_lexicons در صورتی که از قبل محاسبه شده باشد (اختیاری)
+        
         Returns:
             tuple: (آیا نامناسب است، کلمات نامناسب یافت شده)
         """
-        normalized_text = self.normalize_text(text.lower())
-        words = re.findall(r'[\w\u0600-\u06FF]+', normalized_text)
-        
-        found_inappropriate = []
+        if lexicon_hits is None:
+            lexicon_hits = self.match_lexicons(text)
         
-        for word in words:
-            if word in self.inappropriate_words:
-                found_inappropriate.append(word)
+        found_inappropriate = [hit.term for hit in lexicon_hits if 'inappropriate' in hit.categories]
         
         # بررسی الگوهای مخفی‌سازی فحش
-        # برخی کاربران با گذاشتن نقطه یا فاصله بین حروف سعی می‌کنند فیلترها را دور بزنند
-        suspicious_patterns = [
-            r'\w\.\w\.\w\.\w',  # مثال: ف.ح.ش
-            r'\w\s+\w\s+\w\s+\w'  # مثال: ف ح ش
-        ]
-        
-        for pattern in suspicious_patterns:
-            matches = re.findall(pattern, normalized_text)
-            if matches:
-                found_inappropriate.extend(matches)
+        normalized_text = self.normalize_text(text.lower())
+        for match in self.obfuscation_pattern.findall(normalized_text):
+            if match not in found_inappropriate:
+                found_inappropriate.append(match)
         
         return len(found_inappropriate) > 0, found_inappropriate
     
@@ -304,26 +363,37 @@ class PersianTextProcessor:
             tuple: (آیا اسپم است، نوع اسپم)
         """
         normalized_text = self.normalize_text(text.lower())
+        compiled = self._compiled_lexicons()
+        spam_group_categories = compiled['spam_group_categories']
+        
+        best_priority = None
+        best_category = None
+        url_count = mention_count = 0
+        url_end = 0
+        
+        # پیمایش یک‌باره متن با الگوی ترکیبی (الگوهای اسپم، لینک‌ها و منشن‌ها)
+        for match in compiled['spam_matcher'].finditer(normalized_text):
+            group = match.lastgroup
+            if group == 'url':
+                # www درون یک لینک دیگر دوباره شمرده نمی‌شود
+                if match.start() >= url_end:
+                    url_count += 1
+                    url_end = match.end(group)
+                continue
+            if group == 'mention':
+                mention_count += 1
+                continue
+            
+            priority, category = spam_group_categories[group]
+            if best_priority is None or priority < best_priority:
+                best_priority, best_category = priority, category
+                
+                # دسته‌ای با اولویت بالاتر وجود ندارد
+                if priority == 0:
+                    break
         
-        # الگوهای اسپم
-        spam_categories = {
-            'تبلیغات کانال': [0, 1, 2, 3],
-            'تبلیغات فروش': [4, 5, 6, 7],
-            'تبلیغات با شماره تماس': [8, 9, 10],
-            'وعده درآمدزایی': [11, 12, 13],
-            'سایت شرط‌بندی': [14, 15, 16],
-            'تبلیغات محصولات خاص': [17],
-            'لینک مشکوک': [18, 19]
-        }
-        
-        for category, pattern_indices in spam_categories.items():
-            for idx in pattern_indices:
-                if re.search(self.spam_patterns[idx], normalized_text):
-                    return True, category
-        
-        # بررسی تعداد لینک‌ها و منشن‌ها
-        url_count = len(re.findall(r'https?://\S+|www\.\S+', text))
-        mention_count = len(re.findall(r'@\w+', text))
+        if best_category is not None:
+            return True, best_category
         
         # اگر تعداد لینک‌ها یا منشن‌ها زیاد باشد احتمالاً اسپم است
         if url_count > 2 or mention_count > 5:
@@ -331,10 +401,14 @@ class PersianTextProcessor:
         
         return False, None
     
-    def analyze_content(self, text):
+    def analyze_content(self, text, record_history=True):
         """
         تحلیل کامل محتوای متن فارسی
         
+        Args:
+            text: متن ورودی
+            record_history: ثبت نتیجه در تاریخچه پردازش
+        
         Returns:
             dict: نتایج تحلیل
         """
@@ -349,11 +423,14 @@ class PersianTextProcessor:
         hashtags = self.extract_hashtags(text)
         mentions = self.extract_mentions(text)
         
+        # یک پیمایش واژه‌نامه برای احساسات و محتوای نامناسب
+        lexicon_hits = self.match_lexicons(text)
+        
         # تحلیل احساسات
-        sentiment, sentiment_score, negative_words, positive_words = self.analyze_sentiment(text)
+        sentiment, sentiment_score, negative_words, positive_words = self.analyze_sentiment(text, lexicon_hits)
         
         # بررسی محتوای نامناسب
-        is_inappropriate, inappropriate_words = self.detect_inappropriate_content(text)
+        is_inappropriate, inappropriate_words = self.detect_inappropriate_content(text, lexicon_hits)
         
         # تشخیص اسپم
         is_spam, spam_type = self.is_spam(text)
@@ -377,60 +454,70 @@ class PersianTextProcessor:
             'timestamp': datetime.now().isoformat()
         }
         
-        self.processing_history.append(analysis_result)
+        if record_history:
+            self.processing_history.append(analysis_result)
+            
+            if self.history_sink is not None:
+                self.history_sink.write({field: analysis_result[field] for field in HISTORY_SINK_FIELDS})
         
         return analysis_result
     
-    def generate_report(self, save_to_file=False):
+    def generate_report(self, save_to_file=False, from_sink=True):
         """
         گزارش‌گیری از تاریخچه پردازش
         
+        Args:
+            save_to_file: ذخیره گزارش در فایل
+            from_sink: در صورت وجود ذخیره‌ساز، گزارش از کل تاریخچه روی دیسک ساخته شود
+        
         Returns:
             dict: گزارش آماری
         """
-        if not self.processing_history:
-            return {"error": "تاریخچه پردازش خالی است"}
-        
-        total_processed = len(self.processing_history)
-        spam_count = sum(1 for item in self.processing_history if item['is_spam'])
-        inappropriate_count = sum(1 for item in self.processing_history if item['is_inappropriate'])
-        
-        # آمار احساسات
-        sentiment_stats = {
-            'positive': sum(1 for item in self.processing_history if item['sentiment'] == 'positive'),
-            'negative': sum(1 for item in self.processing_history if item['sentiment'] == 'negative'),
-            'neutral': sum(1 for item in self.processing_history if item['sentiment'] == 'neutral')
-        }
-        
-        # آمار زبان
-        language_stats = {
-            'fa': sum(1 for item in self.processing_history if item['language'] == 'fa'),
-            'en': sum(1 for item in self.processing_history if item['language'] == 'en'),
-            'mixed': sum(1 for item in self.processing_history if item['language'] == 'mixed')
-        }
-        
-        # آمار انواع اسپم
+        if from_sink and self.history_sink is not None:
+            history = self.history_sink.iter_records()
+        else:
+            history = iter(list(self.processing_history))
+        
+        # تجمیع در یک پیمایش تا تاریخچه روی دیسک به صورت جریانی خوانده شود
+        total_processed = 0
+        spam_count = 0
+        inappropriate_count = 0
+        sentiment_stats = {'positive': 0, 'negative': 0, 'neutral': 0}
+        language_stats = {'fa': 0, 'en': 0, 'mixed': 0}
         spam_types = {}
-        for item in self.processing_history:
-            if item['is_spam'] and item['spam_type']:
-                spam_types[item['spam_type']] = spam_types.get(item['spam_type'], 0) + 1
-        
-        # کلمات منفی و مثبت پرتکرار
-        all_negative_words = []
-        all_positive_words = []
-        for item in self.processing_history:
-            all_negative_words.extend(item['negative_words'])
-            all_positive_words.extend(item['positive_words'])
+        negative_counter = Counter()
+        positive_counter = Counter()
+        hashtag_counter = Counter()
         
-        top_negative_words = Counter(all_negative_words).most_common(10)
-        top_positive_words = Counter(all_positive_words).most_common(10)
+        for item in history:
+            total_processed += 1
+            
+            if item['is_spam']:
+                spam_count += 1
+                # آمار انواع اسپم
+                if item['spam_type']:
+                    spam_types[item['spam_type']] = spam_types.get(item['spam_type'], 0) + 1
+            
+            if item['is_inappropriate']:
+                inappropriate_count += 1
+            
+            # آمار احساسات و زبان
+            if item['sentiment'] in sentiment_stats:
+                sentiment_stats[item['sentiment']] += 1
+            if item['language'] in language_stats:
+                language_stats[item['language']] += 1
+            
+            # کلمات منفی و مثبت و هشتگ‌های پرتکرار
+            negative_counter.update(item['negative_words'])
+            positive_counter.update(item['positive_words'])
+            hashtag_counter.update(item['hashtags'])
         
-        # هشتگ‌های پرتکرار
-        all_hashtags = []
-        for item in self.processing_history:
-            all_hashtags.extend(item['hashtags'])
+        if total_processed == 0:
+            return {"error": "تاریخچه پردازش خالی است"}
         
-        top_hashtags = Counter(all_hashtags).most_common(10)
+        top_negative_words = negative_counter.most_common(10)
+        top_positive_words = positive_counter.most_common(10)
+        top_hashtags = hashtag_counter.most_common(10)
         
         report = {
             'total_processed': total_processed,
@@ -454,4 +541,18 @@ class PersianTextProcessor:
             with open(filename, 'w', encoding='utf-8') as f:
                 json.dump(report, f, ensure_ascii=False, indent=2)
         
-        return report
\ No newline at end of file
+        return report
+
+
+def get_text_processor():
+    """
+    دریافت پردازشگر متن برنامه جاری
+    
+    در صورت ثبت بودن پردازشگر در app.extensions همان نمونه برگردانده می‌شود؛
+    در غیر این صورت نمونه جدیدی با واژه‌نامه‌های تنظیم شده برنامه ساخته می‌شود.
+    """
+    if has_app_context():
+        processor = current_app.extensions.get('persian_content_analyzer')
+        if processor is not None:
+            return processor
+    return PersianTextProcessor()
@@ -0,0 +1,202 @@
+import math
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+logger = logging.getLogger("token_budget")
+
+# بودجه توکن کار جاری؛ با contextvars به taskهای حلقه رویداد آنالایزر منتقل می‌شود
+_current_budget = contextvars.ContextVar('token_budget', default=None)
+
+
+class TokenBudgetExceeded(Exception):
+    """خطای پایان بودجه توکن کار جاری"""
+    pass
+
+
+class TokenEstimator:
+    """
+    تخمین محلی تعداد توکن‌ها بدون فراخوانی API
+    
+    تخمین خام بر اساس تعداد نویسه‌های لاتین و غیرلاتین (فارسی) محاسبه می‌شود و
+    با ضریبی که از مصرف واقعی درخواست‌ها (usage پاسخ‌ها) یاد گرفته می‌شود تصحیح می‌شود.
+    """
+    
+    def __init__(self, chars_per_token_ascii=4.0, chars_per_token_other=2.0, overhead=10):
+        """
+        Args:
+            chars_per_token_ascii: میانگین نویسه‌های لاتین در هر توکن
+            chars_per_token_other: میانگین نویسه‌های غیرلاتین در هر توکن
+            overhead: توکن‌های ثابت هر پیام
+        """
+        self.chars_per_token_ascii = chars_per_token_ascii
+        self.chars_per_token_other = chars_per_token_other
+        self.overhead = overhead
+        self.scale = 1.0
+        self.samples = 0
+        self._lock = threading.Lock()
+    
+    def raw_estimate(self, text):
+        """تخمین کالیبره نشده تعداد توکن‌ها"""
+        if not text:
+            return self.overhead
+        
+        ascii_chars = len(text.encode('ascii', 'ignore'))
+        other_chars = len(text) - ascii_chars
+        return self.overhead + ascii_chars / self.chars_per_token_ascii + other_chars / self.chars_per_token_other
+    
+    def estimate(self, text):
+        """
+        تخمین کالیبره شده تعداد توکن‌های یک متن
+        
+        Returns:
+            int: تعداد تخمینی توکن‌ها
+        """
+        return int(math.ceil(self.raw_estimate(text) * self.scale))
+    
+    def observe(self, raw_estimate, actual_tokens):
+        """
+        به‌روزرسانی ضریب تصحیح با مصرف واقعی یک درخواست
+        
+        Args:
+            raw_estimate: تخمین خام ورودی درخواست
+            actual_tokens: input_tokens گزارش شده در پاسخ
+        """
+        if not raw_estimate or not actual_tokens:
+            return
+        
+        ratio = min(4.0, max(0.25, actual_tokens / raw_estimate))
+        with self._lock:
+            # نمونه‌های اول وزن بیشتری دارند تا کالیبراسیون سریع همگرا شود
+            weight = max(0.02, 1.0 / (self.samples + 1))
+            self.scale = (1 - weight) * self.scale + weight * ratio
+            self.samples += 1
+    
+    def stats(self):
+        return {
+            "scale": round(self.scale, 4),
+            "samples": self.samples
+        }
+
+
+class TokenBudget:
+    """
+    بودجه توکن یک کار (گزارش زمان‌بندی شده، دور پردازش دسته‌ای و ...)
+    
+    قبل از هر درخواست، تخمین ورودی به علاوه حداکثر توکن خروجی رزرو می‌شود و پس از
+    پاسخ با مصرف واقعی تسویه می‌شود؛ بنابراین مصرف کار از سقف تعیین شده بیشتر نمی‌شود.
+    رد شدن یک درخواست بزرگ (مثلاً یک دسته کامل) بودجه را تمام شده نمی‌کند؛ بودجه
+    فقط وقتی تمام شده است که باقیمانده از کوچک‌ترین درخواست مفید کمتر باشد.
+    """
+    
+    def __init__(self, limit=None, name=None, min_request_tokens=600):
+        """
+        Args:
+            limit: سقف مجموع توکن‌های ورودی و خروجی (None یا 0: بدون سقف، فقط ثبت مصرف)
+            name: نام کار برای لاگ و گزارش
+            min_request_tokens: اندازه کوچک‌ترین درخواست مفید (با درخواست‌های کوچک‌تر مشاهده شده کاهش می‌یابد)
+        """
+        self.limit = limit or None
+        self.name = name
+        self.min_request_tokens = min_request_tokens
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.reserved = 0
+        self.requests = 0
+        self.denied = 0
+        self._lock = threading.Lock()
+    
+    @property
+    def used(self):
+        return self.input_tokens + self.output_tokens
+    
+    @property
+    def remaining(self):
+        if self.limit is None:
+            return None
+        return max(0, self.limit - self.used - self.reserved)
+    
+    @property
+    def exhausted(self):
+        """
+        باقیمانده بودجه برای کوچک‌ترین درخواست مفید کافی نیست
+        
+        رزروهای درخواست‌های در جریان حساب نمی‌شوند، چون پس از پاسخ با مصرف واقعی
+        (معمولاً کمتر) تسویه می‌شوند.
+        """
+        return self.limit is not None and self.limit - self.used < self.min_request_tokens
+    
+    def reserve(self, tokens):
+        """
+        رزرو توکن برای یک درخواست
+        
+        Raises:
+            TokenBudgetExceeded: اگر باقیمانده بودجه کافی نباشد
+        """
+        with self._lock:
+            self.min_request_tokens = min(self.min_request_tokens, tokens)
+            if self.limit is not None and self.used + self.reserved + tokens > self.limit:
+                self.denied += 1
+                raise TokenBudgetExceeded(
+                    f"Token budget {self.name or ''} exhausted: {self.used} used, "
+                    f"{self.reserved} reserved of {self.limit}, {tokens} requested"
+                )
+            self.reserved += tokens
+        return tokens
+    
+    def settle(self, reserved, input_tokens=0, output_tokens=0):
+        """آزاد کردن رزرو و ثبت مصرف واقعی"""
+        with self._lock:
+            self.reserved = max(0, self.reserved - reserved)
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+            if input_tokens or output_tokens:
+                self.requests += 1
+    
+    def stats(self):
+        return {
+            "name": self.name,
+            "limit": self.limit,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "used": self.used,
+            "remaining": self.remaining,
+            "requests": self.requests,
+            "denied": self.denied,
+            "exhausted": self.exhausted
+        }
+
+
+def current_budget():
+    """بودجه توکن کار جاری (یا None)"""
+    return _current_budget.get()
+
+
+@contextmanager
+def token_budget(limit=None, name=None, budget=None):
+    """
+    اجرای یک کار با بودجه توکن
+    
+    همه درخواست‌های مدل داخل این بلوک (از جمله taskهای ایجاد شده در آن) از این
+    بودجه کم می‌کنند. پس از پایان بودجه، درخواست‌ها بدون ارسال با خطای
+    budget_exceeded برمی‌گردند تا فراخواننده به تحلیل محلی بسنده کند.
+    
+    Args:
+        limit: سقف توکن‌ها (None یا 0: بدون سقف)
+        name: نام کار
+        budget: بودجه موجود برای ادامه مصرف در چند بلوک (مثلاً بودجه ساعتی یک کارگر)
+    
+    Yields:
+        TokenBudget
+    """
+    if budget is None:
+        budget = TokenBudget(limit, name)
+    name = budget.name
+    reset_token = _current_budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _current_budget.reset(reset_token)
+        logger.info(f"Token budget {name or ''}: {budget.used} tokens used in {budget.requests} requests"
+                    f"{' (exhausted)' if budget.exhausted else ''}")
@@ -0,0 +1,295 @@
+import time
+import logging
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+
+logger = logging.getLogger("worker_pool")
+
+
+class Worker:
+    """
+    وضعیت و آمار یک کارگر استخر
+    
+    تابع کار هر کارگر یک واحد کار (مثلاً یک دسته توییت) انجام می‌دهد و تعداد
+    موارد پردازش شده را برمی‌گرداند؛ استخر آن را تا دریافت دستور توقف تکرار می‌کند.
+    """
+    
+    def __init__(self, name, target, kind='worker', index=0):
+        """
+        Args:
+            name: نام کارگر (نام thread)
+            target: تابع یک واحد کار با ورودی همین کارگر؛ خروجی: تعداد موارد پردازش شده
+            kind: نوع کارگر (برای گروه‌بندی آمار)
+            index: شماره کارگر در گروه خود
+        """
+        self.name = name
+        self.target = target
+        self.kind = kind
+        self.index = index
+        self.state = {}
+        self.thread = None
+        
+        # آمار
+        self.started_at = None
+        self.last_heartbeat = None
+        self.busy_since = None
+        self.units = 0
+        self.items = 0
+        self.errors = 0
+        self.restarts = 0
+        self.last_error = None
+        self.busy_seconds = 0.0
+        self.idle_seconds = 0.0
+    
+    def heartbeat(self):
+        """ثبت زنده بودن کارگر (در کارهای طولانی می‌تواند از داخل تابع کار هم فراخوانی شود)"""
+        self.last_heartbeat = time.monotonic()
+    
+    def record(self, items, elapsed):
+        """ثبت نتیجه یک واحد کار"""
+        self.units += 1
+        self.items += items or 0
+        self.busy_seconds += elapsed
+    
+    def stats(self, heartbeat_timeout):
+        """
+        آمار کارگر
+        
+        Returns:
+            dict: وضعیت، زمان آخرین ضربان و توان عملیاتی کارگر
+        """
+        now = time.monotonic()
+        alive = self.thread is not None and self.thread.is_alive()
+        since_heartbeat = now - self.last_heartbeat if self.last_heartbeat is not None else None
+        uptime = now - self.started_at if self.started_at is not None else 0.0
+        
+        if not alive:
+            status = 'stopped'
+        elif self.busy_since is None:
+            status = 'idle'
+        elif since_heartbeat is not None and since_heartbeat > heartbeat_timeout:
+            status = 'stalled'
+        else:
+            status = 'busy'
+        
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "status": status,
+            "seconds_since_heartbeat": round(since_heartbeat, 3) if since_heartbeat is not None else None,
+            "uptime_seconds": round(uptime, 1),
+            "units": self.units,
+            "items": self.items,
+            "errors": self.errors,
+            "restarts": self.restarts,
+            "last_error": self.last_error,
+            "items_per_second": round(self.items / uptime, 3) if uptime else 0.0,
+            "utilization": round(self.busy_seconds / uptime, 3) if uptime else 0.0
+        }
+
+
+class WorkerPool:
+    """
+    استخر کارگرهای پس‌زمینه با نظارت و توقف تدریجی
+    
+    انتظارهای کارگرها روی یک threading.Event انجام می‌شود و با دستور توقف بلافاصله
+    پایان می‌یابند. هنگام توقف کارگرها واحد کار جاری خود را کامل می‌کنند (و نتیجه را
+    ثبت می‌کنند) و سپس خارج می‌شوند. یک ناظر کارگرهایی را که به هر دلیل از کار
+    افتاده‌اند دوباره راه‌اندازی می‌کند.
+    """
+    
+    def __init__(self, name='workers', heartbeat_timeout=600, supervise_interval=5.0,
+                 error_backoff=5.0, app=None):
+        """
+        Args:
+            name: نام استخر (پیشوند نام threadها)
+            heartbeat_timeout: کارگری که بیش از این مدت ضربان نداشته باشد متوقف شده (stalled) گزارش می‌شود
+            supervise_interval: فاصله بررسی زنده بودن کارگرها (ثانیه)
+            error_backoff: مکث پس از خطای یک واحد کار (ثانیه)
+            app: برنامه Flask برای اجرای واحدهای کار در app context (اختیاری)
+        """
+        self.name = name
+        self.heartbeat_timeout = heartbeat_timeout
+        self.supervise_interval = supervise_interval
+        self.error_backoff = error_backoff
+        self.app = app
+        
+        self.workers = []
+        self.stop_event = threading.Event()
+        self.started_at = None
+        self.supervisor = None
+        self._lock = threading.Lock()
+    
+    @property
+    def is_running(self):
+        return self.started_at is not None and not self.stop_event.is_set()
+    
+    def add_worker(self, target, kind='worker', count=1):
+        """
+        افزودن کارگر(ها) به استخر (پیش از start)
+        
+        Args:
+            target: تابع یک واحد کار با ورودی Worker
+            kind: نوع کارگر
+            count: تعداد کارگرهای این نوع
+        """
+        for index in range(count):
+            self.workers.append(Worker(f"{self.name}-{kind}-{index}", target, kind=kind, index=index))
+    
+    @contextmanager
+    def idle(self, worker):
+        """
+        علامت‌گذاری بخشی از تابع کار به عنوان انتظار (در بهره‌وری و وضعیت stalled حساب نمی‌شود)
+        
+        Args:
+            worker: کارگر جاری
+        """
+        started = time.monotonic()
+        busy_since, worker.busy_since = worker.busy_since, None
+        try:
+            yield
+        finally:
+            worker.idle_seconds += time.monotonic() - started
+            worker.heartbeat()
+            worker.busy_since = time.monotonic() if busy_since is not None else None
+    
+    def wait(self, seconds, worker=None):
+        """
+        انتظار قابل قطع (برای استفاده در توابع کار)
+        
+        Args:
+            seconds: مدت انتظار
+            worker: کارگر جاری (برای ثبت انتظار به عنوان بیکاری)
+        
+        Returns:
+            bool: True اگر در حین انتظار دستور توقف صادر شده باشد
+        """
+        if worker is None:
+            return self.stop_event.wait(seconds)
+        
+        with self.idle(worker):
+            return self.stop_event.wait(seconds)
+    
+    def start(self):
+        """
+        شروع کارگرها و ناظر
+        
+        Returns:
+            bool: آیا شروع شد
+        """
+        with self._lock:
+            if self.is_running:
+                return False
+            
+            self.stop_event.clear()
+            self.started_at = time.monotonic()
+            for worker in self.workers:
+                self._spawn(worker)
+            
+            self.supervisor = threading.Thread(target=self._supervise, name=f"{self.name}-supervisor")
+            self.supervisor.daemon = True
+            self.supervisor.start()
+        
+        logger.info(f"Worker pool {self.name} started with {len(self.workers)} workers")
+        return True
+    
+    def stop(self, timeout=30.0):
+        """
+        توقف تدریجی: انتظارها قطع می‌شوند و کارگرها پس از پایان واحد کار جاری خارج می‌شوند
+        
+        Args:
+            timeout: حداکثر کل زمان انتظار برای خروج کارگرها (ثانیه)
+        
+        Returns:
+            list: نام کارگرهایی که تا پایان مهلت خارج نشده‌اند
+        """
+        with self._lock:
+            if self.started_at is None:
+                return []
+            self.stop_event.set()
+        
+        deadline = time.monotonic() + timeout
+        threads = [worker.thread for worker in self.workers if worker.thread is not None]
+        if self.supervisor is not None:
+            threads.append(self.supervisor)
+        
+        for thread in threads:
+            thread.join(timeout=max(0.0, deadline - time.monotonic()))
+        
+        remaining = [worker.name for worker in self.workers if worker.thread is not None and worker.thread.is_alive()]
+        if remaining:
+            logger.warning(f"Worker pool {self.name} stopped with unfinished workers: {remaining}")
+        else:
+            logger.info(f"Worker pool {self.name} stopped")
+        
+        self.started_at = None
+        self.supervisor = None
+        return remaining
+    
+    def _spawn(self, worker):
+        # زمان شروع در راه‌اندازی مجدد حفظ می‌شود تا توان عملیاتی کل عمر کارگر گزارش شود
+        if worker.started_at is None:
+            worker.started_at = time.monotonic()
+        worker.heartbeat()
+        worker.thread = threading.Thread(target=self._run, args=(worker,), name=worker.name)
+        worker.thread.daemon = True
+        worker.thread.start()
+    
+    def _run(self, worker):
+        """حلقه اجرای یک کارگر تا دریافت دستور توقف"""
+        while not self.stop_event.is_set():
+            worker.heartbeat()
+            started = worker.busy_since = time.monotonic()
+            idle_before = worker.idle_seconds
+            try:
+                if self.app is not None:
+                    with self.app.app_context():
+                        items = worker.target(worker)
+                else:
+                    items = worker.target(worker)
+                worker.record(items, time.monotonic() - started - (worker.idle_seconds - idle_before))
+            except Exception as e:
+                worker.errors += 1
+                worker.last_error = f"{datetime.utcnow().isoformat()} {e}"
+                logger.error(f"Error in worker {worker.name}: {e}", exc_info=True)
+                self.stop_event.wait(self.error_backoff)
+            finally:
+                worker.busy_since = None
+        
+        worker.heartbeat()
+    
+    def _supervise(self):
+        """راه‌اندازی مجدد کارگرهایی که غیرمنتظره خارج شده‌اند"""
+        while not self.stop_event.wait(self.supervise_interval):
+            for worker in self.workers:
+                if worker.thread is not None and not worker.thread.is_alive() and not self.stop_event.is_set():
+                    worker.restarts += 1
+                    logger.warning(f"Restarting worker {worker.name} (restart #{worker.restarts})")
+                    self._spawn(worker)
+    
+    def stats(self):
+        """
+        آمار استخر و کارگرها
+        
+        Returns:
+            dict: وضعیت استخر، آمار هر کارگر و جمع توان عملیاتی هر نوع کارگر
+        """
+        workers = [worker.stats(self.heartbeat_timeout) for worker in self.workers]
+        
+        by_kind = {}
+        for worker in workers:
+            kind = by_kind.setdefault(worker['kind'], {"workers": 0, "items": 0, "errors": 0, "items_per_second": 0.0})
+            kind["workers"] += 1
+            kind["items"] += worker['items']
+            kind["errors"] += worker['errors']
+            kind["items_per_second"] = round(kind["items_per_second"] + worker['items_per_second'], 3)
+        
+        return {
+            "name": self.name,
+            "running": self.is_running,
+            "uptime_seconds": round(time.monotonic() - self.started_at, 1) if self.started_at is not None else 0.0,
+            "stalled": sum(1 for worker in workers if worker['status'] == 'stalled'),
+            "by_kind": by_kind,
+            "workers": workers
+        }